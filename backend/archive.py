@@ -0,0 +1,270 @@
+"""Moves events and everything that references them out of the hot collections.
+
+Jobs live in `archive_jobs`, so a job interrupted by a restart is picked up again by any worker.
+Every step is idempotent: documents are copied to the archive before they are deleted, and a
+batch copied again after an interruption replaces its earlier copy instead of duplicating it.
+
+Usage: python archive.py --completed-before-days 30   archives completed events
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from bson import json_util
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Collections holding per-event documents, archived in this order before the event itself
+DEPENDENT_COLLECTIONS = ['registrations', 'feedbacks', 'notifications', 'event_timeseries']
+# Derived data that is simply dropped
+DERIVED_COLLECTIONS = ['feedback_summaries']
+JOB_LEASE = timedelta(minutes=5)
+
+
+class MongoArchiveSink:
+    """Copies documents into `archived_<collection>`, keeping their `_id`."""
+
+    def __init__(self, get_db):
+        self.get_db = get_db
+
+    async def write(self, collection: str, event_id: str, docs: List[dict]):
+        try:
+            await self.get_db()[f"archived_{collection}"].insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicates come from a job that was interrupted after copying but before deleting
+            if any(err['code'] != 11000 for err in e.details['writeErrors']):
+                raise
+
+
+class JsonlArchiveSink:
+    """Writes each batch to `<root>/<collection>/<event_id>/<batch>.jsonl.gz`.
+
+    A batch file is named after the batch's first `_id`; batches are read in `_id` order, so a
+    retried batch overwrites its own file.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    async def write(self, collection: str, event_id: str, docs: List[dict]):
+        batch = hashlib.sha256(json_util.dumps(docs[0]['_id']).encode()).hexdigest()[:24]
+        await asyncio.to_thread(self._write, self.root / collection / event_id / f"{batch}.jsonl.gz", docs)
+
+    @staticmethod
+    def _write(path: Path, docs: List[dict]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = ''.join(json_util.dumps(doc) + '\n' for doc in docs)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            f.write(lines)
+        os.replace(tmp, path)
+
+
+async def ensure_indexes(db):
+    await db.archive_jobs.create_index([("state", 1), ("locked_until", 1)])
+    await db.archive_jobs.create_index("event_id", unique=True)
+    await db.events.create_index([("status", 1), ("end_ts", 1)])
+    for collection in DEPENDENT_COLLECTIONS + DERIVED_COLLECTIONS:
+        await db[collection].create_index("event_id")
+
+
+async def enqueue(db, event: dict, reason: str, requested_by: Optional[str] = None):
+    """Record an archive job; the event snapshot lets the job finish even if the event is already gone."""
+    await db.archive_jobs.update_one(
+        {"event_id": event['id']},
+        {"$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "event_id": event['id'],
+            "event": event,
+            "reason": reason,
+            "requested_by": requested_by,
+            "state": "pending",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "locked_until": datetime(1970, 1, 1, tzinfo=timezone.utc),
+        }},
+        upsert=True,
+    )
+
+
+async def claim_job(db) -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.archive_jobs.find_one_and_update(
+        {"state": {"$in": ["pending", "running"]}, "locked_until": {"$lte": now}},
+        {"$set": {"state": "running", "locked_until": now + JOB_LEASE}, "$inc": {"attempts": 1}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def notify_registrants(notifications, user_ids: List[str], event: dict, reason: str):
+    if reason != 'deleted' or not user_ids:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    notices = [
+        {
+            # Deterministic _id so a retried batch does not notify anyone twice
+            "_id": f"cancelled:{event['id']}:{user_id}",
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "title": "Event Cancelled",
+            "message": f"{event['title']} has been cancelled by the organizer",
+            "read": False,
+            "created_at": now,
+        }
+        for user_id in user_ids
+    ]
+    try:
+        await notifications.insert_many(notices, ordered=False)
+    except BulkWriteError as e:
+        if any(err['code'] != 11000 for err in e.details['writeErrors']):
+            raise
+
+
+async def run_job(db, notifications, sink, job: dict, batch_size: int = 1000):
+    event_id = job['event_id']
+    event = await db.events.find_one({"id": event_id}) or job['event']
+
+    for collection in DEPENDENT_COLLECTIONS:
+        while True:
+            # Sorted, so a batch retried after a failure has the same documents
+            docs = await db[collection].find({"event_id": event_id}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            if collection == 'registrations':
+                await notify_registrants(notifications, [d['user_id'] for d in docs], event, job['reason'])
+            await sink.write(collection, event_id, docs)
+            await db[collection].delete_many({"_id": {"$in": [d['_id'] for d in docs]}})
+            # Extend the lease while making progress on a large event
+            await db.archive_jobs.update_one(
+                {"_id": job['_id']},
+                {"$set": {"locked_until": datetime.now(timezone.utc) + JOB_LEASE}, "$inc": {f"archived.{collection}": len(docs)}},
+            )
+
+    for collection in DERIVED_COLLECTIONS:
+        await db[collection].delete_many({"event_id": event_id})
+
+    if '_id' not in event:
+        event = {**event, "_id": event_id}
+    await sink.write('events', event_id, [{**event, "archived_reason": job['reason'], "archived_at": datetime.now(timezone.utc).isoformat()}])
+    await db.events.delete_one({"id": event_id})
+    await db.archive_jobs.update_one(
+        {"_id": job['_id']},
+        {"$set": {"state": "done", "finished_at": datetime.now(timezone.utc).isoformat()}, "$unset": {"event": ""}},
+    )
+
+
+async def enqueue_completed_events(db, older_than: timedelta) -> int:
+    # end_ts is the UTC datetime from venues.schedule_fields; end_date strings carry mixed offsets
+    cutoff = datetime.now(timezone.utc) - older_than
+    count = 0
+    async for event in db.events.find({"status": "completed", "end_ts": {"$lt": cutoff}}, {"_id": 0}):
+        await enqueue(db, event, reason="completed")
+        count += 1
+    return count
+
+
+class ArchiveWorker:
+    """Background task that drains `archive_jobs`; `wake()` starts it early after a new job."""
+
+    def __init__(self, get_db, get_notifications, sink, batch_size: int = 1000, poll_seconds: float = 30,
+                 completed_after: Optional[timedelta] = None):
+        self.get_db = get_db
+        self.get_notifications = get_notifications
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.completed_after = completed_after
+        self._last_sweep: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def drain(self) -> int:
+        done = 0
+        while True:
+            job = await claim_job(self.get_db())
+            if job is None:
+                return done
+            try:
+                await run_job(self.get_db(), self.get_notifications(), self.sink, job, self.batch_size)
+                done += 1
+            except Exception:
+                # The lease expires and the job is retried
+                logger.exception("Archive job for event %s failed", job['event_id'])
+                return done
+
+    async def _sweep_completed(self):
+        now = datetime.now(timezone.utc)
+        if self.completed_after is None or (self._last_sweep and now - self._last_sweep < timedelta(hours=1)):
+            return
+        self._last_sweep = now
+        queued = await enqueue_completed_events(self.get_db(), self.completed_after)
+        if queued:
+            logger.info("Queued %s completed events for archival", queued)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._sweep_completed()
+                await self.drain()
+            except Exception:
+                logger.exception("Archive worker error")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Archive completed events and drain pending archive jobs")
+    parser.add_argument('--completed-before-days', type=int)
+    parser.add_argument('--backend', choices=['mongo', 'jsonl'], default=os.environ.get('ARCHIVE_BACKEND', 'mongo'))
+    parser.add_argument('--root', default=os.environ.get('ARCHIVE_ROOT', str(Path(__file__).parent / 'archive')))
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db)
+        if args.completed_before_days is not None:
+            queued = await enqueue_completed_events(db, timedelta(days=args.completed_before_days))
+            logger.info("Queued %s completed events", queued)
+        sink = MongoArchiveSink(lambda: db) if args.backend == 'mongo' else JsonlArchiveSink(Path(args.root))
+        worker = ArchiveWorker(lambda: db, lambda: db.notifications, sink, args.batch_size)
+        logger.info("Archived %s events", await worker.drain())
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
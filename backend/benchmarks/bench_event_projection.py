@@ -0,0 +1,83 @@
+"""Measure GET /api/events query latency when served from the in-memory event projection.
+
+Usage: python benchmarks/bench_event_projection.py [events] [iterations]
+"""
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from event_projection import EventProjection  # noqa: E402
+
+CATEGORIES = ['technical', 'cultural', 'sports', 'workshop', 'seminar']
+STATUSES = ['upcoming'] * 8 + ['ongoing', 'completed']
+
+
+def synthetic_events(count, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        begins = start + timedelta(hours=rng.randrange(24 * 365))
+        yield {
+            "id": str(uuid.uuid4()),
+            "_id": i,
+            "title": f"Event {i}",
+            "description": "An event on campus " * 10,
+            "category": rng.choice(CATEGORIES),
+            "status": rng.choice(STATUSES),
+            "start_date": begins.isoformat(),
+            "end_date": (begins + timedelta(hours=2)).isoformat(),
+            "venue": f"Hall {i % 40}",
+            "capacity": 100,
+            "registered_count": rng.randrange(100),
+        }
+
+
+def timed(iterations, fn):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(count, iterations):
+    projection = EventProjection(None, lambda doc: {k: v for k, v in doc.items() if k != '_id'})
+    docs = list(synthetic_events(count))
+    start = time.perf_counter()
+    projection.replace_all(docs)
+    print(f"events: {count:,}  full load: {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"{'query':<40}{'us/call':>12}")
+
+    cases = [
+        ("all events, cached response", lambda: projection.query_json()),
+        ("category=technical, cached response", lambda: projection.query_json('technical')),
+        ("category+status, cached response", lambda: projection.query_json('sports', 'upcoming')),
+        ("all events, rebuilt response", lambda: (projection._responses.clear(), projection.query_json())),
+        ("category+status, rebuilt response", lambda: (projection._responses.clear(), projection.query_json('sports', 'upcoming'))),
+    ]
+    for name, fn in cases:
+        print(f"{name:<40}{timed(iterations, fn):>12.1f}")
+
+    rng = random.Random(3)
+
+    def registration():
+        doc = dict(rng.choice(docs))
+        doc['registered_count'] += 1
+        projection.upsert(doc)
+
+    def reschedule():
+        doc = dict(rng.choice(docs))
+        doc['start_date'] = (datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(hours=rng.randrange(8760))).isoformat()
+        projection.upsert(doc)
+
+    print(f"{'change: registered_count update':<40}{timed(iterations, registration):>12.1f}")
+    print(f"{'change: start_date moved':<40}{timed(iterations, reschedule):>12.1f}")
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    main(count, iterations)
@@ -0,0 +1,64 @@
+"""Time the feedback analytics batch job on synthetic feedback rows.
+
+Usage: python benchmarks/bench_feedback_analytics.py [rows] [events]
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from feedback_analytics import FeedbackAggregator  # noqa: E402
+
+PHRASES = np.array([
+    "Great talk, the speakers were really insightful",
+    "Not good, the hall was crowded and it started late",
+    "Loved the workshop, very helpful hands-on session",
+    "Boring and too long",
+    "Well organized event with useful networking",
+    "The food was okay",
+    "Terrible sound system, could not hear anything",
+    "Excellent fest, would recommend to juniors",
+])
+BATCH_SIZE = 50_000
+
+
+def synthetic_batches(rows, events, seed=7):
+    rng = np.random.default_rng(seed)
+    event_ids = np.array([f"event-{i}" for i in range(events)])
+    days = pd.date_range('2024-01-01', '2026-10-01', freq='D').strftime('%Y-%m-%dT12:00:00').to_numpy()
+    for start in range(0, rows, BATCH_SIZE):
+        n = min(BATCH_SIZE, rows - start)
+        yield pd.DataFrame({
+            'event_id': event_ids[rng.integers(0, events, n)],
+            'rating': rng.integers(1, 6, n),
+            'comment': PHRASES[rng.integers(0, len(PHRASES), n)],
+            'created_at': days[rng.integers(0, len(days), n)],
+        })
+
+
+def main(rows, events):
+    organizers = {f"event-{i}": f"organizer-{i % 200}" for i in range(events)}
+    batches = list(synthetic_batches(rows, events))
+
+    aggregator = FeedbackAggregator(organizers)
+    start = time.perf_counter()
+    for batch in batches:
+        aggregator.add(batch)
+    aggregated = time.perf_counter()
+    summaries, trends = aggregator.results()
+    finished = time.perf_counter()
+
+    print(f"rows: {rows:,}  events: {events:,}  batch size: {BATCH_SIZE:,}")
+    print(f"aggregate batches:  {aggregated - start:7.2f} s  ({rows / (aggregated - start):,.0f} rows/s)")
+    print(f"build summaries:    {finished - aggregated:7.2f} s  ({len(summaries):,} events, {len(trends):,} organizers)")
+    print(f"total:              {finished - start:7.2f} s")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    )
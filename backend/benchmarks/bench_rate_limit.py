@@ -0,0 +1,72 @@
+"""Measure the per-request overhead of RateLimitMiddleware.
+
+Usage: python benchmarks/bench_rate_limit.py [iterations]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import bcrypt
+import jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from rate_limit import RateLimitRule, RateLimitMiddleware, InMemoryRateLimitBackend  # noqa: E402
+
+SECRET = 'bench-secret'
+
+
+async def noop_app(scope, receive, send):
+    pass
+
+
+async def noop_send(message):
+    pass
+
+
+def make_scope(method, path, token=None, client='10.0.0.1'):
+    headers = [(b'host', b'localhost'), (b'content-type', b'application/json')]
+    if token:
+        headers.append((b'authorization', b'Bearer ' + token.encode()))
+    return {'type': 'http', 'method': method, 'path': path, 'headers': headers, 'client': (client, 5000)}
+
+
+async def measure(app, scopes, iterations):
+    n = len(scopes)
+    start = time.perf_counter()
+    for i in range(iterations):
+        await app(scopes[i % n], None, noop_send)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(iterations):
+    rules = [
+        RateLimitRule("login", "POST", "/api/auth/login", 10**9, 60),
+        RateLimitRule("event_registration", "POST", "/api/registrations/{event_id}", 10**9, 60),
+        RateLimitRule("checkin", "POST", "/api/registrations/checkin/{registration_id}", 10**9, 60),
+    ]
+    limited = RateLimitMiddleware(noop_app, rules, InMemoryRateLimitBackend(), jwt_secret=SECRET)
+    exp = datetime.now(timezone.utc) + timedelta(hours=1)
+    tokens = [jwt.encode({'user_id': f'user-{i}', 'exp': exp}, SECRET, algorithm='HS256') for i in range(1000)]
+
+    cases = [
+        ("unlimited route (fast path)", [make_scope('GET', '/api/events')]),
+        ("login, keyed by IP", [make_scope('POST', '/api/auth/login', client=f'10.0.{i // 256}.{i % 256}') for i in range(1000)]),
+        ("registration, keyed by JWT", [make_scope('POST', f'/api/registrations/event-{i}', token=t) for i, t in enumerate(tokens)]),
+    ]
+
+    baseline = await measure(noop_app, cases[0][1], iterations)
+    print(f"{'case':<32}{'us/request':>12}{'overhead us':>14}")
+    print(f"{'no middleware':<32}{baseline:>12.2f}{0:>14.2f}")
+    for name, scopes in cases:
+        cost = await measure(limited, scopes, iterations)
+        print(f"{name:<32}{cost:>12.2f}{cost - baseline:>14.2f}")
+
+    start = time.perf_counter()
+    bcrypt.hashpw(b'TestPass123!', bcrypt.gensalt())
+    print(f"\nFor reference, one bcrypt hash (the work a login does): {(time.perf_counter() - start) * 1e6:.0f} us")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
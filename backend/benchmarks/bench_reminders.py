@@ -0,0 +1,112 @@
+"""Measure reminder dispatch throughput for 50k recipients through the local debugging SMTP server.
+
+Seeds a scratch database `<DB_NAME>_bench_reminders` on MONGO_URL with events starting in the next
+few hours and their registrants, then times selection and rendering alone (dry run), a full run
+without a rate limit, and a resumed run that finds everything already sent. The debugging SMTP
+server runs in a child process, so it does not compete with the dispatcher for the GIL.
+
+Usage: python benchmarks/bench_reminders.py [recipients] [events] [concurrency]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import registrations  # noqa: E402
+import reminders  # noqa: E402
+
+BATCH_SIZE = 10_000
+
+
+async def seed(db, recipients, event_count, now):
+    for name in ('events', 'users', 'registrations', 'reminder_deliveries', 'reminder_runs'):
+        await db[name].drop()
+    await reminders.ensure_indexes(db)
+    await db.events.insert_many([
+        {
+            "id": f"event-{e}",
+            "title": f"Event {e}",
+            "venue": f"Hall {e % 10}",
+            "status": "upcoming",
+            "start_date": (now + timedelta(minutes=10 * e + 30)).isoformat(),
+            "start_ts": now + timedelta(minutes=10 * e + 30),
+        }
+        for e in range(event_count)
+    ])
+    users, regs = [], []
+    for i in range(recipients):
+        users.append({"id": f"user-{i}", "name": f"Student {i}", "email": f"student{i}@example.com"})
+        regs.append(registrations.new_document(f"event-{i % event_count}", f"user-{i}"))
+        if len(users) == BATCH_SIZE:
+            await db.users.insert_many(users)
+            await db.registrations.insert_many(regs)
+            users, regs = [], []
+    if users:
+        await db.users.insert_many(users)
+        await db.registrations.insert_many(regs)
+
+
+def serve(port, ready, received):
+    async def run():
+        server = reminders.DebugSmtpServer(port=port, keep=0, on_message=lambda *_: received.__setitem__(0, received[0] + 1))
+        await server.start()
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+
+def rate(count, seconds):
+    return f"{seconds:7.2f} s  {count / seconds:>9,.0f} msg/s" if seconds else f"{seconds:7.2f} s"
+
+
+async def main(recipients, event_count, concurrency):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[f"{os.environ['DB_NAME']}_bench_reminders"]
+    port = int(os.environ.get('BENCH_SMTP_PORT', '8026'))
+    ready, received = multiprocessing.Event(), multiprocessing.Array('q', 1, lock=False)
+    server = multiprocessing.Process(target=serve, args=(port, ready, received), daemon=True)
+    server.start()
+    ready.wait(10)
+    transport = reminders.SmtpTransport('127.0.0.1', port)
+    try:
+        now = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        await seed(db, recipients, event_count, now)
+        print(f"seeded {recipients:,} registrants across {event_count} events in {time.perf_counter() - started:.1f} s")
+
+        event = {"id": "event-0", "title": "Event 0", "venue": "Hall 0", "start_ts": now}
+        rendered = reminders.RenderedEvent(event, reminders.DEFAULT_TEMPLATES, "Campus Pulse <noreply@example.com>", "https://campus.example")
+        started = time.perf_counter()
+        for i in range(recipients):
+            rendered.message(f"Student {i}", f"student{i}@example.com")
+        print(f"{'render only':<26}{rate(recipients, time.perf_counter() - started)}")
+
+        dispatcher = reminders.ReminderDispatcher(
+            db, transport, "Campus Pulse <noreply@example.com>", "https://campus.example", concurrency=concurrency,
+        )
+        for name, dry_run in (("select (dry run)", True), ("full run", False), ("resumed run", False)):
+            started = time.perf_counter()
+            stats = await dispatcher.run(hours=24, now=now, dry_run=dry_run)
+            elapsed = time.perf_counter() - started
+            print(f"{name:<26}{rate(stats['recipients'], elapsed)}   sent {stats['sent']:,}  skipped {stats['skipped']:,}  failed {stats['failed']:,}")
+        print(f"debug server received {received[0]:,} messages")
+    finally:
+        await transport.close()
+        server.terminate()
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    event_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    asyncio.run(main(recipients, event_count, concurrency))
@@ -0,0 +1,107 @@
+"""Import-time profile of server.py and time until a fresh worker is ready.
+
+The profile runs `python -X importtime -c "import server"` a few times and reports the median
+self time per top-level package. With --serve it also starts uvicorn and measures the time until
+/api/health/ready answers 200, failing if that exceeds --target-ms.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--serve] [--target-ms 1500]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Only needed by specific requests; loading any of them at import time is a regression
+LAZY_MODULES = ['qrcode', 'PIL', 'bcrypt', 'boto3', 'pandas', 'numpy']
+
+
+def profile_imports(runs):
+    per_package = defaultdict(list)
+    totals = []
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import server'],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        run_times = defaultdict(int)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            module = name.strip()
+            run_times[module.split('.')[0]] += int(self_us)
+            if module == 'server':
+                totals.append(int(cumulative_us))
+            loaded.add(module.split('.')[0])
+        for package, us in run_times.items():
+            per_package[package].append(us)
+    return {p: statistics.median(v) for p, v in per_package.items()}, statistics.median(totals), loaded
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_to_ready(timeout=30.0):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env={**os.environ},
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health/ready", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            time.sleep(0.01)
+        raise RuntimeError(f"worker not ready after {timeout:.0f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile server start-up")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--serve', action='store_true', help="also time a uvicorn worker until /api/health/ready")
+    parser.add_argument('--target-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    packages, total_us, loaded = profile_imports(args.runs)
+    print(f"import server: {total_us / 1000:.0f} ms (median of {args.runs} runs)\n")
+    print(f"{'package':<24}{'self ms':>10}{'share':>8}")
+    for package, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<24}{us / 1000:>10.1f}{us / total_us:>8.1%}")
+
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    print(f"\nlazy modules loaded at import: {', '.join(eager) if eager else 'none'}")
+
+    if args.serve:
+        ready_ms = time_to_ready()
+        verdict = 'ok' if ready_ms <= args.target_ms else 'over target'
+        print(f"worker ready: {ready_ms:.0f} ms (target {args.target_ms:.0f} ms, {verdict})")
+        if ready_ms > args.target_ms:
+            sys.exit(1)
+    if eager:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Time venue conflict checks and availability queries against 100k scheduled events.
+
+Seeds a scratch database `<DB_NAME>_bench_venues` on MONGO_URL, then reports latency and the index
+keys examined per query, which should stay flat as the number of events grows.
+
+Usage: python benchmarks/bench_venue_index.py [events] [venues] [queries]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import venues  # noqa: E402
+
+BATCH_SIZE = 10_000
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_events(count, venue_count, seed=7):
+    rng = random.Random(seed)
+    # Back-to-back bookings per venue, 1-4 hours long with gaps, plus an occasional multi-day fest
+    cursors = [EPOCH] * venue_count
+    for i in range(count):
+        v = i % venue_count
+        start = cursors[v] + timedelta(minutes=rng.choice([0, 30, 60, 120]))
+        hours = 72 if rng.random() < 0.001 else rng.randint(1, 4)
+        end = start + timedelta(hours=hours)
+        cursors[v] = end
+        yield {
+            "id": f"event-{i}",
+            "title": f"Event {i}",
+            "venue": f"Venue {v}",
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "status": "upcoming",
+            **venues.schedule_fields(f"Venue {v}", start.isoformat(), end.isoformat()),
+        }
+
+
+async def seed(db, count, venue_count):
+    await db.events.drop()
+    await db.venues.drop()
+    await venues.ensure_indexes(db)
+    batch = []
+    for event in synthetic_events(count, venue_count):
+        batch.append(event)
+        if len(batch) == BATCH_SIZE:
+            await db.events.insert_many(batch)
+            batch = []
+    if batch:
+        await db.events.insert_many(batch)
+    longest = await db.events.aggregate([
+        {"$group": {"_id": "$venue_key", "longest": {"$max": {"$subtract": ["$end_ts", "$start_ts"]}}}},
+    ]).to_list(None)
+    for venue in longest:
+        await db.venues.insert_one({"_id": venue['_id'], "max_duration_seconds": venue['longest'] / 1000})
+    return await db.events.find_one(sort=[("end_ts", -1)], projection={"end_ts": 1})
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<22} median {statistics.median(timings) * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms")
+
+
+async def main(count, venue_count, queries):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[f"{os.environ['DB_NAME']}_bench_venues"]
+    try:
+        started = time.perf_counter()
+        latest = await seed(db, count, venue_count)
+        print(f"seeded {count:,} events across {venue_count} venues in {time.perf_counter() - started:.1f} s")
+
+        last = latest['end_ts'].replace(tzinfo=timezone.utc)
+        span = (last - EPOCH).total_seconds()
+        rng = random.Random(11)
+        probes = []
+        for _ in range(queries):
+            start = EPOCH + timedelta(seconds=rng.uniform(0, span))
+            probes.append((f"venue {rng.randrange(venue_count)}", start))
+
+        timings = []
+        for venue_key, start in probes:
+            t = time.perf_counter()
+            await venues.find_conflicts(db, venue_key, start, start + timedelta(hours=2))
+            timings.append(time.perf_counter() - t)
+        report("conflict check (2h)", timings)
+
+        timings = []
+        for venue_key, start in probes:
+            t = time.perf_counter()
+            await venues.availability(db, venue_key, start, start + timedelta(days=7), timedelta(minutes=30))
+            timings.append(time.perf_counter() - t)
+        report("availability (7 days)", timings)
+
+        venue_key, start = probes[0]
+        venue = await db.venues.find_one({"_id": venue_key})
+        plan = await db.events.find({
+            "venue_key": venue_key,
+            "start_ts": {"$gte": start - timedelta(seconds=venue['max_duration_seconds']), "$lt": start + timedelta(hours=2)},
+            "end_ts": {"$gt": start},
+            "status": {"$ne": "cancelled"},
+        }).explain()
+        stats = plan['executionStats']
+        print(f"conflict check plan:   {stats['totalKeysExamined']} keys, {stats['totalDocsExamined']} docs examined")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    venue_count = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000
+    asyncio.run(main(count, venue_count, queries))
@@ -0,0 +1,41 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# The fields authorization checks and check-in notices need; organizer_id never changes after creation
+OWNERSHIP_FIELDS = ('id', 'organizer_id', 'title')
+
+
+class EventOwnershipCache:
+    """Small per-worker LRU of event_id -> ownership fields.
+
+    Writes in this worker update or drop entries directly. Writes in other workers drop them
+    through the event projection's change stream or polls, or else when the entry expires, which
+    only affects `title`.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, event_id: str) -> Optional[dict]:
+        entry = self._entries.get(event_id)
+        if entry is None:
+            return None
+        expires_at, info = entry
+        if expires_at < time.monotonic():
+            del self._entries[event_id]
+            return None
+        self._entries.move_to_end(event_id)
+        return info
+
+    def put(self, event: dict):
+        info = {field: event.get(field) for field in OWNERSHIP_FIELDS}
+        self._entries[event['id']] = (time.monotonic() + self.ttl_seconds, info)
+        self._entries.move_to_end(event['id'])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, event_id: str):
+        self._entries.pop(event_id, None)
@@ -0,0 +1,235 @@
+"""In-memory, read-optimized copy of the events collection for `GET /api/events`.
+
+Listings filtered by category and status are served from here; text search stays in MongoDB.
+Events are kept presorted by (start_date, id), overall and per category and status bucket, and
+each one is JSON-encoded once when it changes. Responses are joined from those fragments and
+cached until the next change. A MongoDB change stream keeps the copy current; on a standalone
+mongod, where change streams are unavailable, the collection is re-read every `poll_seconds`.
+Every (re)connect starts with a full load, so the copy resyncs on its own after restarts and
+stream errors.
+"""
+import asyncio
+import json
+import logging
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = 40573
+BUCKET_FIELDS = ('category', 'status')
+
+
+def _encode(event: dict) -> bytes:
+    return json.dumps(event, separators=(',', ':')).encode()
+
+
+class EventProjection:
+    """`to_api(doc)` turns a stored event into its response dict, or raises ValueError to skip it.
+
+    `on_change(event_id)` is called for events changed in MongoDB, including by other workers.
+    """
+
+    def __init__(self, get_collection: Callable, to_api: Callable, mode: str = 'auto', poll_seconds: float = 5.0,
+                 limit: int = 1000, max_cached_responses: int = 256, on_change: Optional[Callable] = None):
+        self.get_collection = get_collection
+        self.to_api = to_api
+        self.on_change = on_change
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self.limit = limit
+        self.max_cached_responses = max_cached_responses
+        self.ready = False
+        self.source: Optional[str] = None  # "change_stream" or "poll" once running
+        self._events: Dict[str, dict] = {}
+        self._encoded: Dict[str, bytes] = {}
+        # Mongo _id -> event id, because delete events only carry the _id
+        self._object_ids: Dict[object, str] = {}
+        self._order: List[Tuple[str, str]] = []
+        self._buckets: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        self._responses: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    # Reads
+
+    def query(self, category: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+        return [self._events[event_id] for event_id in self._select(category, status)]
+
+    def _select(self, category: Optional[str], status: Optional[str]) -> List[str]:
+        candidates = [self._order]
+        if category:
+            candidates.append(self._buckets.get(('category', category), []))
+        if status:
+            candidates.append(self._buckets.get(('status', status), []))
+        keys = min(candidates, key=len)
+
+        results = []
+        for _, event_id in keys:
+            event = self._events[event_id]
+            if category and event['category'] != category or status and event['status'] != status:
+                continue
+            results.append(event_id)
+            if len(results) >= self.limit:
+                break
+        return results
+
+    def query_json(self, category: Optional[str] = None, status: Optional[str] = None) -> bytes:
+        key = (category, status)
+        body = self._responses.get(key)
+        if body is None:
+            encoded = self._encoded
+            body = b'[' + b','.join(encoded[event_id] for event_id in self._select(category, status)) + b']'
+            self._responses[key] = body
+            while len(self._responses) > self.max_cached_responses:
+                self._responses.popitem(last=False)
+        else:
+            self._responses.move_to_end(key)
+        return body
+
+    # Writes
+
+    def upsert(self, doc: dict):
+        try:
+            event = self.to_api(doc)
+        except ValueError as e:
+            logger.warning("Skipping event %s in projection: %s", doc.get('id'), e)
+            return
+        if '_id' in doc:
+            self._object_ids[doc['_id']] = event['id']
+        previous = self._events.get(event['id'])
+        self._events[event['id']] = event
+        self._encoded[event['id']] = _encode(event)
+        if previous is None or any(previous[f] != event[f] for f in ('start_date',) + BUCKET_FIELDS):
+            if previous is not None:
+                self._unindex(previous)
+            self._index(event)
+        self._responses.clear()
+
+    def remove(self, event_id: str):
+        previous = self._events.pop(event_id, None)
+        if previous is not None:
+            del self._encoded[event_id]
+            self._unindex(previous)
+            self._responses.clear()
+
+    def replace_all(self, docs: List[dict]):
+        events = {}
+        object_ids = {}
+        for doc in docs:
+            try:
+                event = self.to_api(doc)
+            except ValueError as e:
+                logger.warning("Skipping event %s in projection: %s", doc.get('id'), e)
+                continue
+            events[event['id']] = event
+            object_ids[doc['_id']] = event['id']
+        encoded = {event_id: _encode(event) for event_id, event in events.items()}
+        if self.on_change is not None:
+            for event_id, previous in self._encoded.items():
+                if encoded.get(event_id) != previous:
+                    self.on_change(event_id)
+        order = sorted((event['start_date'], event_id) for event_id, event in events.items())
+        buckets: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+        for entry in order:
+            event = events[entry[1]]
+            for field in BUCKET_FIELDS:
+                buckets.setdefault((field, event[field]), []).append(entry)
+        # Swapped in one step, so readers never see a half-built projection
+        self._events, self._encoded, self._order, self._buckets, self._object_ids = (
+            events, encoded, order, buckets, object_ids
+        )
+        self._responses.clear()
+        self.ready = True
+
+    def _index(self, event: dict):
+        entry = (event['start_date'], event['id'])
+        insort(self._order, entry)
+        for field in BUCKET_FIELDS:
+            insort(self._buckets.setdefault((field, event[field]), []), entry)
+
+    def _unindex(self, event: dict):
+        entry = (event['start_date'], event['id'])
+        for keys in [self._order] + [self._buckets.get((field, event[field]), []) for field in BUCKET_FIELDS]:
+            i = bisect_left(keys, entry)
+            if i < len(keys) and keys[i] == entry:
+                del keys[i]
+
+    # Sync
+
+    async def load(self):
+        self.replace_all(await self.get_collection().find({}).to_list(None))
+
+    def start(self):
+        if self.mode != 'off':
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.ready = False
+
+    async def _run(self):
+        if self.mode in ('auto', 'change_stream'):
+            await self._follow_change_stream()
+        await self._poll()
+
+    async def _follow_change_stream(self):
+        """Returns only if change streams are not available on this deployment."""
+        retry_seconds = 1.0
+        while True:
+            try:
+                # Opened before the load, so no change between the two is missed
+                async with self.get_collection().watch(full_document='updateLookup') as stream:
+                    await self.load()
+                    self.source = 'change_stream'
+                    retry_seconds = 1.0
+                    async for change in stream:
+                        self._apply(change)
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED and self.mode == 'auto':
+                    logger.info("Change streams unavailable, polling events every %ss", self.poll_seconds)
+                    return
+                logger.warning("Event change stream failed: %s", e)
+            except Exception as e:
+                logger.warning("Event change stream failed: %s", e)
+            self.ready = False
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, 30.0)
+
+    def _apply(self, change: dict):
+        operation = change['operationType']
+        if operation in ('insert', 'update', 'replace'):
+            doc = change.get('fullDocument')
+            if doc is None:
+                # Deleted before the update could be looked up; the delete event follows
+                return
+            self.upsert(doc)
+            event_id = doc.get('id')
+        elif operation == 'delete':
+            event_id = self._object_ids.pop(change['documentKey']['_id'], None)
+            if event_id is not None:
+                self.remove(event_id)
+        elif operation in ('drop', 'rename', 'invalidate'):
+            raise RuntimeError(f"events collection {operation}")
+        else:
+            return
+        if event_id is not None and self.on_change is not None:
+            self.on_change(event_id)
+
+    async def _poll(self):
+        self.source = 'poll'
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                logger.warning("Event projection reload failed: %s", e)
+            await asyncio.sleep(self.poll_seconds)
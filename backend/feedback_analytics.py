@@ -0,0 +1,229 @@
+"""Batch job that summarises feedback into `feedback_summaries` and `organizer_feedback_trends`.
+
+Usage: python feedback_analytics.py [--batch-size 50000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RATINGS = [1, 2, 3, 4, 5]
+WORD_PATTERN = r"[a-z][a-z']+"
+
+POSITIVE_WORDS = {
+    'amazing', 'awesome', 'best', 'brilliant', 'clear', 'engaging', 'enjoyed', 'excellent', 'fantastic',
+    'fun', 'good', 'great', 'helpful', 'informative', 'insightful', 'interesting', 'love', 'loved',
+    'nice', 'organized', 'perfect', 'recommend', 'useful', 'well', 'wonderful',
+}
+NEGATIVE_WORDS = {
+    'awful', 'bad', 'boring', 'confusing', 'crowded', 'delayed', 'disappointing', 'disorganized',
+    'hot', 'late', 'long', 'loud', 'messy', 'noisy', 'poor', 'rushed', 'slow', 'terrible', 'useless',
+    'waste', 'worst',
+}
+NEGATIONS = {"not", "no", "never", "didn't", "wasn't", "isn't", "don't"}
+STOPWORDS = {
+    'the', 'and', 'was', 'were', 'for', 'that', 'this', 'with', 'but', 'are', 'had', 'have', 'has', 'very',
+    'too', 'our', 'all', 'its', "it's", 'from', 'they', 'you', 'out', 'event', 'really', 'just', 'more',
+    'also', 'some', 'there', 'about', 'would', 'could', 'much', 'what', 'which', 'when', 'than', 'then',
+    'them', 'been', 'will', 'can', 'one', 'did', 'not', "didn't", "wasn't", "don't", 'got', 'get',
+} | NEGATIONS
+LEXICON = {**{w: 1 for w in POSITIVE_WORDS}, **{w: -1 for w in NEGATIVE_WORDS}}
+
+
+class FeedbackAggregator:
+    """Combines per-batch partial aggregates, so memory stays bounded by the number of groups."""
+
+    def __init__(self, event_organizers: Dict[str, str], top_keywords: int = 10, compact_every: int = 16):
+        self.event_organizers = event_organizers
+        self.top_keywords = top_keywords
+        self.compact_every = compact_every
+        self._parts: Dict[str, list] = {'histograms': [], 'sentiment': [], 'keywords': [], 'trends': []}
+        self.rows = 0
+
+    def add(self, frame: pd.DataFrame):
+        frame = frame.dropna(subset=['event_id', 'rating']).reset_index(drop=True)
+        if frame.empty:
+            return
+        self.rows += len(frame)
+        events = frame['event_id']
+        ratings = frame['rating'].astype('int64').clip(1, 5)
+
+        # One row per word, indexed by the comment it came from. Word attributes are computed once
+        # per distinct word and broadcast through the factorized codes.
+        words = frame['comment'].fillna('').str.lower().str.findall(WORD_PATTERN).explode().dropna()
+        codes, vocabulary = pd.factorize(words)
+        vocabulary = pd.Index(vocabulary)
+        polarity = vocabulary.map(lambda w: LEXICON.get(w, 0)).to_numpy(dtype='int64')[codes]
+        is_negation = vocabulary.isin(NEGATIONS)[codes]
+        is_keyword = (~vocabulary.isin(STOPWORDS) & (vocabulary.str.len() >= 3))[codes]
+        # "not good" flips the polarity of the next word
+        index = words.index.to_numpy()
+        negated = np.zeros(len(index), dtype=bool)
+        negated[1:] = (index[1:] == index[:-1]) & is_negation[:-1]
+        polarity = np.where(negated, -polarity, polarity)
+        scores = pd.Series(polarity, index=words.index).groupby(level=0).sum().reindex(frame.index, fill_value=0)
+        label = np.sign(scores.to_numpy())
+
+        self._parts['histograms'].append(
+            pd.DataFrame({'event_id': events, 'rating': ratings}).groupby(['event_id', 'rating']).size()
+        )
+        self._parts['sentiment'].append(pd.DataFrame({
+            'event_id': events,
+            'positive': label > 0,
+            'neutral': label == 0,
+            'negative': label < 0,
+            'score': scores.to_numpy(),
+        }).groupby('event_id').sum())
+
+        self._parts['keywords'].append(
+            pd.DataFrame({'event_id': events.to_numpy()[index[is_keyword]], 'word': words.to_numpy()[is_keyword]})
+            .groupby(['event_id', 'word']).size()
+        )
+
+        created = frame['created_at'] if 'created_at' in frame else pd.Series('', index=frame.index)
+        self._parts['trends'].append(pd.DataFrame({
+            'organizer_id': events.map(self.event_organizers).fillna(''),
+            'period': created.fillna('').astype(str).str[:7],
+            'count': 1,
+            'rating_sum': ratings,
+            'positive': label > 0,
+        }).groupby(['organizer_id', 'period']).sum())
+
+        if len(self._parts['keywords']) >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        for name, parts in self._parts.items():
+            if len(parts) > 1:
+                combined = pd.concat(parts)
+                self._parts[name] = [combined.groupby(level=list(range(combined.index.nlevels))).sum()]
+
+    def _combined(self, name):
+        self._compact()
+        return self._parts[name][0] if self._parts[name] else None
+
+    def results(self) -> Tuple[List[dict], List[dict]]:
+        histograms = self._combined('histograms')
+        if histograms is None:
+            return [], []
+        histograms = histograms.unstack(fill_value=0).reindex(columns=RATINGS, fill_value=0)
+        sentiment = self._combined('sentiment').reindex(histograms.index, fill_value=0)
+        keywords = self._combined('keywords')
+        top = {}
+        if keywords is not None and len(keywords):
+            ranked = keywords.sort_values(ascending=False, kind='stable').groupby(level=0).head(self.top_keywords)
+            for (event_id, word), count in zip(ranked.index.tolist(), ranked.tolist()):
+                top.setdefault(event_id, []).append({"word": word, "count": count})
+
+        # Build documents from plain arrays; per-row pandas indexing would dominate the run time
+        histogram_rows = histograms.to_numpy()
+        counts = histogram_rows.sum(axis=1)
+        averages = np.round((histogram_rows * np.array(RATINGS)).sum(axis=1) / counts, 2).tolist()
+        positive, neutral, negative = (sentiment[c].to_numpy().astype('int64').tolist() for c in ('positive', 'neutral', 'negative'))
+        scores = np.round(sentiment['score'].to_numpy() / counts, 3).tolist()
+        summaries = []
+        for i, (event_id, histogram) in enumerate(zip(histograms.index, histogram_rows.tolist())):
+            summaries.append({
+                "event_id": event_id,
+                "organizer_id": self.event_organizers.get(event_id),
+                "feedback_count": int(counts[i]),
+                "average_rating": averages[i],
+                "rating_histogram": dict(zip(map(str, RATINGS), histogram)),
+                "sentiment": {
+                    "positive": positive[i],
+                    "neutral": neutral[i],
+                    "negative": negative[i],
+                    "average_score": scores[i],
+                },
+                "top_keywords": top.get(event_id, []),
+            })
+
+        trend_frame = self._combined('trends')
+        trend_frame = trend_frame[trend_frame.index.get_level_values(0) != ''].sort_index()
+        trend_counts = trend_frame['count'].to_numpy()
+        trend_rows = zip(
+            trend_frame.index.tolist(),
+            trend_counts.tolist(),
+            np.round(trend_frame['rating_sum'].to_numpy() / trend_counts, 2).tolist(),
+            np.round(trend_frame['positive'].to_numpy() / trend_counts, 3).tolist(),
+        )
+        trends_by_organizer: Dict[str, list] = {}
+        for (organizer_id, period), count, average, positive_share in trend_rows:
+            trends_by_organizer.setdefault(organizer_id, []).append({
+                "period": period,
+                "feedback_count": count,
+                "average_rating": average,
+                "positive_share": positive_share,
+            })
+        trends = [{"organizer_id": o, "trend": t} for o, t in trends_by_organizer.items()]
+        return summaries, trends
+
+
+async def run_feedback_analytics(db, batch_size: int = 50_000) -> dict:
+    from pymongo import ReplaceOne
+
+    started = datetime.now(timezone.utc)
+    event_organizers = {
+        e['id']: e['organizer_id']
+        async for e in db.events.find({}, {"_id": 0, "id": 1, "organizer_id": 1})
+    }
+    aggregator = FeedbackAggregator(event_organizers)
+
+    batch = []
+    projection = {"_id": 0, "event_id": 1, "rating": 1, "comment": 1, "created_at": 1}
+    async for doc in db.feedbacks.find({}, projection, batch_size=min(batch_size, 10_000)):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            aggregator.add(pd.DataFrame.from_records(batch))
+            batch = []
+    if batch:
+        aggregator.add(pd.DataFrame.from_records(batch))
+
+    summaries, trends = aggregator.results()
+    updated_at = started.isoformat()
+    for collection, docs, key in [
+        (db.feedback_summaries, summaries, 'event_id'),
+        (db.organizer_feedback_trends, trends, 'organizer_id'),
+    ]:
+        for i in range(0, len(docs), 1000):
+            chunk = docs[i:i + 1000]
+            await collection.bulk_write(
+                [ReplaceOne({key: d[key]}, {**d, "updated_at": updated_at}, upsert=True) for d in chunk],
+                ordered=False,
+            )
+        # Drop summaries of events whose feedback no longer exists
+        await collection.delete_many({"updated_at": {"$lt": updated_at}})
+        await collection.create_index(key, unique=True)
+
+    elapsed = (datetime.now(timezone.utc) - started).total_seconds()
+    logger.info("Summarised %s feedbacks into %s events in %.1fs", aggregator.rows, len(summaries), elapsed)
+    return {"feedbacks": aggregator.rows, "events": len(summaries), "organizers": len(trends), "seconds": elapsed}
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        print(await run_feedback_analytics(client[os.environ['DB_NAME']], args.batch_size))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
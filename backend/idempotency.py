@@ -0,0 +1,225 @@
+"""Replays the original response when a client retries a write with the same `Idempotency-Key`.
+
+Keys are scoped to the authenticated user. The first request with a key stores a fingerprint of
+its method, path and body in `idempotency_keys` (TTL index), runs, and stores its response.
+Retries with the same key and fingerprint get that response back without running the handler
+again; a retry that arrives while the first request is still running gets 409.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Callable, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from rate_limit import BearerTokenCache, compile_path
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+# Responses that depend on the caller's credentials or load rather than on the request
+UNCACHED_STATUSES = {401, 403, 429}
+REPLAYED_HEADERS = {b'content-type', b'location'}
+
+
+class IdempotencyStore:
+    """Records in a shared TTL collection, with completed responses also kept in a per-worker LRU."""
+
+    def __init__(self, get_collection: Callable, ttl: timedelta = timedelta(hours=24),
+                 lease: timedelta = timedelta(seconds=60), max_cached: int = 10_000):
+        self.get_collection = get_collection
+        self.ttl = ttl
+        # A record left "processing" by a crashed worker can be taken over after this long
+        self.lease = lease
+        self.max_cached = max_cached
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def ensure_indexes(self):
+        await self.get_collection().create_index("expires_at", expireAfterSeconds=0)
+
+    def _cached(self, key: str) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return record
+
+    def _remember(self, key: str, record: dict):
+        self._cache[key] = (time.monotonic() + self.ttl.total_seconds(), record)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[dict]]:
+        """Returns ("run", None), ("replay", record), ("busy", None) or ("mismatch", None)."""
+        record = self._cached(key)
+        if record is not None:
+            return ('replay', record) if record['fingerprint'] == fingerprint else ('mismatch', None)
+
+        collection = self.get_collection()
+        now = datetime.now(timezone.utc)
+        try:
+            await collection.insert_one({
+                "_id": key,
+                "fingerprint": fingerprint,
+                "state": "processing",
+                "locked_until": now + self.lease,
+                "expires_at": now + self.ttl,
+            })
+            return 'run', None
+        except DuplicateKeyError:
+            pass
+
+        record = await collection.find_one({"_id": key})
+        if record is None:
+            # Expired between the insert and the read
+            return 'busy', None
+        if record['fingerprint'] != fingerprint:
+            return 'mismatch', None
+        if record['state'] == 'done':
+            self._remember(key, record)
+            return 'replay', record
+        taken = await collection.update_one(
+            {"_id": key, "state": "processing", "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + self.lease}},
+        )
+        return ('run', None) if taken.modified_count else ('busy', None)
+
+    async def complete(self, key: str, fingerprint: str, status: int, headers: List[list], body: bytes):
+        record = {"fingerprint": fingerprint, "state": "done", "status": status, "headers": headers, "body": body}
+        self._remember(key, record)
+        await self.get_collection().update_one({"_id": key}, {"$set": record})
+
+    async def abandon(self, key: str):
+        await self.get_collection().delete_one({"_id": key, "state": "processing"})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying an IdempotencyStore to the configured (method, path) routes.
+
+    Requests without the header, or without a valid bearer token, pass straight through.
+    """
+
+    def __init__(self, app, routes: List[Tuple[str, str]], store: IdempotencyStore,
+                 jwt_secret: str, jwt_algorithm: str = 'HS256', enabled: bool = True):
+        self.app = app
+        self.routes = [(method.upper(), compile_path(path)) for method, path in routes]
+        self.store = store
+        self.tokens = BearerTokenCache(jwt_secret, jwt_algorithm)
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope['type'] != 'http' or not self._matches(scope['method'], scope['path']):
+            return await self.app(scope, receive, send)
+
+        header = next((value for name, value in scope['headers'] if name == b'idempotency-key'), None)
+        if header is None:
+            return await self.app(scope, receive, send)
+        if not header or len(header) > MAX_KEY_LENGTH:
+            return await self._respond(send, 400, "Idempotency-Key must be 1-255 characters")
+        user_id = self.tokens.from_headers(scope['headers'])
+        if user_id is None:
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        key = hashlib.sha256(user_id.encode() + b'\0' + header).hexdigest()
+        fingerprint = hashlib.sha256(
+            scope['method'].encode() + b'\0' + scope['path'].encode() + b'\0' + body
+        ).hexdigest()
+        replay_receive = self._replay_body(body, receive)
+
+        try:
+            state, record = await self.store.begin(key, fingerprint)
+        except Exception as e:
+            # Fail open: without the store the request behaves as if it had no key
+            logger.warning("Idempotency store error: %s", e)
+            return await self.app(scope, replay_receive, send)
+
+        if state == 'replay':
+            return await self._replay(send, record)
+        if state == 'busy':
+            return await self._respond(send, 409, "A request with this Idempotency-Key is still in progress",
+                                       [(b'retry-after', b'1')])
+        if state == 'mismatch':
+            return await self._respond(send, 422, "Idempotency-Key was already used for a different request")
+
+        response = {'status': 500, 'headers': [], 'body': []}
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [
+                    [name.decode('latin-1'), value.decode('latin-1')]
+                    for name, value in message.get('headers', []) if name.lower() in REPLAYED_HEADERS
+                ]
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        finally:
+            status = response['status']
+            try:
+                if status >= 500 or status in UNCACHED_STATUSES:
+                    await self.store.abandon(key)
+                else:
+                    await self.store.complete(key, fingerprint, status, response['headers'], b''.join(response['body']))
+            except Exception as e:
+                logger.warning("Could not store idempotent response: %s", e)
+
+    def _matches(self, method: str, path: str) -> bool:
+        return any(m == method and pattern.match(path) for m, pattern in self.routes)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes, receive):
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+        return replay
+
+    @staticmethod
+    async def _replay(send, record: dict):
+        headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in record['headers']]
+        body = bytes(record['body'])
+        headers += [(b'content-length', str(len(body)).encode()), (b'idempotent-replayed', b'true')]
+        await send({'type': 'http.response.start', 'status': record['status'], 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _respond(send, status: int, detail: str, extra_headers: Optional[list] = None):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                *(extra_headers or []),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# name -> (max edge in px, or None to keep the original bytes)
+VARIANTS = {
+    'original': None,
+    'medium.webp': 1280,
+    'thumb.webp': 320,
+}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+MAX_IMAGE_PIXELS = 40_000_000
+IMAGE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+DATA_URL_PREFIX = 'data:image/'
+# (collection, field, variant linked from the rewritten URL) holding images as inline data URLs
+IMAGE_FIELDS = [
+    ('events', 'image_url', 'medium.webp'),
+    ('users', 'avatar', 'thumb.webp'),
+]
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def decode_data_url(value: str) -> bytes:
+    try:
+        return base64.b64decode(value.split(',', 1)[1], validate=True)
+    except (IndexError, binascii.Error):
+        raise InvalidImage("Invalid image data URL")
+
+
+def process_image(data: bytes) -> Dict[str, tuple]:
+    """Decode an upload and render every variant. Runs in a worker process."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+        image.load()
+    except Exception:
+        raise InvalidImage("Unsupported or corrupt image")
+    if image_format not in CONTENT_TYPES:
+        raise InvalidImage(f"Unsupported image format: {image_format}")
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    variants = {'original': (data, CONTENT_TYPES[image_format])}
+    for name, max_edge in VARIANTS.items():
+        if max_edge is None:
+            continue
+        resized = image.copy()
+        resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        buffered = io.BytesIO()
+        resized.save(buffered, format='WEBP', quality=82, method=4)
+        variants[name] = (buffered.getvalue(), 'image/webp')
+    return variants
+
+
+class LocalImageStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        path = self._path(key)
+        await asyncio.to_thread(self._write, path, data, content_type)
+
+    async def get(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            data = await asyncio.to_thread(path.read_bytes)
+            content_type = await asyncio.to_thread(path.with_name(path.name + '.type').read_text)
+        except FileNotFoundError:
+            return None
+        return data, content_type
+
+    @staticmethod
+    def _replace(path: Path, data: bytes):
+        # Unique temp file and rename, so readers never see a partial file and concurrent
+        # writers of the same key don't share a temp file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def _write(cls, path: Path, data: bytes, content_type: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The type lands first, so a stored image always has one
+        cls._replace(path.with_name(path.name + '.type'), content_type.encode())
+        cls._replace(path, data)
+
+
+class S3ImageStore:
+    """Any S3-compatible store; set `endpoint_url` to use MinIO or LocalStack locally."""
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.s3 = boto3.client('s3', endpoint_url=endpoint_url)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self.s3.head_object, Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError:
+            return False
+        return True
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(
+            self.s3.put_object,
+            Bucket=self.bucket,
+            Key=self.prefix + key,
+            Body=data,
+            ContentType=content_type,
+            CacheControl='public, max-age=31536000, immutable',
+        )
+
+    async def get(self, key: str) -> Optional[tuple]:
+        from botocore.exceptions import ClientError
+
+        try:
+            obj = await asyncio.to_thread(self.s3.get_object, Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError:
+            return None
+        data = await asyncio.to_thread(obj['Body'].read)
+        return data, obj['ContentType']
+
+
+class ImagePipeline:
+    """Content-addressed image storage: identical uploads share one id and are processed once."""
+
+    def __init__(self, store, workers: int = 2):
+        self.store = store
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def save(self, data: bytes) -> str:
+        image_id = hashlib.sha256(data).hexdigest()
+        # Concurrent uploads of the same image (double clicks, a shared poster) share one save
+        pending = self._in_flight.get(image_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = asyncio.ensure_future(self._save(image_id, data))
+        self._in_flight[image_id] = pending
+        pending.add_done_callback(lambda _: self._in_flight.pop(image_id, None))
+        return await asyncio.shield(pending)
+
+    async def _save(self, image_id: str, data: bytes) -> str:
+        # The original is written last, so its presence means every variant is stored
+        if await self.store.exists(f"{image_id}/original"):
+            return image_id
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        variants = await asyncio.get_running_loop().run_in_executor(self._executor, process_image, data)
+        for name in [n for n in VARIANTS if n != 'original'] + ['original']:
+            content, content_type = variants[name]
+            await self.store.put(f"{image_id}/{name}", content, content_type)
+        return image_id
+
+    async def load(self, image_id: str, variant: str) -> Optional[tuple]:
+        if not IMAGE_ID_PATTERN.match(image_id) or variant not in VARIANTS:
+            return None
+        return await self.store.get(f"{image_id}/{variant}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def store_from_env():
+    """The image store configured by MEDIA_BACKEND ("local" disk or "s3" for any S3-compatible store)."""
+    if os.environ.get('MEDIA_BACKEND', 'local') == 's3':
+        return S3ImageStore(
+            os.environ['MEDIA_S3_BUCKET'],
+            prefix=os.environ.get('MEDIA_S3_PREFIX', 'images/'),
+            endpoint_url=os.environ.get('MEDIA_S3_ENDPOINT_URL'),
+        )
+    return LocalImageStore(Path(os.environ.get('MEDIA_ROOT', Path(__file__).parent / 'media')))
+
+
+async def backfill(db, pipeline: ImagePipeline, url_prefix: str = '/api/media', batch_size: int = 20) -> dict:
+    """Move inline data URLs stored before uploads went through the pipeline into the image store.
+
+    A field is only rewritten if it still holds the same data URL, so edits made meanwhile win.
+    """
+    from pymongo import UpdateOne
+
+    counts = {"skipped": 0}
+
+    async def convert(doc: dict, field: str, variant: str):
+        try:
+            image_id = await pipeline.save(decode_data_url(doc[field]))
+        except InvalidImage as e:
+            logger.warning("Skipping %s of %s: %s", field, doc['_id'], e)
+            counts["skipped"] += 1
+            return None
+        return UpdateOne({"_id": doc['_id'], field: doc[field]}, {"$set": {field: f"{url_prefix}/{image_id}/{variant}"}})
+
+    for collection, field, variant in IMAGE_FIELDS:
+        counts[collection] = 0
+        cursor = db[collection].find({field: {"$regex": f"^{DATA_URL_PREFIX}"}}, {"_id": 1, field: 1})
+        while batch := await cursor.to_list(batch_size):
+            # Data URLs are large, so only one batch is held and processed at a time
+            writes = [w for w in await asyncio.gather(*[convert(doc, field, variant) for doc in batch]) if w]
+            if writes:
+                result = await db[collection].bulk_write(writes, ordered=False)
+                counts[collection] += result.modified_count
+    return counts
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Image storage maintenance")
+    parser.add_argument('--backfill', action='store_true',
+                        help="move data URLs in events.image_url and users.avatar into the image store")
+    parser.add_argument('--batch-size', type=int, default=20)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    pipeline = ImagePipeline(store_from_env(), workers=int(os.environ.get('MEDIA_WORKERS', '2')))
+    try:
+        db = client[os.environ['DB_NAME']]
+        if args.backfill:
+            counts = await backfill(db, pipeline, os.environ.get('MEDIA_URL_PREFIX', '/api/media'), args.batch_size)
+            print(f"Updated {counts['events']} events and {counts['users']} users, skipped {counts['skipped']} invalid images")
+    finally:
+        pipeline.shutdown()
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
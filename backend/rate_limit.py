@@ -0,0 +1,235 @@
+import json
+import logging
+import re
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import jwt
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(value: str) -> Tuple[int, int]:
+    """Parse "10/minute" or "10/60" into (limit, period_seconds)."""
+    limit, _, period = value.strip().partition('/')
+    period = period.strip() or 'second'
+    seconds = PERIODS.get(period.rstrip('s'))
+    if seconds is None:
+        seconds = int(period)
+    return int(limit), seconds
+
+
+def compile_path(path: str) -> re.Pattern:
+    # "/api/registrations/{event_id}" -> r"^/api/registrations/[^/]+$", "{rest:path}" -> ".*"
+    pattern = re.sub(r'\{[^/:]+:path\}', '.*', path)
+    pattern = re.sub(r'\{[^/]+\}', '[^/]+', pattern)
+    return re.compile('^' + pattern + '$')
+
+
+class BearerTokenCache:
+    """Maps bearer tokens to their `user_id`, verifying each token's signature once until it expires."""
+
+    def __init__(self, jwt_secret: str, jwt_algorithm: str = 'HS256', max_entries: int = 10_000):
+        self.jwt_secret = jwt_secret
+        self.jwt_algorithms = [jwt_algorithm]
+        self.max_entries = max_entries
+        self._entries: Dict[bytes, Tuple[str, float]] = {}
+
+    def user_id(self, token: bytes) -> Optional[str]:
+        cached = self._entries.get(token)
+        if cached is not None and cached[1] > time.time():
+            return cached[0]
+        try:
+            payload = jwt.decode(token, self.jwt_secret, algorithms=self.jwt_algorithms)
+        except jwt.InvalidTokenError:
+            return None
+        user_id = payload.get('user_id')
+        if user_id:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[token] = (user_id, payload.get('exp', 0))
+        return user_id
+
+    def from_headers(self, headers) -> Optional[str]:
+        for name, value in headers:
+            if name == b'authorization' and value[:7].lower() == b'bearer ':
+                return self.user_id(value[7:])
+        return None
+
+
+class RateLimitRule:
+    """Token bucket budget for one route: `limit` requests per `period` seconds, bursting up to `limit`."""
+
+    __slots__ = ('name', 'method', 'path', 'limit', 'period', 'rate', '_pattern')
+
+    def __init__(self, name: str, method: str, path: str, limit: int, period: int):
+        self.name = name
+        self.method = method.upper()
+        self.path = path
+        self.limit = limit
+        self.period = period
+        self.rate = limit / period
+        self._pattern = compile_path(path)
+
+    @classmethod
+    def from_string(cls, name: str, method: str, path: str, value: str) -> 'RateLimitRule':
+        limit, period = parse_rate(value)
+        return cls(name, method, path, limit, period)
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method == '*' or self.method == method) and self._pattern.match(path) is not None
+
+
+class InMemoryRateLimitBackend:
+    """Per-process token buckets. Each worker enforces its own budget."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, List[float]] = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._evict(now)
+            bucket = self._buckets[key] = [float(rule.limit), now, rule.period]
+        else:
+            bucket[0] = min(rule.limit, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return True, 0.0
+        return False, (cost - bucket[0]) / rule.rate
+
+    def _evict(self, now: float):
+        # Buckets idle for a full period are back at capacity, so forgetting them changes nothing
+        idle = [k for k, (_, updated, period) in self._buckets.items() if now - updated > period]
+        for k in idle:
+            del self._buckets[k]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+
+class MongoRateLimitBackend:
+    """Token buckets shared by all workers, updated atomically with one round trip per request."""
+
+    def __init__(self, get_collection: Callable):
+        self.get_collection = get_collection
+
+    async def ensure_indexes(self):
+        await self.get_collection().create_index('expires_at', expireAfterSeconds=0)
+
+    async def consume(self, key: str, rule: RateLimitRule, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.time()
+        refilled = {"$min": [
+            rule.limit,
+            {"$add": [
+                {"$ifNull": ["$tokens", rule.limit]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rule.rate]}
+            ]}
+        ]}
+        bucket = await self.get_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                    "expires_at": datetime.now(timezone.utc) + timedelta(seconds=rule.period),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket['allowed']:
+            return True, 0.0
+        return False, (cost - bucket['tokens']) / rule.rate
+
+
+class RateLimitMiddleware:
+    """ASGI middleware that sheds load with 429 before the request reaches any route handler.
+
+    Requests are keyed by the `user_id` of a valid bearer token, otherwise by client IP.
+    The first matching rule wins; requests matching no rule pass straight through.
+    Behind `trusted_proxies` reverse proxies, the client IP is the address the outermost of
+    them appended to `X-Forwarded-For`; entries further left are set by the client.
+    """
+
+    def __init__(
+        self,
+        app,
+        rules: List[RateLimitRule],
+        backend,
+        jwt_secret: str,
+        jwt_algorithm: str = 'HS256',
+        trusted_proxies: int = 0,
+        enabled: bool = True,
+    ):
+        self.app = app
+        self.rules = rules
+        self.backend = backend
+        self.tokens = BearerTokenCache(jwt_secret, jwt_algorithm)
+        self.trusted_proxies = trusted_proxies
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+            return await self.app(scope, receive, send)
+
+        rule = self._match(scope['method'], scope['path'])
+        if rule is None:
+            return await self.app(scope, receive, send)
+
+        key = f"{rule.name}:{self._identify(scope)}"
+        try:
+            allowed, retry_after = await self.backend.consume(key, rule)
+        except Exception as e:
+            # Fail open: a broken limiter backend must not take the API down
+            logger.warning("Rate limiter backend error: %s", e)
+            allowed, retry_after = True, 0.0
+
+        if allowed:
+            return await self.app(scope, receive, send)
+        await self._reject(send, retry_after)
+
+    def _match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def _identify(self, scope) -> str:
+        forwarded_for = []
+        for name, value in scope['headers']:
+            if name == b'authorization' and value[:7].lower() == b'bearer ':
+                user_id = self.tokens.user_id(value[7:])
+                if user_id:
+                    return 'user:' + user_id
+            elif name == b'x-forwarded-for' and self.trusted_proxies:
+                forwarded_for += [hop.strip() for hop in value.split(b',')]
+        if self.trusted_proxies and len(forwarded_for) >= self.trusted_proxies:
+            return 'ip:' + forwarded_for[-self.trusted_proxies].decode('latin-1')
+        client = scope.get('client')
+        return 'ip:' + (client[0] if client else 'unknown')
+
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 429,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,173 @@
+"""Compact registration documents and the online migration to them.
+
+Schema version 2 keeps only what the registration itself owns:
+
+    {"_id": Binary(uuid, 4), "event_id": ..., "user_id": ..., "registered_at": ..., "checked_in": false}
+
+The API still exposes the UUID string as `id`. The QR code is rendered on request from
+event_id and user_id, and names and emails are read from `users`. Version 1 documents
+(ObjectId `_id`, string `id`, base64 `qr_code`, copies of the user's name and email) are read
+until `python registrations.py --migrate` has rewritten them.
+
+Usage: python registrations.py --report | --migrate [--batch-size N]
+"""
+import argparse
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from bson import Binary, encode
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+# Fields each read path needs; nothing else leaves the database
+PROJECTIONS = {
+    'owner': {"_id": 1, "id": 1, "event_id": 1, "user_id": 1, "registered_at": 1, "checked_in": 1, "checked_in_at": 1},
+    'event_list': {"_id": 1, "id": 1, "user_id": 1, "registered_at": 1, "checked_in": 1, "checked_in_at": 1},
+    'checkin': {"_id": 1, "id": 1, "event_id": 1, "user_id": 1, "checked_in": 1},
+    'exists': {"_id": 1},
+}
+
+
+def new_document(event_id: str, user_id: str) -> dict:
+    return {
+        "_id": Binary.from_uuid(uuid.uuid4()),
+        "event_id": event_id,
+        "user_id": user_id,
+        "registered_at": datetime.now(timezone.utc).isoformat(),
+        "checked_in": False,
+    }
+
+
+def registration_id(doc: dict) -> str:
+    return doc['id'] if 'id' in doc else str(doc['_id'].as_uuid())
+
+
+def to_api(doc: dict) -> dict:
+    out = {k: v for k, v in doc.items() if k != '_id'}
+    out['id'] = registration_id(doc)
+    return out
+
+
+def id_query(value: str) -> Optional[dict]:
+    """Filter matching a registration id in either schema version, or None if it is not a UUID."""
+    try:
+        binary_id = Binary.from_uuid(uuid.UUID(value))
+    except ValueError:
+        return None
+    return {"$or": [{"_id": binary_id}, {"id": value}]}
+
+
+async def ensure_indexes(db):
+    # Only version 1 documents have `id`; the index empties out as the migration runs
+    await db.registrations.create_index("id", partialFilterExpression={"id": {"$exists": True}})
+    # Listings join names and emails from users on every request
+    await db.users.create_index("id", unique=True)
+
+
+def compact(doc: dict) -> dict:
+    new = {
+        "_id": Binary.from_uuid(uuid.UUID(doc['id'])),
+        "event_id": doc['event_id'],
+        "user_id": doc['user_id'],
+        "registered_at": doc['registered_at'],
+        "checked_in": doc.get('checked_in', False),
+    }
+    if doc.get('checked_in_at'):
+        new['checked_in_at'] = doc['checked_in_at']
+    return new
+
+
+async def migrate(db, batch_size: int = 1000, pause: float = 0.0) -> int:
+    """Rewrite version 1 documents in batches while the API keeps serving.
+
+    Each batch upserts the compact copies, then deletes the originals only if they are unchanged.
+    An original that was checked in meanwhile stays and is copied again by the next batch.
+    """
+    migrated = 0
+    while True:
+        docs = await db.registrations.find({"id": {"$exists": True}}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return migrated
+        try:
+            await db.registrations.bulk_write(
+                [ReplaceOne({"_id": compact(doc)['_id']}, compact(doc), upsert=True) for doc in docs], ordered=False
+            )
+        except BulkWriteError as e:
+            # A concurrent run may have upserted the same copy
+            if any(err['code'] != 11000 for err in e.details['writeErrors']):
+                raise
+        for doc in docs:
+            result = await db.registrations.delete_one({"_id": doc['_id'], "checked_in": doc.get('checked_in', False)})
+            migrated += result.deleted_count
+        if pause:
+            await asyncio.sleep(pause)
+
+
+async def storage_report(db, sample_size: int = 1000) -> dict:
+    stats = await db.command("collStats", "registrations")
+    report = {
+        "count": stats['count'],
+        "size_bytes": stats['size'],
+        "storage_bytes": stats['storageSize'],
+        "index_bytes": stats['totalIndexSize'],
+        "index_sizes": stats['indexSizes'],
+        "avg_document_bytes": stats.get('avgObjSize', 0),
+    }
+
+    legacy_count = await db.registrations.count_documents({"id": {"$exists": True}})
+    legacy = await db.registrations.find({"id": {"$exists": True}}).limit(sample_size).to_list(sample_size)
+    if legacy:
+        before = sum(len(encode(doc)) for doc in legacy) / len(legacy)
+        after = sum(len(encode(compact(doc))) for doc in legacy) / len(legacy)
+        report["legacy_documents"] = legacy_count
+        report["legacy_avg_bytes"] = round(before)
+        report["compact_avg_bytes"] = round(after)
+        # Document bytes only; the partial `id` index also empties out
+        report["estimated_saving_bytes"] = round((before - after) * legacy_count)
+    return report
+
+
+def print_report(report: dict):
+    mb = 1024 * 1024
+    print(f"registrations: {report['count']:,} documents, avg {report['avg_document_bytes']:,.0f} bytes")
+    print(f"  data {report['size_bytes'] / mb:,.1f} MB, storage {report['storage_bytes'] / mb:,.1f} MB, "
+          f"indexes {report['index_bytes'] / mb:,.1f} MB")
+    for name, size in report['index_sizes'].items():
+        print(f"    {name}: {size / mb:,.1f} MB")
+    if 'legacy_documents' in report:
+        print(f"  {report['legacy_documents']:,} version 1 documents: avg {report['legacy_avg_bytes']:,} bytes, "
+              f"{report['compact_avg_bytes']:,} bytes compacted")
+        print(f"  working set after migration: about {report['estimated_saving_bytes'] / mb:,.1f} MB smaller")
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Migrate registrations to the compact schema")
+    parser.add_argument('--migrate', action='store_true')
+    parser.add_argument('--report', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds to sleep between batches")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db)
+        if args.report or args.migrate:
+            print_report(await storage_report(db))
+        if args.migrate:
+            print(f"Migrated {await migrate(db, args.batch_size, args.pause):,} registrations")
+            print_report(await storage_report(db))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
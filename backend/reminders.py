@@ -0,0 +1,551 @@
+"""Reminder emails to registrants of events starting soon.
+
+One aggregation selects every registrant of the events starting in the next `hours`. It uses the
+`start_ts` index on events and the `event_id` index on registrations, and joins names and
+emails from `users`. Each event's templates are rendered once; per message only the recipient's
+name and address are filled in. Messages go out in concurrent, rate-limited batches through a
+transport. Every delivery is recorded in `reminder_deliveries`, so an interrupted run resumes
+where it stopped and a registrant is reminded once per event however often the job runs.
+
+Usage: python reminders.py [--hours 24] [--rate 50] [--dry-run]
+       python reminders.py --debug-server [--port 8025]   accepts and prints mail, delivers nothing
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import logging
+import os
+import smtplib
+import uuid
+from datetime import datetime, timezone, timedelta
+from email.header import Header
+from email.utils import formataddr, formatdate
+from html import escape
+from pathlib import Path
+from string import Template
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import venues
+
+logger = logging.getLogger(__name__)
+
+KIND = 'reminder'
+EVENT_FIELDS = ('id', 'title', 'venue', 'start_date', 'start_ts')
+RUN_LEASE = timedelta(minutes=5)
+# Delivery records are kept this long after the event starts
+DELIVERY_RETENTION = timedelta(days=7)
+
+DEFAULT_TEMPLATES = {
+    'subject': "Reminder: $title starts $starts",
+    'text': (
+        "Hi $name,\n\n"
+        "$title starts $starts at $venue.\n\n"
+        "Your ticket QR code is on My Tickets: $tickets_url\n\n"
+        "Event details: $event_url\n\n"
+        "See you there!\n"
+        "Team Campus Pulse\n"
+    ),
+    'html': (
+        '<html><body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">'
+        '<h2>Hi $name,</h2>'
+        '<p><strong>$title</strong> starts $starts at <strong>$venue</strong>.</p>'
+        '<p><a href="$tickets_url">Show your ticket</a> at the entrance. '
+        '<a href="$event_url">Event details</a></p>'
+        '<p style="color: #64748b;">See you there!<br>Team Campus Pulse</p>'
+        '</body></html>'
+    ),
+}
+TEMPLATE_FILES = {'subject': 'reminder_subject.txt', 'text': 'reminder.txt', 'html': 'reminder.html'}
+# Stands in for the recipient's name while the event's part of the templates is rendered
+NAME_SLOT = '\x00name\x00'
+
+
+def load_templates(directory: Optional[Path] = None) -> Dict[str, str]:
+    """DEFAULT_TEMPLATES, overridden by whichever of TEMPLATE_FILES exist in `directory`."""
+    templates = dict(DEFAULT_TEMPLATES)
+    for key, filename in TEMPLATE_FILES.items():
+        if directory and (Path(directory) / filename).exists():
+            templates[key] = (Path(directory) / filename).read_text(encoding='utf-8')
+    return templates
+
+
+def _one_line(value: str) -> str:
+    return ' '.join(str(value).split())
+
+
+def _base64_lines(text: str) -> bytes:
+    return base64.encodebytes(text.encode('utf-8')).replace(b'\n', b'\r\n')
+
+
+class RenderedEvent:
+    """An event's reminder, rendered once, with only the recipient left to fill in."""
+
+    def __init__(self, event: dict, templates: Dict[str, str], sender: str, app_url: str):
+        self.event_id = event['id']
+        self.domain = sender.rpartition('@')[2].rstrip('>') or 'localhost'
+        # start_ts is stored in UTC; registrants read the campus wall-clock time
+        start = event['start_ts']
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        start = start.astimezone(venues.event_timezone())
+        fields = {
+            'title': _one_line(event['title']),
+            'venue': _one_line(event.get('venue') or 'TBD'),
+            'starts': start.strftime('%a %d %b %Y, %H:%M %Z'),
+            'event_url': f"{app_url.rstrip('/')}/event/{event['id']}",
+            'tickets_url': f"{app_url.rstrip('/')}/my-tickets",
+        }
+        subject = _one_line(Template(templates['subject']).safe_substitute(fields, name=''))
+        self._text = Template(templates['text']).safe_substitute(fields, name=NAME_SLOT).split(NAME_SLOT)
+        self._html = Template(templates['html']).safe_substitute(
+            {k: escape(v) for k, v in fields.items()}, name=NAME_SLOT
+        ).split(NAME_SLOT)
+
+        token = uuid.uuid4().hex
+        # Message-IDs share the event's random token and differ by a counter
+        self._message_ids = (f"{token}.{n}@{self.domain}" for n in itertools.count())
+        boundary = f"=_{token}"
+        self._head = (
+            f"From: {sender}\r\n"
+            f"Subject: {subject if subject.isascii() else Header(subject, 'utf-8').encode()}\r\n"
+            f"Date: {formatdate(usegmt=True)}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+        ).encode()
+        part = "Content-Transfer-Encoding: base64\r\n\r\n"
+        self._text_part = f"\r\n--{boundary}\r\nContent-Type: text/plain; charset=utf-8\r\n{part}".encode()
+        self._html_part = f"--{boundary}\r\nContent-Type: text/html; charset=utf-8\r\n{part}".encode()
+        self._end = f"--{boundary}--\r\n".encode()
+
+    def message(self, name: str, email: str) -> bytes:
+        name = _one_line(name)
+        return b''.join((
+            self._head,
+            f"To: {formataddr((name, email), charset='utf-8')}\r\n"
+            f"Message-ID: <{next(self._message_ids)}>\r\n".encode(),
+            self._text_part,
+            _base64_lines(name.join(self._text)),
+            self._html_part,
+            _base64_lines(escape(name).join(self._html)),
+            self._end,
+        ))
+
+
+class SmtpTransport:
+    """Sends through an SMTP server, keeping one connection open per concurrent batch.
+
+    smtplib blocks, so each batch runs in a thread.
+    """
+
+    def __init__(self, host: str, port: int = 25, username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = False, use_ssl: bool = False, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._idle: List[smtplib.SMTP] = []
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password or '')
+        return connection
+
+    def _send_batch(self, connection: Optional[smtplib.SMTP], sender: str,
+                    messages: List[Tuple[str, bytes]]) -> Tuple[Optional[smtplib.SMTP], List[Optional[str]]]:
+        errors: List[Optional[str]] = []
+        for to, message in messages:
+            for attempt in (1, 2):
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    connection.sendmail(sender, [to], message)
+                    errors.append(None)
+                    break
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    # Reconnect once; a server that keeps dropping fails the message
+                    connection = None
+                    if attempt == 2:
+                        errors.append(f"{type(e).__name__}: {e}")
+                except smtplib.SMTPRecipientsRefused as e:
+                    errors.append(str(e.recipients.get(to, e)))
+                    break
+                except smtplib.SMTPException as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+                    break
+        return connection, errors
+
+    async def send(self, sender: str, messages: List[Tuple[str, bytes]]) -> List[Optional[str]]:
+        """Sends each (address, message) and returns an error string or None for each, in order."""
+        connection = self._idle.pop() if self._idle else None
+        connection, errors = await asyncio.to_thread(self._send_batch, connection, sender, messages)
+        if connection is not None:
+            self._idle.append(connection)
+        return errors
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            try:
+                await asyncio.to_thread(connection.quit)
+            except smtplib.SMTPException:
+                pass
+
+
+class DebugSmtpServer:
+    """Minimal local SMTP server that accepts every message and delivers none.
+
+    For development and benchmarks: point SMTP_HOST/SMTP_PORT at it. Messages are kept in
+    `messages` (up to `keep`) and passed to `on_message`.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8025, keep: int = 1000,
+                 on_message: Optional[Callable[[str, List[str], bytes], None]] = None):
+        self.host = host
+        self.port = port
+        self.keep = keep
+        self.on_message = on_message
+        self.received = 0
+        self.messages: List[Tuple[str, List[str], bytes]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async def reply(line: str):
+            writer.write(line.encode() + b'\r\n')
+            await writer.drain()
+
+        sender, recipients = '', []
+        await reply("220 campus-pulse debug SMTP")
+        try:
+            while line := await reader.readline():
+                command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+                command = command.upper()
+                if command == 'EHLO':
+                    await reply("250-localhost\r\n250 8BITMIME")
+                elif command in ('HELO', 'NOOP'):
+                    await reply("250 OK")
+                elif command == 'MAIL':
+                    sender, recipients = argument.partition(':')[2].strip(), []
+                    await reply("250 OK")
+                elif command == 'RCPT':
+                    recipients.append(argument.partition(':')[2].strip())
+                    await reply("250 OK")
+                elif command == 'RSET':
+                    sender, recipients = '', []
+                    await reply("250 OK")
+                elif command == 'DATA':
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b'.\r\n', b'.\n', b''):
+                        lines.append(data[1:] if data.startswith(b'.') else data)
+                    self._received(sender, recipients, b''.join(lines))
+                    await reply("250 OK queued")
+                elif command == 'QUIT':
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _received(self, sender: str, recipients: List[str], message: bytes):
+        self.received += 1
+        if len(self.messages) < self.keep:
+            self.messages.append((sender, recipients, message))
+        if self.on_message:
+            self.on_message(sender, recipients, message)
+
+
+class RatePacer:
+    """Spaces batches out so that at most `rate` messages per second are handed to the transport."""
+
+    def __init__(self, rate: Optional[float] = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+
+    async def wait(self, count: int):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next)
+        self._next = start + count * self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def ensure_indexes(db):
+    await db.events.create_index("start_ts")
+    await db.registrations.create_index("event_id")
+    await db.users.create_index("id", unique=True)
+    await db.reminder_deliveries.create_index([("event_id", 1), ("state", 1)])
+    await db.reminder_deliveries.create_index("expires_at", expireAfterSeconds=0)
+
+
+def recipient_pipeline(start: datetime, end: datetime) -> List[dict]:
+    """One row per registrant of each event starting in [start, end), grouped by event."""
+    return [
+        {"$match": {"start_ts": {"$gte": start, "$lt": end}, "status": {"$ne": "cancelled"}}},
+        {"$sort": {"start_ts": 1, "id": 1}},
+        {"$project": {"_id": 0, **{field: 1 for field in EVENT_FIELDS}}},
+        {"$lookup": {"from": "registrations", "localField": "id", "foreignField": "event_id", "as": "registration"}},
+        {"$unwind": "$registration"},
+        {"$lookup": {"from": "users", "localField": "registration.user_id", "foreignField": "id", "as": "user"}},
+        {"$unwind": "$user"},
+        {"$project": {
+            "event": {field: f"${field}" for field in EVENT_FIELDS},
+            "user_id": "$user.id",
+            "name": "$user.name",
+            "email": "$user.email",
+        }},
+    ]
+
+
+async def acquire_run(db, run_id: str) -> bool:
+    """Take the run lease, so overlapping runs (e.g. a slow cron job) don't send in parallel."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.reminder_runs.update_one(
+            {"_id": KIND, "locked_until": {"$lte": now}},
+            {"$set": {"run_id": run_id, "locked_until": now + RUN_LEASE, "started_at": now}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def extend_run(db, run_id: str):
+    await db.reminder_runs.update_one(
+        {"_id": KIND, "run_id": run_id},
+        {"$set": {"locked_until": datetime.now(timezone.utc) + RUN_LEASE}},
+    )
+
+
+async def release_run(db, run_id: str):
+    await db.reminder_runs.update_one(
+        {"_id": KIND, "run_id": run_id},
+        {"$set": {"locked_until": datetime(1970, 1, 1, tzinfo=timezone.utc), "finished_at": datetime.now(timezone.utc)}},
+    )
+
+
+async def finished_user_ids(deliveries, event_id: str, max_attempts: int) -> set:
+    """Registrants of `event_id` already reminded, or whose address failed too often to retry."""
+    done = deliveries.find(
+        {"event_id": event_id, "$or": [{"state": "sent"}, {"attempts": {"$gte": max_attempts}}]},
+        {"_id": 0, "user_id": 1},
+    )
+    return {doc['user_id'] async for doc in done}
+
+
+class ReminderDispatcher:
+    """Sends one run's reminders: `await dispatcher.run()` returns the run's counts."""
+
+    def __init__(self, db, transport, sender: str, app_url: str, templates: Optional[Dict[str, str]] = None,
+                 batch_size: int = 100, concurrency: int = 4, rate: Optional[float] = None,
+                 max_attempts: int = 3, deliveries=None):
+        self.db = db
+        self.transport = transport
+        self.sender = sender
+        self.envelope_sender = sender.rpartition('<')[2].rstrip('>')
+        self.app_url = app_url
+        self.templates = templates or DEFAULT_TEMPLATES
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.pacer = RatePacer(rate)
+        self.max_attempts = max_attempts
+        # Delivery records are best effort bookkeeping, like notifications
+        self.deliveries = deliveries if deliveries is not None else db.reminder_deliveries
+
+    async def run(self, hours: float = 24, now: Optional[datetime] = None, dry_run: bool = False) -> dict:
+        now = now or datetime.now(timezone.utc)
+        run_id = str(uuid.uuid4())
+        stats = {"run_id": run_id, "events": 0, "recipients": 0, "skipped": 0, "sent": 0, "failed": 0}
+        if not dry_run and not await acquire_run(self.db, run_id):
+            logger.info("Another reminder run holds the lease; skipping")
+            stats["locked"] = True
+            return stats
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        senders = [asyncio.create_task(self._send_batches(queue, run_id, stats)) for _ in range(self.concurrency)]
+        try:
+            await self._select(queue, now, now + timedelta(hours=hours), stats, dry_run)
+            for _ in senders:
+                await queue.put(None)
+            await asyncio.gather(*senders)
+        finally:
+            for task in senders:
+                task.cancel()
+            if not dry_run:
+                await release_run(self.db, run_id)
+        return stats
+
+    async def _select(self, queue: asyncio.Queue, start: datetime, end: datetime, stats: dict, dry_run: bool):
+        rendered: Optional[RenderedEvent] = None
+        done: set = set()
+        batch: List[tuple] = []
+        async for row in self.db.events.aggregate(recipient_pipeline(start, end)):
+            event = row['event']
+            if rendered is None or rendered.event_id != event['id']:
+                if batch:
+                    await queue.put(batch)
+                    batch = []
+                rendered = RenderedEvent(event, self.templates, self.sender, self.app_url)
+                done = await finished_user_ids(self.deliveries, event['id'], self.max_attempts)
+                stats["events"] += 1
+                expires_at = event['start_ts'] + DELIVERY_RETENTION
+            stats["recipients"] += 1
+            if row['user_id'] in done or not row.get('email'):
+                stats["skipped"] += 1
+                continue
+            if dry_run:
+                continue
+            message = rendered.message(row.get('name') or '', row['email'])
+            batch.append((event['id'], row['user_id'], row['email'], message, expires_at))
+            if len(batch) >= self.batch_size:
+                await queue.put(batch)
+                batch = []
+        if batch:
+            await queue.put(batch)
+
+    async def _send_batches(self, queue: asyncio.Queue, run_id: str, stats: dict):
+        while (batch := await queue.get()) is not None:
+            await self.pacer.wait(len(batch))
+            try:
+                errors = await self.transport.send(self.envelope_sender, [(email, message) for _, _, email, message, _ in batch])
+            except Exception as e:
+                logger.warning("Reminder batch failed: %s", e)
+                errors = [f"{type(e).__name__}: {e}"] * len(batch)
+            now = datetime.now(timezone.utc)
+            writes = [
+                UpdateOne(
+                    {"_id": f"{KIND}:{event_id}:{user_id}"},
+                    {
+                        "$set": {
+                            "event_id": event_id,
+                            "user_id": user_id,
+                            "email": email,
+                            "state": "failed" if error else "sent",
+                            "error": error,
+                            "run_id": run_id,
+                            "updated_at": now,
+                            "expires_at": expires_at,
+                        },
+                        "$inc": {"attempts": 1},
+                    },
+                    upsert=True,
+                )
+                for (event_id, user_id, email, _, expires_at), error in zip(batch, errors)
+            ]
+            failed = sum(1 for error in errors if error)
+            stats["sent"] += len(batch) - failed
+            stats["failed"] += failed
+            try:
+                await self.deliveries.bulk_write(writes, ordered=False)
+                await extend_run(self.db, run_id)
+            except Exception as e:
+                # The next run sends this batch again rather than lose it
+                logger.warning("Could not record reminder deliveries: %s", e)
+
+
+def smtp_transport_from_env() -> SmtpTransport:
+    port = int(os.environ.get('SMTP_PORT', '25'))
+    return SmtpTransport(
+        os.environ.get('SMTP_HOST', 'localhost'),
+        port,
+        username=os.environ.get('SMTP_USER') or None,
+        password=os.environ.get('SMTP_PASSWORD') or None,
+        # Submission (587) upgrades with STARTTLS, SMTPS (465) is TLS from the start
+        starttls=os.environ.get('SMTP_STARTTLS', str(port == 587)).lower() == 'true',
+        use_ssl=os.environ.get('SMTP_SSL', str(port == 465)).lower() == 'true',
+    )
+
+
+def sender_from_env() -> str:
+    return formataddr((os.environ.get('FROM_NAME', 'Campus Pulse'), os.environ.get('FROM_EMAIL', 'noreply@localhost')))
+
+
+async def serve_debug(host: str, port: int):
+    def show(sender, recipients, message):
+        subject = next((line for line in message.split(b'\r\n') if line.startswith(b'Subject:')), b'')
+        print(f"{sender} -> {', '.join(recipients)}: {subject.decode('ascii', 'replace')}", flush=True)
+
+    server = DebugSmtpServer(host, port, keep=0, on_message=show)
+    await server.start()
+    logger.info("Debug SMTP server listening on %s:%s", host, server.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Email reminders to registrants of events starting soon")
+    parser.add_argument('--hours', type=float, default=float(os.environ.get('REMINDER_HOURS', '24')))
+    parser.add_argument('--rate', type=float, default=float(os.environ.get('REMINDER_RATE_PER_SECOND', '50')),
+                        help="messages per second, 0 for unlimited")
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('REMINDER_CONCURRENCY', '4')))
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('REMINDER_BATCH_SIZE', '100')))
+    parser.add_argument('--template-dir', default=os.environ.get('REMINDER_TEMPLATE_DIR'))
+    parser.add_argument('--dry-run', action='store_true', help="count recipients without sending")
+    parser.add_argument('--debug-server', action='store_true')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    if args.debug_server:
+        await serve_debug(args.host, args.port)
+        return
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    transport = smtp_transport_from_env()
+    try:
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db)
+        dispatcher = ReminderDispatcher(
+            db,
+            transport,
+            sender_from_env(),
+            os.environ.get('APP_URL', 'http://localhost:3000'),
+            templates=load_templates(args.template_dir),
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            rate=args.rate or None,
+        )
+        stats = await dispatcher.run(hours=args.hours, dry_run=args.dry_run)
+        logger.info("Reminder run %s", stats)
+    finally:
+        await transport.close()
+        client.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """In-memory set of revoked access tokens, mirrored from a TTL collection shared by all workers.
+
+    Two kinds of entries:
+      - a token id (`jti`), revoked until the token expires (logout)
+      - a user id with a cut-off time; tokens issued before it are revoked (role or profile change)
+
+    Access tokens are short-lived, so both kinds expire quickly and the set stays small.
+    """
+
+    def __init__(self, get_collection: Callable, sync_seconds: float = 1.0, overlap: timedelta = timedelta(seconds=30)):
+        self.get_collection = get_collection
+        self.sync_seconds = sync_seconds
+        # Entries written by workers with slightly different clocks are still picked up
+        self.overlap = overlap
+        self._tokens: Dict[str, float] = {}
+        self._users: Dict[str, tuple] = {}
+        self._synced_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: str, user_id: str, issued_at: float) -> bool:
+        if jti in self._tokens:
+            return True
+        user = self._users.get(user_id)
+        return user is not None and issued_at < user[0]
+
+    async def ensure_indexes(self):
+        collection = self.get_collection()
+        await collection.create_index("expires_at", expireAfterSeconds=0)
+        await collection.create_index("created_at")
+
+    async def revoke_token(self, jti: str, expires_at: datetime):
+        self._tokens[jti] = expires_at.timestamp()
+        await self.get_collection().update_one(
+            {"_id": f"jti:{jti}"},
+            {"$set": {"jti": jti, "expires_at": expires_at, "created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def revoke_user(self, user_id: str, token_lifetime: timedelta):
+        now = datetime.now(timezone.utc)
+        revoked_before = now.timestamp()
+        expires_at = now + token_lifetime
+        self._users[user_id] = (revoked_before, expires_at.timestamp())
+        await self.get_collection().update_one(
+            {"_id": f"user:{user_id}"},
+            {"$set": {"user_id": user_id, "revoked_before": revoked_before, "expires_at": expires_at, "created_at": now}},
+            upsert=True,
+        )
+
+    async def sync(self):
+        query = {}
+        if self._synced_until is not None:
+            query["created_at"] = {"$gt": self._synced_until - self.overlap}
+        latest = self._synced_until
+        async for entry in self.get_collection().find(query):
+            expires_at = entry['expires_at'].replace(tzinfo=timezone.utc).timestamp()
+            if 'jti' in entry:
+                self._tokens[entry['jti']] = expires_at
+            else:
+                current = self._users.get(entry['user_id'])
+                if current is None or current[0] < entry['revoked_before']:
+                    self._users[entry['user_id']] = (entry['revoked_before'], expires_at)
+            created_at = entry['created_at'].replace(tzinfo=timezone.utc)
+            if latest is None or created_at > latest:
+                latest = created_at
+        self._synced_until = latest
+        self._prune()
+
+    def _prune(self):
+        now = time.time()
+        self._tokens = {k: v for k, v in self._tokens.items() if v > now}
+        self._users = {k: v for k, v in self._users.items() if v[1] > now}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning("Revocation list sync failed: %s", e)
+            await asyncio.sleep(self.sync_seconds)
@@ -1,8 +1,15 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, ReturnDocument
+from pymongo.write_concern import WriteConcern
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
 from pathlib import Path
@@ -11,27 +18,153 @@ from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
-import bcrypt
-import qrcode
+import hashlib
+import secrets
 import io
-import base64
 from enum import Enum
+from media import ImagePipeline, InvalidImage, decode_data_url, store_from_env
+import archive
+import timeseries
+import timetable
+import registrations
+import venues
+from event_cache import EventOwnershipCache, OWNERSHIP_FIELDS
+from event_projection import EventProjection
+from revocation import RevocationList
+from idempotency import IdempotencyStore, IdempotencyMiddleware
+from rate_limit import RateLimitRule, RateLimitMiddleware, InMemoryRateLimitBackend, MongoRateLimitBackend
 
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+if (ROOT_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection settings (per worker process; total connections = workers * max pool size)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+DB_NAME = os.environ['DB_NAME']
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+# Listings and analytics tolerate slightly stale data, so they may be served by replicas
+MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1'))
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.environ.get('HEALTH_CHECK_TIMEOUT_SECONDS', '2'))
+# Index builds are idempotent; deployments that create them out of band can skip the round trips
+MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+# Write concerns per operation class
+CRITICAL_WRITE_CONCERN = WriteConcern(w='majority', wtimeout=5000)  # users, events, registrations
+BEST_EFFORT_WRITE_CONCERN = WriteConcern(w=1)  # notifications and other derived data
+
+# Set up by the lifespan hook of each worker
+client: Optional[AsyncIOMotorClient] = None
+db = None       # primary reads, majority writes
+read_db = None  # replica-friendly reads for listings and analytics
+log_db = None   # acknowledged-by-primary writes for best-effort data
+startup_ms: Optional[float] = None  # from module import to the end of lifespan start-up
+
+def connect_db():
+    global client, db, read_db, log_db
+    client = AsyncIOMotorClient(
+        mongo_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        retryWrites=True,
+        retryReads=True,
+    )
+    read_preference = READ_PREFERENCES[MONGO_READ_PREFERENCE]
+    if MONGO_MAX_STALENESS_SECONDS > 0 and read_preference.mode != ReadPreference.PRIMARY.mode:
+        read_preference = type(read_preference)(max_staleness=MONGO_MAX_STALENESS_SECONDS)
+    db = client.get_database(DB_NAME, write_concern=CRITICAL_WRITE_CONCERN)
+    read_db = client.get_database(DB_NAME, read_preference=read_preference)
+    log_db = client.get_database(DB_NAME, write_concern=BEST_EFFORT_WRITE_CONCERN)
+
+def close_db():
+    global client
+    if client is not None:
+        client.close()
+        client = None
 
 # JWT Settings
 JWT_SECRET = os.environ.get('JWT_SECRET', 'campus-pulse-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_HOURS = 24
+ACCESS_TOKEN_EXPIRATION_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRATION_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRATION_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRATION_DAYS', '30'))
+# A refresh token presented again within this window (e.g. two tabs refreshing at once) is not treated as stolen
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.environ.get('REFRESH_TOKEN_REUSE_GRACE_SECONDS', '10'))
+REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', '1'))
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=ACCESS_TOKEN_EXPIRATION_MINUTES)
+
+# Rate limiting ("<limit>/<second|minute|hour|day>" token bucket budgets, keyed by user id or client IP)
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # "memory" (per worker) or "mongo" (shared)
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.environ.get('RATE_LIMIT_TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+# Reverse proxies in front of the API that append to X-Forwarded-For; the flag above means one
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '1' if RATE_LIMIT_TRUST_FORWARDED_FOR else '0'))
+
+RATE_LIMIT_RULES = [
+    RateLimitRule.from_string("login", "POST", "/api/auth/login", os.environ.get('RATE_LIMIT_LOGIN', '10/minute')),
+    RateLimitRule.from_string("signup", "POST", "/api/auth/register", os.environ.get('RATE_LIMIT_SIGNUP', '5/minute')),
+    RateLimitRule.from_string("event_registration", "POST", "/api/registrations/{event_id}", os.environ.get('RATE_LIMIT_EVENT_REGISTRATION', '20/minute')),
+    RateLimitRule.from_string("checkin", "POST", "/api/registrations/checkin/{registration_id}", os.environ.get('RATE_LIMIT_CHECKIN', '120/minute')),
+]
+# Optional catch-all budget; off by default because anonymous visitors behind a campus NAT share one IP
+if os.environ.get('RATE_LIMIT_DEFAULT'):
+    RATE_LIMIT_RULES.append(RateLimitRule.from_string("default", "*", "/api/{path:path}", os.environ['RATE_LIMIT_DEFAULT']))
+
+# Image storage (MEDIA_BACKEND "local" disk or "s3" for any S3-compatible store)
+MEDIA_URL_PREFIX = os.environ.get('MEDIA_URL_PREFIX', '/api/media')
+MEDIA_MAX_UPLOAD_BYTES = int(os.environ.get('MEDIA_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', '2'))
 
-# Create the main app
-app = FastAPI()
+# Archival of deleted and completed events ("mongo" archived_* collections or "jsonl" gzip files)
+ARCHIVE_BACKEND = os.environ.get('ARCHIVE_BACKEND', 'mongo')
+ARCHIVE_ROOT = Path(os.environ.get('ARCHIVE_ROOT', ROOT_DIR / 'archive'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+ARCHIVE_COMPLETED_AFTER_DAYS = os.environ.get('ARCHIVE_COMPLETED_AFTER_DAYS')  # unset: keep completed events
+
+EVENT_CACHE_TTL_SECONDS = float(os.environ.get('EVENT_CACHE_TTL_SECONDS', '30'))
+
+# In-memory copy of the events collection serving GET /api/events
+# ("auto" follows a change stream, or polls on a standalone mongod; "poll"; "off" reads MongoDB)
+EVENT_PROJECTION_MODE = os.environ.get('EVENT_PROJECTION_MODE', 'auto')
+EVENT_PROJECTION_POLL_SECONDS = float(os.environ.get('EVENT_PROJECTION_POLL_SECONDS', '5'))
+
+# Overlapping bookings at the same venue are rejected, except for venues like "Online"
+VENUE_CONFLICT_CHECK = os.environ.get('VENUE_CONFLICT_CHECK', 'true').lower() == 'true'
+VENUE_CONFLICT_EXEMPT = {
+    venues.normalize_venue(v) for v in os.environ.get('VENUE_CONFLICT_EXEMPT', 'online,tbd').split(',') if v.strip()
+}
+VENUE_AVAILABILITY_MAX_DAYS = int(os.environ.get('VENUE_AVAILABILITY_MAX_DAYS', '92'))
+
+# What happens when a student registers for an event overlapping one they're already registered for
+REGISTRATION_CLASH_POLICY = os.environ.get('REGISTRATION_CLASH_POLICY', 'warn')  # warn, block or off
+
+# Retried writes carrying the same Idempotency-Key get the original response back
+IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+IDEMPOTENCY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENT_ROUTES = [
+    ("POST", "/api/events"),
+    ("POST", "/api/registrations/{event_id}"),
+    ("POST", "/api/feedbacks"),
+]
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -82,6 +215,15 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+class RoleUpdate(BaseModel):
+    role: UserRole
+
 class UserProfile(BaseModel):
     id: str
     email: EmailStr
@@ -149,13 +291,12 @@ class EventUpdate(BaseModel):
 
 class Registration(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str
     event_id: str
     user_id: str
-    user_name: str
-    user_email: str
-    qr_code: str
-    registered_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    user_name: Optional[str] = None
+    user_email: Optional[str] = None
+    registered_at: str
     checked_in: bool = False
     checked_in_at: Optional[str] = None
 
@@ -178,6 +319,7 @@ class Notification(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
+    event_id: Optional[str] = None
     title: str
     message: str
     read: bool = False
@@ -185,17 +327,25 @@ class Notification(BaseModel):
 
 # Helper Functions
 def hash_password(password: str) -> str:
+    import bcrypt
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_jwt_token(user_id: str, email: str, role: str) -> str:
+def create_jwt_token(user_id: str, email: str, role: str, name: str) -> str:
+    now = datetime.now(timezone.utc)
     payload = {
         'user_id': user_id,
         'email': email,
         'role': role,
-        'exp': datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+        'name': name,
+        'type': 'access',
+        'jti': uuid.uuid4().hex,
+        # Sub-second precision, so a token issued right after a revocation is not caught by it
+        'iat': now.timestamp(),
+        'exp': now + ACCESS_TOKEN_LIFETIME
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
@@ -207,26 +357,111 @@ def decode_jwt_token(token: str) -> dict:
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    token = credentials.credentials
-    payload = decode_jwt_token(token)
-    user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+async def issue_tokens(user: dict, family_id: Optional[str] = None) -> dict:
+    # Refresh tokens are opaque and stored hashed; each use rotates to a new token in the same family
+    refresh_token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    await db.refresh_tokens.insert_one({
+        "_id": hash_refresh_token(refresh_token),
+        "user_id": user['id'],
+        "family_id": family_id or uuid.uuid4().hex,
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRATION_DAYS),
+        "used_at": None
+    })
+    return {
+        "token": create_jwt_token(user['id'], user['email'], user['role'], user['name']),
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRATION_MINUTES * 60
+    }
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    # Identity comes from the signed claims; revoked tokens are caught by the in-memory revocation list
+    payload = decode_jwt_token(credentials.credentials)
+    if payload.get('type') != 'access':
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if request.app.state.revocation_list.is_revoked(payload['jti'], payload['user_id'], payload['iat']):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return {
+        "id": payload['user_id'],
+        "email": payload['email'],
+        "role": payload['role'],
+        "name": payload['name'],
+        "token_id": payload['jti'],
+        "token_expires_at": payload['exp']
+    }
+
+async def get_event_ownership(request: Request, event_id: str) -> dict:
+    event_cache = request.app.state.event_cache
+    event = event_cache.get(event_id)
+    if event is None:
+        event = await db.events.find_one({"id": event_id}, {"_id": 0, **{f: 1 for f in OWNERSHIP_FIELDS}})
+        if not event:
+            raise HTTPException(status_code=404, detail="Event not found")
+        event_cache.put(event)
+    return event
+
+def check_event_owner(event: dict, current_user: dict):
+    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+async def authorize_event_owner(event_id: str, request: Request, current_user: dict = Depends(get_current_user)) -> dict:
+    """Ownership fields of the event in the path, from the cache when possible."""
+    event = await get_event_ownership(request, event_id)
+    check_event_owner(event, current_user)
+    return event
+
+async def get_owned_event(event_id: str, request: Request, current_user: dict = Depends(get_current_user)) -> dict:
+    """The full event in the path, loaded once and shared with the handler."""
+    event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+    request.app.state.event_cache.put(event)
+    check_event_owner(event, current_user)
+    return event
 
-def generate_qr_code(data: str) -> str:
+def generate_qr_png(data: str) -> bytes:
+    # qrcode pulls in Pillow; imported on first use to keep worker start-up fast
+    import qrcode
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(data)
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white")
     buffered = io.BytesIO()
     img.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+    return buffered.getvalue()
+
+def media_url(image_id: str, variant: str = 'medium.webp') -> str:
+    return f"{MEDIA_URL_PREFIX}/{image_id}/{variant}"
+
+async def save_image(request: Request, data: bytes) -> str:
+    if len(data) > MEDIA_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    try:
+        return await request.app.state.image_pipeline.save(data)
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def resolve_image_reference(request: Request, value: Optional[str], variant: str = 'medium.webp') -> Optional[str]:
+    # Inline data URLs are stored once and replaced by a short media URL
+    if not value or not value.startswith('data:image/'):
+        return value
+    try:
+        data = decode_data_url(value)
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return media_url(await save_image(request, data), variant)
+
+async def record_timeseries(event_id: str, metric: str):
+    selector, update = timeseries.bucket_update(event_id, metric)
+    await log_db.event_timeseries.update_one(selector, update, upsert=True)
 
-async def create_notification(user_id: str, title: str, message: str):
-    notification = Notification(user_id=user_id, title=title, message=message)
-    await db.notifications.insert_one(notification.model_dump())
+async def create_notification(user_id: str, title: str, message: str, event_id: Optional[str] = None):
+    notification = Notification(user_id=user_id, title=title, message=message, event_id=event_id)
+    await log_db.notifications.insert_one(notification.model_dump())
 
 # Auth Routes
 @api_router.post("/auth/register")
@@ -243,10 +478,10 @@ async def register(user_data: UserCreate):
     )
     
     await db.users.insert_one(user.model_dump())
-    token = create_jwt_token(user.id, user.email, user.role)
+    tokens = await issue_tokens(user.model_dump())
     
     return {
-        "token": token,
+        **tokens,
         "user": UserProfile(**user.model_dump())
     }
 
@@ -256,27 +491,87 @@ async def login(credentials: UserLogin):
     if not user or not verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    token = create_jwt_token(user['id'], user['email'], user['role'])
+    tokens = await issue_tokens(user)
     
     return {
-        "token": token,
+        **tokens,
         "user": UserProfile(**user)
     }
 
+@api_router.post("/auth/refresh")
+async def refresh_token(request: RefreshRequest):
+    token_hash = hash_refresh_token(request.refresh_token)
+    now = datetime.now(timezone.utc)
+    stored = await db.refresh_tokens.find_one_and_update(
+        {"_id": token_hash, "used_at": None, "expires_at": {"$gt": now}},
+        {"$set": {"used_at": now}}
+    )
+    if not stored:
+        stored = await db.refresh_tokens.find_one({"_id": token_hash})
+        if not stored or stored['used_at'] is None:
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        used_at = stored['used_at'].replace(tzinfo=timezone.utc)
+        if now - used_at > timedelta(seconds=REFRESH_TOKEN_REUSE_GRACE_SECONDS):
+            # An old token came back: assume it was stolen and end the whole session
+            await db.refresh_tokens.delete_many({"family_id": stored['family_id']})
+            logger.warning("Refresh token reuse detected for user %s", stored['user_id'])
+            raise HTTPException(status_code=401, detail="Refresh token reused")
+    
+    user = await db.users.find_one({"id": stored['user_id']}, {"_id": 0})
+    if not user:
+        await db.refresh_tokens.delete_many({"user_id": stored['user_id']})
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return await issue_tokens(user, stored['family_id'])
+
+@api_router.post("/auth/logout")
+async def logout(request: LogoutRequest, http_request: Request, current_user: dict = Depends(get_current_user)):
+    await http_request.app.state.revocation_list.revoke_token(
+        current_user['token_id'],
+        datetime.fromtimestamp(current_user['token_expires_at'], tz=timezone.utc)
+    )
+    if request.refresh_token:
+        stored = await db.refresh_tokens.find_one({"_id": hash_refresh_token(request.refresh_token), "user_id": current_user['id']})
+        if stored:
+            await db.refresh_tokens.delete_many({"family_id": stored['family_id']})
+    return {"message": "Logged out successfully"}
+
 @api_router.get("/auth/me", response_model=UserProfile)
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return UserProfile(**current_user)
+    user = await db.users.find_one({"id": current_user['id']}, {"_id": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return UserProfile(**user)
 
 # User Routes
 @api_router.put("/users/profile")
-async def update_profile(profile_data: ProfileUpdate, current_user: dict = Depends(get_current_user)):
+async def update_profile(profile_data: ProfileUpdate, request: Request, current_user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in profile_data.model_dump().items() if v is not None}
+    if 'avatar' in update_data:
+        update_data['avatar'] = await resolve_image_reference(request, update_data['avatar'], 'thumb.webp')
     if update_data:
         await db.users.update_one({"id": current_user['id']}, {"$set": update_data})
+    if update_data.get('name', current_user['name']) != current_user['name']:
+        # The name is a token claim; make clients refresh to pick up the new one
+        await request.app.state.revocation_list.revoke_user(current_user['id'], ACCESS_TOKEN_LIFETIME)
     
     updated_user = await db.users.find_one({"id": current_user['id']}, {"_id": 0})
     return UserProfile(**updated_user)
 
+@api_router.put("/users/{user_id}/role", response_model=UserProfile)
+async def update_user_role(user_id: str, role_data: RoleUpdate, request: Request, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    result = await db.users.update_one({"id": user_id}, {"$set": {"role": role_data.role}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Outstanding access tokens carry the old role
+    await request.app.state.revocation_list.revoke_user(user_id, ACCESS_TOKEN_LIFETIME)
+    
+    updated_user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    return UserProfile(**updated_user)
+
 @api_router.get("/users/stats")
 async def get_user_stats(current_user: dict = Depends(get_current_user)):
     if current_user['role'] == 'student':
@@ -298,8 +593,28 @@ async def get_user_stats(current_user: dict = Depends(get_current_user)):
         return {"total_users": total_users, "total_events": total_events, "total_registrations": total_registrations}
 
 # Event Routes
+SCHEDULE_FIELDS = ('venue', 'start_date', 'end_date', 'status', 'venue_key', 'start_ts', 'end_ts', 'booked_at')
+
+def event_schedule(venue: str, start_date: str, end_date: str) -> dict:
+    try:
+        return venues.schedule_fields(venue, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def venue_check_applies(event: dict) -> bool:
+    return VENUE_CONFLICT_CHECK and event.get('status') != 'cancelled' and event['venue_key'] not in VENUE_CONFLICT_EXEMPT
+
+def venue_conflict_detail(conflicts: List[dict]) -> str:
+    first = conflicts[0]
+    return f"{first['title']} is already booked at this venue from {first['start_date']} to {first['end_date']}"
+
+async def ensure_venue_free(event: dict, exclude_id: Optional[str] = None):
+    conflicts = await venues.find_conflicts(db, event['venue_key'], event['start_ts'], event['end_ts'], exclude_id=exclude_id)
+    if conflicts:
+        raise HTTPException(status_code=409, detail=venue_conflict_detail(conflicts))
+
 @api_router.post("/events", response_model=Event)
-async def create_event(event_data: EventCreate, current_user: dict = Depends(get_current_user)):
+async def create_event(event_data: EventCreate, request: Request, current_user: dict = Depends(get_current_user)):
     if current_user['role'] not in ['organizer', 'admin']:
         raise HTTPException(status_code=403, detail="Only organizers and admins can create events")
     
@@ -308,12 +623,28 @@ async def create_event(event_data: EventCreate, current_user: dict = Depends(get
         organizer_id=current_user['id'],
         organizer_name=current_user['name']
     )
+    event.image_url = await resolve_image_reference(request, event.image_url)
+    doc = {**event.model_dump(), **event_schedule(event.venue, event.start_date, event.end_date)}
+    
+    if not venue_check_applies(doc):
+        await db.events.insert_one(doc)
+        request.app.state.event_projection.upsert(doc)
+        return event
     
-    await db.events.insert_one(event.model_dump())
+    await ensure_venue_free(doc)
+    doc['booked_at'] = datetime.now(timezone.utc).isoformat()
+    await venues.record_booking(db, doc['venue'], doc['start_ts'], doc['end_ts'])
+    await db.events.insert_one(doc)
+    conflicts = await venues.find_conflicts(db, doc['venue_key'], doc['start_ts'], doc['end_ts'], exclude_id=event.id)
+    if venues.lost_race(conflicts, doc['booked_at']):
+        await db.events.delete_one({"id": event.id})
+        raise HTTPException(status_code=409, detail=venue_conflict_detail(conflicts))
+    request.app.state.event_projection.upsert(doc)
     return event
 
 @api_router.get("/events", response_model=List[Event])
 async def get_events(
+    request: Request,
     category: Optional[str] = None,
     search: Optional[str] = None,
     status: Optional[str] = None
@@ -329,7 +660,12 @@ async def get_events(
             {"description": {"$regex": search, "$options": "i"}}
         ]
     
-    events = await db.events.find(query, {"_id": 0}).sort("start_date", 1).to_list(1000)
+    event_projection = request.app.state.event_projection
+    # Search runs its regex in mongod, not on this worker's event loop
+    if event_projection.ready and not search:
+        return Response(content=event_projection.query_json(category, status), media_type="application/json")
+    
+    events = await read_db.events.find(query, {"_id": 0}).sort("start_date", 1).to_list(1000)
     return events
 
 @api_router.get("/events/{event_id}", response_model=Event)
@@ -343,32 +679,70 @@ async def get_event(event_id: str):
 async def update_event(
     event_id: str,
     event_data: EventUpdate,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    event: dict = Depends(authorize_event_owner)
 ):
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
+    event_cache = request.app.state.event_cache
+    update_data = {k: v for k, v in event_data.model_dump().items() if v is not None}
+    if 'image_url' in update_data:
+        update_data['image_url'] = await resolve_image_reference(request, update_data['image_url'])
     
-    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    previous = None
+    if update_data.keys() & {'venue', 'start_date', 'end_date', 'status'}:
+        previous = await db.events.find_one({"id": event_id}, {"_id": 0, **{f: 1 for f in SCHEDULE_FIELDS}})
+        if not previous:
+            raise HTTPException(status_code=404, detail="Event not found")
+        booking = {**previous, **update_data}
+        moved = any(booking[f] != previous.get(f) for f in ('venue', 'start_date', 'end_date'))
+        reopened = previous.get('status') == 'cancelled' and booking['status'] != 'cancelled'
+        if moved or 'start_ts' not in previous:
+            update_data.update(event_schedule(booking['venue'], booking['start_date'], booking['end_date']))
+        if (moved or reopened) and venue_check_applies({**booking, **update_data}):
+            booking.update(update_data)
+            await ensure_venue_free(booking, exclude_id=event_id)
+            update_data['booked_at'] = datetime.now(timezone.utc).isoformat()
+            await venues.record_booking(db, booking['venue'], booking['start_ts'], booking['end_ts'])
+        else:
+            previous = None
     
-    update_data = {k: v for k, v in event_data.model_dump().items() if v is not None}
     if update_data:
-        await db.events.update_one({"id": event_id}, {"$set": update_data})
-    
-    updated_event = await db.events.find_one({"id": event_id}, {"_id": 0})
+        updated_event = await db.events.find_one_and_update(
+            {"id": event_id}, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    else:
+        updated_event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    if not updated_event:
+        event_cache.invalidate(event_id)
+        raise HTTPException(status_code=404, detail="Event not found")
+    if previous is not None:
+        conflicts = await venues.find_conflicts(
+            db, updated_event['venue_key'], updated_event['start_ts'], updated_event['end_ts'], exclude_id=event_id
+        )
+        if venues.lost_race(conflicts, update_data['booked_at']):
+            restore = {"$set": {f: previous[f] for f in SCHEDULE_FIELDS if f in previous}}
+            if 'booked_at' not in previous:
+                restore["$unset"] = {"booked_at": ""}
+            await db.events.update_one({"id": event_id}, restore)
+            event_cache.invalidate(event_id)
+            raise HTTPException(status_code=409, detail=venue_conflict_detail(conflicts))
+    event_cache.put(updated_event)
+    request.app.state.event_projection.upsert(updated_event)
     return Event(**updated_event)
 
 @api_router.delete("/events/{event_id}")
-async def delete_event(event_id: str, current_user: dict = Depends(get_current_user)):
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
+async def delete_event(
+    event_id: str,
+    request: Request,
+    event: dict = Depends(get_owned_event),
+    current_user: dict = Depends(get_current_user)
+):
+    state = request.app.state
+    # Registrations, feedback and notifications are moved to the archive in the background
+    await archive.enqueue(db, event, reason="deleted", requested_by=current_user['id'])
     await db.events.delete_one({"id": event_id})
+    state.event_cache.invalidate(event_id)
+    state.event_projection.remove(event_id)
+    state.archive_worker.wake()
     return {"message": "Event deleted successfully"}
 
 @api_router.get("/events/organizer/my-events", response_model=List[Event])
@@ -380,6 +754,20 @@ async def get_my_events(current_user: dict = Depends(get_current_user)):
     events = await db.events.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return events
 
+# Venue Routes
+@api_router.get("/venues/{venue}/availability")
+async def get_venue_availability(venue: str, start: str, end: str, min_duration_minutes: int = 30):
+    try:
+        range_start, range_end = venues.parse_event_time(start), venues.parse_event_time(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be ISO 8601 timestamps")
+    if range_end <= range_start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if range_end - range_start > timedelta(days=VENUE_AVAILABILITY_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Range cannot exceed {VENUE_AVAILABILITY_MAX_DAYS} days")
+    
+    return await venues.availability(read_db, venue, range_start, range_end, timedelta(minutes=max(min_duration_minutes, 1)))
+
 # Registration Routes
 @api_router.post("/registrations/{event_id}")
 async def register_for_event(event_id: str, current_user: dict = Depends(get_current_user)):
@@ -393,68 +781,102 @@ async def register_for_event(event_id: str, current_user: dict = Depends(get_cur
     if event['registered_count'] >= event['capacity']:
         raise HTTPException(status_code=400, detail="Event is full")
     
-    existing_reg = await db.registrations.find_one({"event_id": event_id, "user_id": current_user['id']})
+    existing_reg = await db.registrations.find_one(
+        {"event_id": event_id, "user_id": current_user['id']}, registrations.PROJECTIONS['exists']
+    )
     if existing_reg:
         raise HTTPException(status_code=400, detail="Already registered")
     
-    registration = Registration(
-        event_id=event_id,
-        user_id=current_user['id'],
-        user_name=current_user['name'],
-        user_email=current_user['email'],
-        qr_code=generate_qr_code(f"{event_id}:{current_user['id']}")
-    )
+    clashes = []
+    if REGISTRATION_CLASH_POLICY != 'off' and event.get('start_ts'):
+        clashes = await timetable.find_clashes(db, current_user['id'], event['start_ts'], event['end_ts'], exclude_event_id=event_id)
+        if clashes and REGISTRATION_CLASH_POLICY == 'block':
+            raise HTTPException(
+                status_code=409,
+                detail=f"This event overlaps {clashes[0]['title']} ({clashes[0]['start_date']} to {clashes[0]['end_date']})"
+            )
     
-    await db.registrations.insert_one(registration.model_dump())
+    doc = registrations.new_document(event_id, current_user['id'])
+    await db.registrations.insert_one(doc)
     await db.events.update_one({"id": event_id}, {"$inc": {"registered_count": 1}})
+    await record_timeseries(event_id, 'registrations')
     
     await create_notification(
         current_user['id'],
         "Registration Successful",
-        f"You have successfully registered for {event['title']}"
+        f"You have successfully registered for {event['title']}",
+        event_id
     )
     
-    return registration
+    registration = Registration(
+        **registrations.to_api(doc), user_name=current_user['name'], user_email=current_user['email']
+    )
+    return {**registration.model_dump(), "clashes": clashes}
 
 @api_router.get("/registrations/my-registrations", response_model=List[Registration])
 async def get_my_registrations(current_user: dict = Depends(get_current_user)):
-    registrations = await db.registrations.find({"user_id": current_user['id']}, {"_id": 0}).to_list(1000)
-    return registrations
+    docs = await db.registrations.find(
+        {"user_id": current_user['id']}, registrations.PROJECTIONS['owner']
+    ).to_list(1000)
+    return [
+        {**registrations.to_api(doc), "user_name": current_user['name'], "user_email": current_user['email']}
+        for doc in docs
+    ]
+
+@api_router.get("/registrations/my-schedule")
+async def get_my_schedule(include_past: bool = False, current_user: dict = Depends(get_current_user)):
+    since = None if include_past else datetime.now(timezone.utc)
+    return await timetable.my_schedule(db, current_user['id'], since)
 
 @api_router.get("/registrations/event/{event_id}", response_model=List[Registration])
-async def get_event_registrations(event_id: str, current_user: dict = Depends(get_current_user)):
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Not authorized")
+async def get_event_registrations(event_id: str, event: dict = Depends(authorize_event_owner)):
+    docs = await db.registrations.aggregate([
+        {"$match": {"event_id": event_id}},
+        {"$limit": 1000},
+        {"$project": registrations.PROJECTIONS['event_list']},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {"$addFields": {"event_id": event_id, "user_name": "$user.name", "user_email": "$user.email"}},
+        {"$project": {"user": 0}},
+    ]).to_list(1000)
+    return [registrations.to_api(doc) for doc in docs]
+
+@api_router.get("/registrations/{registration_id}/qr")
+async def get_registration_qr(registration_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    query = registrations.id_query(registration_id)
+    registration = await db.registrations.find_one(query, registrations.PROJECTIONS['checkin']) if query else None
+    if not registration:
+        raise HTTPException(status_code=404, detail="Registration not found")
+    if registration['user_id'] != current_user['id']:
+        check_event_owner(await get_event_ownership(request, registration['event_id']), current_user)
     
-    registrations = await db.registrations.find({"event_id": event_id}, {"_id": 0}).to_list(1000)
-    return registrations
+    png = await asyncio.to_thread(generate_qr_png, f"{registration['event_id']}:{registration['user_id']}")
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": "private, max-age=86400"})
 
 @api_router.post("/registrations/checkin/{registration_id}")
-async def checkin_attendee(registration_id: str, current_user: dict = Depends(get_current_user)):
-    registration = await db.registrations.find_one({"id": registration_id}, {"_id": 0})
+async def checkin_attendee(registration_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    query = registrations.id_query(registration_id)
+    registration = await db.registrations.find_one(query, registrations.PROJECTIONS['checkin']) if query else None
     if not registration:
         raise HTTPException(status_code=404, detail="Registration not found")
     
-    event = await db.events.find_one({"id": registration['event_id']}, {"_id": 0})
-    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    event = await get_event_ownership(request, registration['event_id'])
+    check_event_owner(event, current_user)
     
     if registration['checked_in']:
         raise HTTPException(status_code=400, detail="Already checked in")
     
     await db.registrations.update_one(
-        {"id": registration_id},
+        {"_id": registration['_id']},
         {"$set": {"checked_in": True, "checked_in_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await record_timeseries(registration['event_id'], 'checkins')
     
     await create_notification(
         registration['user_id'],
         "Check-in Successful",
-        f"You have been checked in to {event['title']}"
+        f"You have been checked in to {event['title']}",
+        registration['event_id']
     )
     
     return {"message": "Check-in successful"}
@@ -467,7 +889,7 @@ async def create_feedback(feedback_data: FeedbackCreate, current_user: dict = De
         "event_id": feedback_data.event_id,
         "user_id": current_user['id'],
         "checked_in": True
-    })
+    }, registrations.PROJECTIONS['exists'])
     
     if not registration:
         raise HTTPException(status_code=403, detail="You must attend the event to provide feedback")
@@ -510,41 +932,77 @@ async def mark_notification_read(notification_id: str, current_user: dict = Depe
 
 # Analytics Routes
 @api_router.get("/analytics/event/{event_id}")
-async def get_event_analytics(event_id: str, current_user: dict = Depends(get_current_user)):
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
+async def get_event_analytics(event_id: str, event: dict = Depends(authorize_event_owner)):
+    total_registrations = await read_db.registrations.count_documents({"event_id": event_id})
+    checked_in = await read_db.registrations.count_documents({"event_id": event_id, "checked_in": True})
     
-    if current_user['role'] != 'admin' and event['organizer_id'] != current_user['id']:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    total_registrations = await db.registrations.count_documents({"event_id": event_id})
-    checked_in = await db.registrations.count_documents({"event_id": event_id, "checked_in": True})
-    feedbacks = await db.feedbacks.find({"event_id": event_id}, {"_id": 0}).to_list(1000)
-    
-    avg_rating = sum([f['rating'] for f in feedbacks]) / len(feedbacks) if feedbacks else 0
+    # Count and average stay live (feedbacks is indexed on event_id); the text analysis is
+    # precomputed by feedback_analytics.py and may lag behind new feedback
+    stats = await read_db.feedbacks.aggregate([
+        {"$match": {"event_id": event_id}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "average": {"$avg": "$rating"}}}
+    ]).to_list(1)
+    summary = await read_db.feedback_summaries.find_one({"event_id": event_id}, {"_id": 0}) or {}
     
     return {
         "total_registrations": total_registrations,
         "checked_in": checked_in,
         "attendance_rate": (checked_in / total_registrations * 100) if total_registrations > 0 else 0,
-        "feedback_count": len(feedbacks),
-        "average_rating": round(avg_rating, 2)
+        "feedback_count": stats[0]['count'] if stats else 0,
+        "average_rating": round(stats[0]['average'] or 0, 2) if stats else 0,
+        "rating_histogram": summary.get('rating_histogram'),
+        "sentiment": summary.get('sentiment'),
+        "top_keywords": summary.get('top_keywords', []),
+        "summary_updated_at": summary.get('updated_at')
     }
 
+@api_router.get("/analytics/event/{event_id}/timeseries")
+async def get_event_timeseries(
+    event_id: str,
+    metric: str = "registrations",
+    interval: str = "auto",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = 500,
+    event: dict = Depends(authorize_event_owner)
+):
+    if metric not in timeseries.METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(timeseries.METRICS)}")
+    if interval != 'auto' and interval not in timeseries.INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be auto or one of {', '.join(timeseries.INTERVALS)}")
+    
+    # Naive datetimes from the query string are taken as UTC, like the stored timestamps
+    start, end = [d.replace(tzinfo=timezone.utc) if d and d.tzinfo is None else d for d in (start, end)]
+    try:
+        return await timeseries.query_series(
+            read_db.event_timeseries, event_id, metric, start, end, interval, min(max(max_points, 1), 5000)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/analytics/organizer/feedback-trends")
+async def get_organizer_feedback_trends(organizer_id: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if current_user['role'] not in ['organizer', 'admin']:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if current_user['role'] == 'organizer' or not organizer_id:
+        organizer_id = current_user['id']
+    
+    trends = await read_db.organizer_feedback_trends.find_one({"organizer_id": organizer_id}, {"_id": 0})
+    return trends or {"organizer_id": organizer_id, "trend": [], "updated_at": None}
+
 @api_router.get("/analytics/dashboard")
 async def get_dashboard_analytics(current_user: dict = Depends(get_current_user)):
     if current_user['role'] == 'admin':
-        total_users = await db.users.count_documents({})
-        total_events = await db.events.count_documents({})
-        total_registrations = await db.registrations.count_documents({})
-        students = await db.users.count_documents({"role": "student"})
-        organizers = await db.users.count_documents({"role": "organizer"})
+        total_users = await read_db.users.count_documents({})
+        total_events = await read_db.events.count_documents({})
+        total_registrations = await read_db.registrations.count_documents({})
+        students = await read_db.users.count_documents({"role": "student"})
+        organizers = await read_db.users.count_documents({"role": "organizer"})
         
         # Events by category
         events_by_category = {}
         for category in EventCategory:
-            count = await db.events.count_documents({"category": category.value})
+            count = await read_db.events.count_documents({"category": category.value})
             events_by_category[category.value] = count
         
         return {
@@ -558,16 +1016,64 @@ async def get_dashboard_analytics(current_user: dict = Depends(get_current_user)
     else:
         raise HTTPException(status_code=403, detail="Admin access required")
 
-# Include router
-app.include_router(api_router)
+# Media Routes
+@api_router.post("/uploads/images")
+async def upload_image(request: Request, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    data = await file.read(MEDIA_MAX_UPLOAD_BYTES + 1)
+    image_id = await save_image(request, data)
+    return {
+        "id": image_id,
+        "url": media_url(image_id),
+        "thumbnail_url": media_url(image_id, 'thumb.webp'),
+        "original_url": media_url(image_id, 'original')
+    }
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.get("/media/{image_id}/{variant}")
+async def get_media(image_id: str, variant: str, request: Request):
+    # Content-addressed: a URL never changes content, so it can be cached forever
+    etag = f'"{image_id}-{variant}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    
+    image = await request.app.state.image_pipeline.load(image_id, variant)
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    data, content_type = image
+    return Response(content=data, media_type=content_type, headers=headers)
+
+# Health Routes
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "alive", "pid": os.getpid()}
+
+@api_router.get("/health/ready")
+async def readiness(request: Request):
+    if client is None:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await asyncio.wait_for(client.admin.command('ping'), timeout=HEALTH_CHECK_TIMEOUT_SECONDS)
+    except Exception as e:
+        # The driver's message names hosts and replica set members; keep it out of the public response
+        logger.warning("Readiness check failed: %r", e)
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    
+    event_projection = request.app.state.event_projection    
+    pool_options = client.options.pool_options
+    return {
+        "status": "ready",
+        "pid": os.getpid(),
+        "nodes": sorted(f"{host}:{port}" for host, port in client.nodes),
+        "primary": "%s:%s" % client.primary if client.primary else None,
+        "read_preference": MONGO_READ_PREFERENCE,
+        "startup_ms": round(startup_ms) if startup_ms is not None else None,
+        "event_projection": event_projection.source if event_projection.ready else None,
+        "pool": {
+            "max_size": pool_options.max_pool_size,
+            "min_size": pool_options.min_pool_size,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        }
+    }
 
 logging.basicConfig(
     level=logging.INFO,
@@ -575,6 +1081,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global startup_ms
+    state = app.state
+    connect_db()
+    # Independent start-up round trips run concurrently
+    steps = [state.revocation_list.sync()]
+    if MONGO_ENSURE_INDEXES:
+        steps += [
+            state.rate_limit_backend.ensure_indexes(),
+            timeseries.ensure_indexes(db.event_timeseries),
+            archive.ensure_indexes(db),
+            venues.ensure_indexes(db),
+            timetable.ensure_indexes(db),
+            registrations.ensure_indexes(db),
+            state.idempotency_store.ensure_indexes(),
+            state.revocation_list.ensure_indexes(),
+            db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0),
+            db.refresh_tokens.create_index("family_id"),
+        ]
+    results = await asyncio.gather(*steps, return_exceptions=True)
+    if isinstance(results[0], Exception):
+        logger.warning("Could not load revoked tokens: %s", results[0])
+    for result in results[1:]:
+        if isinstance(result, Exception):
+            logger.warning("Could not create indexes: %s", result)
+    state.revocation_list.start()
+    state.archive_worker.start()
+    state.event_projection.start()
+    startup_ms = (time.perf_counter() - _import_started) * 1000
+    logger.info(
+        "Worker %s ready in %.0f ms (pool %s-%s)", os.getpid(), startup_ms, MONGO_MIN_POOL_SIZE, MONGO_MAX_POOL_SIZE
+    )
+    try:
+        yield
+    finally:
+        await state.event_projection.stop()
+        await state.archive_worker.stop()
+        await state.revocation_list.stop()
+        state.image_pipeline.shutdown()
+        close_db()
+
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(api_router)
+    
+    # Per-app services; the lifespan hook starts and stops them, handlers reach them through request.app.state
+    state = app.state
+    if RATE_LIMIT_BACKEND == 'mongo':
+        state.rate_limit_backend = MongoRateLimitBackend(lambda: log_db.rate_limits)
+    else:
+        state.rate_limit_backend = InMemoryRateLimitBackend()
+    state.image_pipeline = ImagePipeline(store_from_env(), workers=MEDIA_WORKERS)
+    state.archive_worker = archive.ArchiveWorker(
+        lambda: db,
+        lambda: log_db.notifications,
+        archive.JsonlArchiveSink(ARCHIVE_ROOT) if ARCHIVE_BACKEND == 'jsonl' else archive.MongoArchiveSink(lambda: db),
+        batch_size=ARCHIVE_BATCH_SIZE,
+        completed_after=timedelta(days=int(ARCHIVE_COMPLETED_AFTER_DAYS)) if ARCHIVE_COMPLETED_AFTER_DAYS else None,
+    )
+    state.event_cache = EventOwnershipCache(ttl_seconds=EVENT_CACHE_TTL_SECONDS)
+    state.event_projection = EventProjection(
+        lambda: read_db.events,
+        lambda doc: Event(**doc).model_dump(mode='json'),
+        mode=EVENT_PROJECTION_MODE,
+        poll_seconds=EVENT_PROJECTION_POLL_SECONDS,
+        # Edits made through other workers reach this worker's ownership cache
+        on_change=state.event_cache.invalidate,
+    )
+    state.idempotency_store = IdempotencyStore(lambda: db.idempotency_keys, ttl=timedelta(hours=IDEMPOTENCY_TTL_HOURS))
+    state.revocation_list = RevocationList(lambda: db.revoked_tokens, sync_seconds=REVOCATION_SYNC_SECONDS)
+    
+    # Innermost, so rate-limited requests never reserve an idempotency key
+    app.add_middleware(
+        IdempotencyMiddleware,
+        routes=IDEMPOTENT_ROUTES,
+        store=state.idempotency_store,
+        jwt_secret=JWT_SECRET,
+        jwt_algorithm=JWT_ALGORITHM,
+        enabled=IDEMPOTENCY_ENABLED,
+    )
+    # Added before CORS so that 429 responses still carry CORS headers
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=RATE_LIMIT_RULES,
+        backend=state.rate_limit_backend,
+        jwt_secret=JWT_SECRET,
+        jwt_algorithm=JWT_ALGORITHM,
+        trusted_proxies=RATE_LIMIT_TRUSTED_PROXIES,
+        enabled=RATE_LIMIT_ENABLED,
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return app
+
+app = create_app()
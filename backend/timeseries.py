@@ -0,0 +1,172 @@
+"""Per-event registration and check-in counters, bucketed by hour with per-minute detail.
+
+Each (event, metric, hour) is one document, so recording an action is a single upsert:
+    {"event_id": ..., "metric": "registrations", "hour": "2026-10-19T14", "count": 42, "minutes": {"05": 3, ...}}
+
+Usage: python timeseries.py [--event-id ID]   rebuilds the counters from existing registrations
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+METRICS = {
+    # metric -> (registrations field holding the timestamp, extra match)
+    'registrations': ('registered_at', {}),
+    'checkins': ('checked_in_at', {"checked_in": True}),
+}
+# interval name -> minutes
+INTERVALS = {'minute': 1, '5min': 5, '15min': 15, 'hour': 60, '6hour': 360, 'day': 1440}
+MAX_POINTS = 10_000
+
+
+def hour_key(at: datetime) -> str:
+    # Buckets are UTC hours, whatever offset `at` carries
+    return at.astimezone(timezone.utc).strftime('%Y-%m-%dT%H')
+
+
+def bucket_update(event_id: str, metric: str, at: Optional[datetime] = None):
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return (
+        {"event_id": event_id, "metric": metric, "hour": hour_key(at)},
+        {"$inc": {"count": 1, f"minutes.{at.strftime('%M')}": 1}},
+    )
+
+
+async def ensure_indexes(collection):
+    await collection.create_index([("event_id", 1), ("metric", 1), ("hour", 1)], unique=True)
+
+
+def parse_hour(hour: str) -> datetime:
+    return datetime.strptime(hour, '%Y-%m-%dT%H').replace(tzinfo=timezone.utc)
+
+
+def pick_interval(start: datetime, end: datetime, max_points: int) -> str:
+    span = (end - start).total_seconds() / 60
+    for name, minutes in INTERVALS.items():
+        if span / minutes <= max_points:
+            return name
+    return 'day'
+
+
+def downsample(docs: Iterable[dict], start: datetime, end: datetime, interval: str) -> List[dict]:
+    """Sum hour documents into a dense series of `interval` buckets covering [start, end)."""
+    step = INTERVALS[interval]
+    epoch_start = int(start.timestamp() // 60) // step * step
+    epoch_end = int(end.timestamp() // 60)
+    counts = [0] * max(0, (epoch_end - epoch_start + step - 1) // step)
+
+    for doc in docs:
+        hour_start = int(parse_hour(doc['hour']).timestamp() // 60)
+        if step >= 60:
+            slot = (hour_start - epoch_start) // step
+            if 0 <= slot < len(counts):
+                counts[slot] += doc['count']
+            continue
+        for minute, count in doc.get('minutes', {}).items():
+            slot = (hour_start + int(minute) - epoch_start) // step
+            if 0 <= slot < len(counts):
+                counts[slot] += count
+
+    points = []
+    cumulative = 0
+    for i, count in enumerate(counts):
+        cumulative += count
+        at = datetime.fromtimestamp((epoch_start + i * step) * 60, tz=timezone.utc)
+        points.append({"t": at.isoformat(), "count": count, "cumulative": cumulative})
+    return points
+
+
+async def query_series(collection, event_id: str, metric: str, start: Optional[datetime], end: Optional[datetime],
+                       interval: str = 'auto', max_points: int = 500) -> dict:
+    if start and end and end <= start:
+        raise ValueError("end must be after start")
+    query = {"event_id": event_id, "metric": metric}
+    hour_range = {}
+    if start:
+        hour_range["$gte"] = hour_key(start)
+    if end:
+        hour_range["$lte"] = hour_key(end)
+    if hour_range:
+        query["hour"] = hour_range
+
+    projection = {"_id": 0, "hour": 1, "count": 1}
+    if interval not in INTERVALS or INTERVALS[interval] < 60:
+        projection["minutes"] = 1
+    docs = await collection.find(query, projection).sort("hour", 1).to_list(None)
+
+    if not docs and not (start and end):
+        return {"metric": metric, "interval": interval, "total": 0, "points": []}
+    start = start or parse_hour(docs[0]['hour'])
+    end = end or parse_hour(docs[-1]['hour']) + timedelta(hours=1)
+    if interval == 'auto':
+        interval = pick_interval(start, end, max_points)
+    if (end - start).total_seconds() / 60 / INTERVALS[interval] > MAX_POINTS:
+        raise ValueError(f"Range too large for interval '{interval}'")
+
+    points = downsample(docs, start, end, interval)
+    return {
+        "metric": metric,
+        "interval": interval,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total": points[-1]['cumulative'] if points else 0,
+        "points": points,
+    }
+
+
+async def rebuild(db, event_id: Optional[str] = None):
+    """Recompute the counters from registrations, for data recorded before counters existed."""
+    for metric, (field, extra) in METRICS.items():
+        match = {field: {"$type": "string"}, **extra}
+        if event_id:
+            match["event_id"] = event_id
+        await db.event_timeseries.delete_many({"metric": metric, **({"event_id": event_id} if event_id else {})})
+        await db.registrations.aggregate([
+            {"$match": match},
+            {"$project": {
+                "event_id": 1,
+                # ISO timestamps in UTC: "YYYY-MM-DDTHH" and "MM"
+                "hour": {"$substrCP": [f"${field}", 0, 13]},
+                "minute": {"$substrCP": [f"${field}", 14, 2]},
+            }},
+            {"$group": {"_id": {"event_id": "$event_id", "hour": "$hour", "minute": "$minute"}, "count": {"$sum": 1}}},
+            {"$group": {
+                "_id": {"event_id": "$_id.event_id", "hour": "$_id.hour"},
+                "count": {"$sum": "$count"},
+                "minutes": {"$push": {"k": "$_id.minute", "v": "$count"}},
+            }},
+            {"$project": {
+                "_id": 0,
+                "event_id": "$_id.event_id",
+                "metric": {"$literal": metric},
+                "hour": "$_id.hour",
+                "count": 1,
+                "minutes": {"$arrayToObject": "$minutes"},
+            }},
+            {"$merge": {"into": "event_timeseries", "on": ["event_id", "metric", "hour"], "whenMatched": "replace"}},
+        ]).to_list(None)
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Rebuild event_timeseries from registrations")
+    parser.add_argument('--event-id')
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db.event_timeseries)
+        await rebuild(db, args.event_id)
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""A student's registered events as a calendar, and clash detection against it.
+
+Both are a single aggregation over the student's registrations joined with `events` on `id`,
+using the normalized `start_ts`/`end_ts` fields written by `venues.schedule_fields`.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+import registrations
+
+EVENT_FIELDS = ('id', 'title', 'category', 'venue', 'start_date', 'end_date', 'status', 'start_ts', 'end_ts')
+
+
+async def ensure_indexes(db):
+    await db.registrations.create_index([("user_id", 1), ("event_id", 1)])
+    await db.events.create_index("id")
+
+
+def _calendar_pipeline(user_id: str, event_match: dict) -> List[dict]:
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"id": 1, "event_id": 1, "checked_in": 1}},
+        # The time window is applied inside the join, so events outside it are never fetched
+        {"$lookup": {
+            "from": "events",
+            "let": {"event_id": "$event_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$id", "$$event_id"]}, "status": {"$ne": "cancelled"}, **event_match}},
+                {"$project": {"_id": 0, **{field: 1 for field in EVENT_FIELDS}}},
+            ],
+            "as": "event",
+        }},
+        {"$unwind": "$event"},
+        {"$project": {"id": 1, "checked_in": 1, "event": 1}},
+        {"$sort": {"event.start_ts": 1}},
+    ]
+
+
+async def find_clashes(db, user_id: str, start: datetime, end: datetime, exclude_event_id: Optional[str] = None) -> List[dict]:
+    """Registered events of `user_id` overlapping [start, end)."""
+    match = {"start_ts": {"$lt": end}, "end_ts": {"$gt": start}}
+    if exclude_event_id:
+        match["id"] = {"$ne": exclude_event_id}
+    entries = await db.registrations.aggregate(_calendar_pipeline(user_id, match)).to_list(None)
+    return [
+        {k: entry['event'][k] for k in ('id', 'title', 'venue', 'start_date', 'end_date')}
+        for entry in entries
+    ]
+
+
+async def my_schedule(db, user_id: str, since: Optional[datetime] = None) -> dict:
+    match = {"end_ts": {"$gte": since}} if since else {"start_ts": {"$exists": True}}
+    entries = await db.registrations.aggregate(_calendar_pipeline(user_id, match)).to_list(None)
+
+    # Entries are sorted by start, so each one can only clash with earlier entries still running
+    running = []
+    clashes = 0
+    for entry in entries:
+        event = entry['event']
+        running = [other for other in running if other['event']['end_ts'] > event['start_ts']]
+        entry['clashes_with'] = [other['event']['id'] for other in running]
+        for other in running:
+            other['clashes_with'].append(event['id'])
+        clashes += len(running)
+        running.append(entry)
+
+    for entry in entries:
+        entry['registration_id'] = registrations.registration_id(entry)
+        entry.pop('id', None)
+        del entry['_id'], entry['event']['start_ts'], entry['event']['end_ts']
+    return {"events": entries, "clash_count": clashes}
@@ -0,0 +1,186 @@
+"""Venue booking conflicts and availability.
+
+Events store normalized `venue_key`, `start_ts` and `end_ts` next to the user-facing strings.
+An overlap query for [start, end) is a range scan on the (venue_key, start_ts) index:
+
+    start_ts in [start - longest booking at the venue, end)  and  end_ts > start
+
+Every venue records its longest booking in `venues.max_duration_seconds`, so the scan stays
+O(log n + k) instead of reading every earlier event at the venue.
+
+Timestamps without an offset (the frontend's `datetime-local` values) are campus wall-clock
+times in `EVENT_TIMEZONE` (default UTC).
+
+Usage: python venues.py --backfill   adds the normalized fields to existing events
+       python venues.py --backfill --all   recomputes them, e.g. after changing EVENT_TIMEZONE
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+
+def normalize_venue(venue: str) -> str:
+    return ' '.join(venue.lower().split())
+
+
+@lru_cache(maxsize=None)
+def event_timezone() -> ZoneInfo:
+    # Read on first use, after the server or CLI has loaded .env
+    return ZoneInfo(os.environ.get('EVENT_TIMEZONE', 'UTC'))
+
+
+def parse_event_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=event_timezone())
+    return parsed.astimezone(timezone.utc)
+
+
+def schedule_fields(venue: str, start_date: str, end_date: str) -> dict:
+    try:
+        start, end = parse_event_time(start_date), parse_event_time(end_date)
+    except ValueError:
+        raise ValueError("start_date and end_date must be ISO 8601 timestamps")
+    if end <= start:
+        raise ValueError("end_date must be after start_date")
+    return {"venue_key": normalize_venue(venue), "start_ts": start, "end_ts": end}
+
+
+async def ensure_indexes(db):
+    await db.events.create_index([("venue_key", 1), ("start_ts", 1)])
+
+
+async def record_booking(db, venue: str, start: datetime, end: datetime):
+    """Must run before the event is written, so concurrent overlap queries already use the new bound."""
+    await db.venues.update_one(
+        {"_id": normalize_venue(venue)},
+        {"$max": {"max_duration_seconds": (end - start).total_seconds()}, "$setOnInsert": {"name": venue}},
+        upsert=True,
+    )
+
+
+async def find_conflicts(db, venue_key: str, start: datetime, end: datetime,
+                         exclude_id: Optional[str] = None, limit: Optional[int] = 5) -> List[dict]:
+    venue = await db.venues.find_one({"_id": venue_key}, {"max_duration_seconds": 1})
+    longest = timedelta(seconds=venue['max_duration_seconds']) if venue else timedelta(0)
+    query = {
+        "venue_key": venue_key,
+        "start_ts": {"$gte": start - longest, "$lt": end},
+        "end_ts": {"$gt": start},
+        "status": {"$ne": "cancelled"},
+    }
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    projection = {"_id": 0, "id": 1, "title": 1, "start_date": 1, "end_date": 1, "booked_at": 1}
+    cursor = db.events.find(query, projection).sort("start_ts", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list(limit)
+
+
+def lost_race(conflicts: List[dict], booked_at: str) -> bool:
+    """After writing a booking: two requests can pass the conflict check at the same time.
+
+    The earlier `booked_at` keeps the slot; events booked before this field existed always win.
+    """
+    return any(conflict.get('booked_at', '') <= booked_at for conflict in conflicts)
+
+
+def free_slots(booked: List[tuple], start: datetime, end: datetime, min_duration: timedelta) -> List[dict]:
+    """Gaps of at least `min_duration` in [start, end) not covered by the (start, end) intervals in `booked`."""
+    slots = []
+    cursor = start
+    for booked_start, booked_end in sorted(booked):
+        if booked_start > cursor and booked_start - cursor >= min_duration:
+            slots.append({"start": cursor.isoformat(), "end": min(booked_start, end).isoformat()})
+        cursor = max(cursor, booked_end)
+        if cursor >= end:
+            break
+    if end - cursor >= min_duration:
+        slots.append({"start": cursor.isoformat(), "end": end.isoformat()})
+    return slots
+
+
+async def availability(db, venue: str, start: datetime, end: datetime, min_duration: timedelta) -> dict:
+    venue_key = normalize_venue(venue)
+    bookings = await find_conflicts(db, venue_key, start, end, limit=None)
+    booked = []
+    for event in bookings:
+        event_start, event_end = parse_event_time(event['start_date']), parse_event_time(event['end_date'])
+        booked.append((max(event_start, start), min(event_end, end), event))
+    return {
+        "venue": venue,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "booked": [
+            {"event_id": e['id'], "title": e['title'], "start": s.isoformat(), "end": f.isoformat()}
+            for s, f, e in booked
+        ],
+        "free": free_slots([(s, f) for s, f, _ in booked], start, end, min_duration),
+    }
+
+
+async def backfill(db, batch_size: int = 1000, recompute: bool = False) -> int:
+    from pymongo import UpdateOne
+
+    updated = 0
+    longest = {}
+    cursor = db.events.find(
+        {} if recompute else {"start_ts": {"$exists": False}},
+        {"_id": 1, "venue": 1, "start_date": 1, "end_date": 1},
+    )
+    batch = []
+    async for event in cursor:
+        try:
+            fields = schedule_fields(event['venue'], event['start_date'], event['end_date'])
+        except (KeyError, ValueError):
+            continue
+        batch.append(UpdateOne({"_id": event['_id']}, {"$set": fields}))
+        duration = (fields['end_ts'] - fields['start_ts']).total_seconds()
+        key = fields['venue_key']
+        if duration > longest.get(key, (0, ''))[0]:
+            longest[key] = (duration, event['venue'])
+        if len(batch) >= batch_size:
+            await db.events.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await db.events.bulk_write(batch, ordered=False)
+        updated += len(batch)
+
+    for key, (duration, name) in longest.items():
+        await db.venues.update_one(
+            {"_id": key},
+            {"$max": {"max_duration_seconds": duration}, "$setOnInsert": {"name": name}},
+            upsert=True,
+        )
+    return updated
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Venue scheduling maintenance")
+    parser.add_argument('--backfill', action='store_true', help="add venue_key/start_ts/end_ts to existing events")
+    parser.add_argument('--all', action='store_true', help="with --backfill, recompute them for every event")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        db = client[os.environ['DB_NAME']]
+        await ensure_indexes(db)
+        if args.backfill:
+            print(f"Updated {await backfill(db, recompute=args.all)} events")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -8,8 +8,10 @@ class CampusPulseAPITester:
         self.base_url = base_url
         self.api_url = f"{base_url}/api"
         self.tokens = {}  # Store tokens for different users
+        self.refresh_tokens = {}
         self.users = {}   # Store user data
         self.events = {}  # Store created events
+        self.registrations = {}
         self.tests_run = 0
         self.tests_passed = 0
         self.failed_tests = []
@@ -87,6 +89,7 @@ class CampusPulseAPITester:
         
         if success and 'token' in response:
             self.tokens[role] = response['token']
+            self.refresh_tokens[role] = response['refresh_token']
             self.users[role] = response['user']
             return True
         return False
@@ -112,9 +115,30 @@ class CampusPulseAPITester:
         
         if success and 'token' in response:
             self.tokens[role] = response['token']
+            self.refresh_tokens[role] = response['refresh_token']
             return True
         return False
 
+    def test_token_refresh(self, role):
+        """Test refresh token rotation"""
+        if role not in self.refresh_tokens:
+            return False
+        
+        old_refresh_token = self.refresh_tokens[role]
+        success, response = self.run_test(
+            f"Refresh token ({role})",
+            "POST",
+            "auth/refresh",
+            200,
+            data={"refresh_token": old_refresh_token}
+        )
+        
+        if success and 'token' in response:
+            self.tokens[role] = response['token']
+            self.refresh_tokens[role] = response['refresh_token']
+            return response['refresh_token'] != old_refresh_token
+        return False
+
     def test_get_current_user(self, role):
         """Test getting current user info"""
         if role not in self.tokens:
@@ -248,6 +272,23 @@ class CampusPulseAPITester:
             200,
             token=self.tokens['student']
         )
+        if success:
+            self.registrations['student'] = response
+        return success
+
+    def test_registration_qr(self):
+        """Test rendering the ticket QR code for a registration"""
+        if 'student' not in self.registrations:
+            return False
+            
+        registration_id = self.registrations['student']['id']
+        success, _ = self.run_test(
+            "Get registration QR code",
+            "GET",
+            f"registrations/{registration_id}/qr",
+            200,
+            token=self.tokens['student']
+        )
         return success
 
     def test_get_my_registrations(self):
@@ -344,10 +385,35 @@ class CampusPulseAPITester:
         
         return success1 and success2
 
+    def test_health_checks(self):
+        """Test liveness and readiness probes"""
+        success1, _ = self.run_test(
+            "Liveness probe",
+            "GET",
+            "health/live",
+            200
+        )
+        
+        success2, response = self.run_test(
+            "Readiness probe",
+            "GET",
+            "health/ready",
+            200
+        )
+        
+        return success1 and success2 and response.get('status') == 'ready'
+
 def main():
     print("🚀 Starting Campus Pulse API Testing...")
     tester = CampusPulseAPITester()
     
+    # Test health checks
+    print("\n" + "="*50)
+    print("TESTING HEALTH CHECKS")
+    print("="*50)
+    
+    tester.test_health_checks()
+    
     # Test user registration and authentication for all roles
     print("\n" + "="*50)
     print("TESTING USER AUTHENTICATION")
@@ -364,6 +430,10 @@ def main():
         if not tester.test_user_login(role):
             print(f"❌ Login failed for {role}")
     
+    # Test token refresh
+    for role in roles:
+        tester.test_token_refresh(role)
+    
     # Test getting current user
     for role in roles:
         tester.test_get_current_user(role)
@@ -399,6 +469,7 @@ def main():
     
     tester.test_event_registration()
     tester.test_get_my_registrations()
+    tester.test_registration_qr()
     tester.test_get_event_registrations("organizer")
     
     # Test notifications
@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useState, useEffect } from 'react';
+import React, { createContext, useContext, useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -6,6 +6,10 @@ const API = `${BACKEND_URL}/api`;
 
 const AuthContext = createContext();
 
+const TOKEN_KEY = 'campus-pulse-token';
+const REFRESH_TOKEN_KEY = 'campus-pulse-refresh-token';
+const AUTH_ENDPOINTS = ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'];
+
 export const useAuth = () => {
   const context = useContext(AuthContext);
   if (!context) {
@@ -16,8 +20,61 @@ export const useAuth = () => {
 
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
-  const [token, setToken] = useState(() => localStorage.getItem('campus-pulse-token'));
+  const [token, setToken] = useState(() => localStorage.getItem(TOKEN_KEY));
   const [loading, setLoading] = useState(true);
+  const refreshPromise = useRef(null);
+
+  const storeTokens = (data) => {
+    setToken(data.token);
+    localStorage.setItem(TOKEN_KEY, data.token);
+    localStorage.setItem(REFRESH_TOKEN_KEY, data.refresh_token);
+  };
+
+  const clearSession = () => {
+    setToken(null);
+    setUser(null);
+    localStorage.removeItem(TOKEN_KEY);
+    localStorage.removeItem(REFRESH_TOKEN_KEY);
+  };
+
+  // Access tokens are short-lived: on a 401, rotate the refresh token once and retry the request.
+  // Concurrent failures share a single refresh call.
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const config = error.config;
+        const refreshToken = localStorage.getItem(REFRESH_TOKEN_KEY);
+        const isAuthEndpoint = config && AUTH_ENDPOINTS.some((path) => config.url?.endsWith(path));
+        if (error.response?.status !== 401 || !config || config._retried || isAuthEndpoint || !refreshToken) {
+          return Promise.reject(error);
+        }
+
+        if (!refreshPromise.current) {
+          refreshPromise.current = axios
+            .post(`${API}/auth/refresh`, { refresh_token: refreshToken })
+            .then((response) => {
+              storeTokens(response.data);
+              return response.data.token;
+            })
+            .finally(() => {
+              refreshPromise.current = null;
+            });
+        }
+
+        try {
+          const newToken = await refreshPromise.current;
+          config._retried = true;
+          config.headers = { ...config.headers, Authorization: `Bearer ${newToken}` };
+          return axios(config);
+        } catch (refreshError) {
+          clearSession();
+          return Promise.reject(error);
+        }
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
 
   useEffect(() => {
     if (token) {
@@ -43,24 +100,30 @@ export const AuthProvider = ({ children }) => {
 
   const login = async (email, password) => {
     const response = await axios.post(`${API}/auth/login`, { email, password });
-    setToken(response.data.token);
+    storeTokens(response.data);
     setUser(response.data.user);
-    localStorage.setItem('campus-pulse-token', response.data.token);
     return response.data;
   };
 
   const register = async (userData) => {
     const response = await axios.post(`${API}/auth/register`, userData);
-    setToken(response.data.token);
+    storeTokens(response.data);
     setUser(response.data.user);
-    localStorage.setItem('campus-pulse-token', response.data.token);
     return response.data;
   };
 
   const logout = () => {
-    setToken(null);
-    setUser(null);
-    localStorage.removeItem('campus-pulse-token');
+    const currentToken = localStorage.getItem(TOKEN_KEY);
+    const refreshToken = localStorage.getItem(REFRESH_TOKEN_KEY);
+    if (currentToken) {
+      // Revoke server-side; the local session is cleared either way
+      axios
+        .post(`${API}/auth/logout`, { refresh_token: refreshToken }, {
+          headers: { Authorization: `Bearer ${currentToken}` }
+        })
+        .catch(() => {});
+    }
+    clearSession();
   };
 
   const updateProfile = async (profileData) => {
@@ -0,0 +1,17 @@
+import { useRef } from 'react';
+
+const newKey = () =>
+  window.crypto?.randomUUID?.() ?? `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
+// Returns a function giving the Idempotency-Key for a request payload. Retrying the same payload
+// reuses the key, so the server replays the first result instead of running the write again.
+export const useIdempotencyKey = () => {
+  const last = useRef(null);
+  return (payload) => {
+    const body = JSON.stringify(payload);
+    if (!last.current || last.current.body !== body) {
+      last.current = { body, key: newKey() };
+    }
+    return last.current.key;
+  };
+};
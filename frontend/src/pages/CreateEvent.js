@@ -11,6 +11,7 @@ import { Card } from '../components/ui/card';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { toast } from 'sonner';
 import ThemeToggle from '../components/ThemeToggle';
+import { useIdempotencyKey } from '../lib/idempotency';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -31,6 +32,7 @@ const CreateEvent = () => {
     tags: ''
   });
   const [loading, setLoading] = useState(false);
+  const idempotencyKey = useIdempotencyKey();
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -45,7 +47,7 @@ const CreateEvent = () => {
       };
 
       await axios.post(`${API}/events`, eventData, {
-        headers: { Authorization: `Bearer ${token}` }
+        headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': idempotencyKey(eventData) }
       });
 
       toast.success('Event created successfully!');
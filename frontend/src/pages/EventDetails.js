@@ -11,6 +11,7 @@ import { Label } from '../components/ui/label';
 import { toast } from 'sonner';
 import ThemeToggle from '../components/ThemeToggle';
 import { format } from 'date-fns';
+import { useIdempotencyKey } from '../lib/idempotency';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -25,6 +26,8 @@ const EventDetails = () => {
   const [loading, setLoading] = useState(true);
   const [showFeedbackForm, setShowFeedbackForm] = useState(false);
   const [feedbackData, setFeedbackData] = useState({ rating: 5, comment: '' });
+  const registrationKey = useIdempotencyKey();
+  const feedbackKey = useIdempotencyKey();
 
   useEffect(() => {
     fetchEventDetails();
@@ -70,10 +73,14 @@ const EventDetails = () => {
 
   const handleRegister = async () => {
     try {
-      await axios.post(`${API}/registrations/${id}`, {}, {
-        headers: { Authorization: `Bearer ${token}` }
+      const response = await axios.post(`${API}/registrations/${id}`, {}, {
+        headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': registrationKey({ event_id: id }) }
       });
       toast.success('Successfully registered for event!');
+      const clashes = response.data.clashes || [];
+      if (clashes.length > 0) {
+        toast.warning(`This event overlaps with ${clashes.map(c => c.title).join(', ')}`);
+      }
       setIsRegistered(true);
       fetchEventDetails();
     } catch (error) {
@@ -83,12 +90,13 @@ const EventDetails = () => {
 
   const handleSubmitFeedback = async () => {
     try {
-      await axios.post(`${API}/feedbacks`, {
+      const payload = {
         event_id: id,
         rating: feedbackData.rating,
         comment: feedbackData.comment
-      }, {
-        headers: { Authorization: `Bearer ${token}` }
+      };
+      await axios.post(`${API}/feedbacks`, payload, {
+        headers: { Authorization: `Bearer ${token}`, 'Idempotency-Key': feedbackKey(payload) }
       });
       toast.success('Feedback submitted successfully!');
       setShowFeedbackForm(false);
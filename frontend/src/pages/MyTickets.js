@@ -13,6 +13,32 @@ import { format } from 'date-fns';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const TicketQrCode = ({ registrationId, token }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl;
+    axios.get(`${API}/registrations/${registrationId}/qr`, {
+      headers: { Authorization: `Bearer ${token}` },
+      responseType: 'blob'
+    }).then(response => {
+      objectUrl = URL.createObjectURL(response.data);
+      setSrc(objectUrl);
+    }).catch(() => {
+      toast.error('Failed to load QR code');
+    });
+    return () => {
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [registrationId, token]);
+
+  return src ? (
+    <img src={src} alt="QR Code" className="w-full h-full" />
+  ) : (
+    <QrCode className="w-16 h-16" style={{ color: 'var(--muted-foreground)' }} />
+  );
+};
+
 const MyTickets = () => {
   const navigate = useNavigate();
   const { token } = useAuth();
@@ -136,7 +162,7 @@ const MyTickets = () => {
                     {/* QR Code */}
                     <div className="md:w-80 p-6 flex flex-col items-center justify-center space-y-4" style={{ backgroundColor: 'var(--muted)', borderLeft: '1px solid var(--border)' }}>
                       <div className="w-48 h-48 bg-white p-4 rounded-lg flex items-center justify-center">
-                        <img src={`data:image/png;base64,${registration.qr_code}`} alt="QR Code" className="w-full h-full" />
+                        <TicketQrCode registrationId={registration.id} token={token} />
                       </div>
                       <div className="text-center space-y-1">
                         <p className="font-semibold">Show this QR code</p>
@@ -0,0 +1,87 @@
+import logging
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'campus_pulse_test')
+
+
+def _bind(value, variables):
+    if isinstance(value, str) and value.startswith('$$') and value[2:] in variables:
+        return variables[value[2:]]
+    if isinstance(value, dict):
+        return {k: _bind(v, variables) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_bind(v, variables) for v in value]
+    return value
+
+
+@pytest.fixture
+def mongomock_lookup_let(monkeypatch):
+    """mongomock runs $lookup only with localField/foreignField; this adds `let`/`pipeline` joins on top-level fields."""
+    import mongomock.aggregate
+
+    handle = mongomock.aggregate._PIPELINE_HANDLERS['$lookup']
+
+    def lookup(in_collection, database, options):
+        if 'let' not in options:
+            return handle(in_collection, database, options)
+        joined = []
+        for doc in in_collection:
+            variables = {name: doc.get(path.lstrip('$')) for name, path in options['let'].items()}
+            matches = list(database[options['from']].aggregate(_bind(options['pipeline'], variables)))
+            joined.append({**doc, options['as']: matches})
+        return joined
+
+    monkeypatch.setitem(mongomock.aggregate._PIPELINE_HANDLERS, '$lookup', lookup)
+
+
+@pytest.fixture
+def server_app(monkeypatch, mongomock_lookup_let):
+    """A fresh app on an in-memory MongoDB, with rate limits off and listings read from the database."""
+    from mongomock_motor import AsyncMongoMockClient
+    import server
+
+    monkeypatch.setattr(server, 'AsyncIOMotorClient', lambda url, **kwargs: AsyncMongoMockClient())
+    monkeypatch.setattr(server, 'RATE_LIMIT_ENABLED', False)
+    monkeypatch.setattr(server, 'EVENT_PROJECTION_MODE', 'off')
+    logging.disable(logging.INFO)
+    yield server.create_app()
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def api(server_app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server_app) as client:
+        yield client
+
+
+@pytest.fixture
+def register_user(api):
+    """Registers a user and returns the response: access and refresh tokens and the profile."""
+    def register(email, role='organizer'):
+        response = api.post(
+            '/api/auth/register', json={"email": email, "name": email.split('@')[0], "password": "secret123", "role": role}
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+    return register
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def auth_headers(register_user):
+    """Registers a user and returns the Authorization header for their access token."""
+    def register(email, role='organizer'):
+        return bearer(register_user(email, role)['token'])
+    return register
@@ -0,0 +1,24 @@
+def test_event_analytics_counts_feedback_newer_than_the_summary(api, auth_headers):
+    import server
+
+    headers = auth_headers("organizer@example.com")
+    event = api.post('/api/events', json={
+        "title": "Hackathon", "description": "desc", "category": "technical", "capacity": 50,
+        "venue": "Main Hall", "start_date": "2030-11-04T10:00:00Z", "end_date": "2030-11-04T12:00:00Z",
+    }, headers=headers).json()
+
+    async def seed():
+        # A summary written by the batch job before the last two ratings arrived
+        await server.db.feedback_summaries.insert_one({
+            "event_id": event['id'], "feedback_count": 1, "average_rating": 5.0,
+            "rating_histogram": {"5": 1}, "sentiment": {"positive": 1}, "top_keywords": ["fun"],
+        })
+        await server.db.feedbacks.insert_many([
+            {"id": f"f{i}", "event_id": event['id'], "user_id": f"u{i}", "rating": rating}
+            for i, rating in enumerate([5, 3, 2])
+        ])
+    api.portal.call(seed)
+
+    analytics = api.get(f"/api/analytics/event/{event['id']}", headers=headers).json()
+    assert (analytics['feedback_count'], analytics['average_rating']) == (3, 3.33)
+    assert analytics['rating_histogram'] == {"5": 1} and analytics['top_keywords'] == ["fun"]
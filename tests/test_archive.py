@@ -0,0 +1,160 @@
+import asyncio
+import gzip
+import time
+from datetime import datetime, timezone, timedelta
+
+from bson import json_util
+from mongomock_motor import AsyncMongoMockClient
+
+import archive
+
+
+def read_archive(root, collection, event_id):
+    docs = []
+    for path in sorted((root / collection / event_id).glob('*.jsonl.gz')):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            docs += [json_util.loads(line) for line in f]
+    return docs
+
+
+def test_jsonl_batches_are_not_duplicated_when_a_job_is_retried(tmp_path, monkeypatch):
+    db = AsyncMongoMockClient()['archive_test']
+    collection_class = type(db.registrations)
+    delete_many = collection_class.delete_many
+    failures = [RuntimeError("worker died")]
+
+    async def delete_many_failing_once(self, *args, **kwargs):
+        # Fails after the first batch is copied but before it is deleted
+        if failures:
+            raise failures.pop()
+        return await delete_many(self, *args, **kwargs)
+
+    async def scenario():
+        await db.events.insert_one({"id": "e1", "title": "Hackathon"})
+        await db.registrations.insert_many([{"_id": i, "event_id": "e1", "user_id": f"u{i}"} for i in range(5)])
+        await archive.enqueue(db, {"id": "e1", "title": "Hackathon"}, reason="completed")
+        sink = archive.JsonlArchiveSink(tmp_path)
+
+        job = await archive.claim_job(db)
+        try:
+            await archive.run_job(db, db.notifications, sink, job, batch_size=2)
+        except RuntimeError:
+            pass
+        # The lease expires and the job is retried
+        await db.archive_jobs.update_one({"_id": job['_id']}, {"$set": {"locked_until": datetime(1970, 1, 1, tzinfo=timezone.utc)}})
+        await archive.run_job(db, db.notifications, sink, await archive.claim_job(db), batch_size=2)
+        return await db.registrations.count_documents({})
+
+    monkeypatch.setattr(collection_class, 'delete_many', delete_many_failing_once)
+    assert asyncio.run(scenario()) == 0
+    assert sorted(doc['_id'] for doc in read_archive(tmp_path, 'registrations', 'e1')) == [0, 1, 2, 3, 4]
+    assert len(read_archive(tmp_path, 'events', 'e1')) == 1
+
+
+def test_mongo_sink_moves_everything_and_tolerates_a_retried_batch():
+    db = AsyncMongoMockClient()['archive_test']
+    sink = archive.MongoArchiveSink(lambda: db)
+    event = {"id": "e1", "title": "Hackathon"}
+
+    async def scenario():
+        await db.events.insert_one(dict(event))
+        await db.registrations.insert_many([{"_id": i, "event_id": "e1", "user_id": f"u{i}"} for i in range(3)])
+        await db.feedbacks.insert_one({"_id": "f1", "event_id": "e1", "rating": 5})
+        await db.feedback_summaries.insert_one({"event_id": "e1"})
+        await db.registrations.insert_one({"_id": 9, "event_id": "other", "user_id": "u9"})
+        # A batch copied by an earlier, interrupted attempt
+        await sink.write('registrations', "e1", [{"_id": 0, "event_id": "e1", "user_id": "u0"}])
+        await archive.enqueue(db, event, reason="completed")
+        await archive.run_job(db, db.notifications, sink, await archive.claim_job(db), batch_size=2)
+        return {
+            name: await db[name].find({}, {"_id": 1}).sort("_id", 1).to_list(None)
+            for name in ("registrations", "feedbacks", "feedback_summaries", "events",
+                         "archived_registrations", "archived_feedbacks", "archived_events")
+        }, await db.archived_events.find_one(), await db.archive_jobs.find_one()
+
+    stored, archived_event, job = asyncio.run(scenario())
+    assert stored['registrations'] == [{"_id": 9}]
+    assert stored['feedbacks'] == stored['feedback_summaries'] == stored['events'] == []
+    assert stored['archived_registrations'] == [{"_id": 0}, {"_id": 1}, {"_id": 2}]
+    assert stored['archived_feedbacks'] == [{"_id": "f1"}]
+    assert archived_event['id'] == "e1" and archived_event['archived_reason'] == "completed"
+    assert job['state'] == "done" and 'event' not in job
+    assert job['archived'] == {"registrations": 3, "feedbacks": 1}
+
+
+def test_cancellation_notices_are_sent_once():
+    db = AsyncMongoMockClient()['archive_test']
+    event = {"id": "e1", "title": "Hackathon"}
+
+    async def scenario():
+        await archive.notify_registrants(db.notifications, ["u1", "u2"], event, "deleted")
+        # A retried batch, overlapping the first one
+        await archive.notify_registrants(db.notifications, ["u2", "u3"], event, "deleted")
+        await archive.notify_registrants(db.notifications, ["u4"], event, "completed")
+        return await db.notifications.find().sort("_id", 1).to_list(None)
+
+    notices = asyncio.run(scenario())
+    assert [(n['_id'], n['user_id']) for n in notices] == [
+        ("cancelled:e1:u1", "u1"), ("cancelled:e1:u2", "u2"), ("cancelled:e1:u3", "u3"),
+    ]
+    assert notices[0]['message'] == "Hackathon has been cancelled by the organizer"
+
+
+def test_completed_events_are_selected_by_end_ts():
+    db = AsyncMongoMockClient()['archive_test']
+    cutoff = datetime.now(timezone.utc) - timedelta(days=30)
+
+    def completed(event_id, end, status="completed"):
+        # end_date keeps the offset it was submitted with, so comparing it as a string is unreliable
+        end_date = end.astimezone(timezone(timedelta(hours=-5))).isoformat()
+        return {"id": event_id, "title": event_id, "status": status, "end_date": end_date, "end_ts": end}
+
+    async def scenario():
+        await db.events.insert_many([
+            completed("old", cutoff - timedelta(days=1)),
+            completed("recent", cutoff + timedelta(hours=2)),
+            completed("cancelled", cutoff - timedelta(days=1), status="cancelled"),
+            {"id": "unscheduled", "title": "unscheduled", "status": "completed", "end_date": "2000-01-01T00:00:00"},
+        ])
+        queued = await archive.enqueue_completed_events(db, timedelta(days=30))
+        return queued, await db.archive_jobs.distinct("event_id")
+
+    assert asyncio.run(scenario()) == (1, ["old"])
+
+
+def test_deleting_an_event_leaves_nothing_behind(api, auth_headers):
+    import server
+
+    organizer = auth_headers("organizer@example.com")
+    event = api.post('/api/events', json={
+        "title": "Hackathon", "description": "desc", "category": "technical", "capacity": 50,
+        "venue": "Main Hall", "start_date": "2030-11-04T10:00:00Z", "end_date": "2030-11-04T12:00:00Z",
+    }, headers=organizer).json()
+    students = [auth_headers(f"student{i}@example.com", role='student') for i in range(3)]
+    for student in students:
+        registration = api.post(f"/api/registrations/{event['id']}", headers=student).json()
+        api.post(f"/api/registrations/checkin/{registration['id']}", headers=organizer)
+    assert api.post('/api/feedbacks', json={"event_id": event['id'], "rating": 5, "comment": "Great"},
+                    headers=students[0]).status_code == 200
+
+    assert api.delete(f"/api/events/{event['id']}", headers=organizer).status_code == 200
+    assert api.get(f"/api/events/{event['id']}").status_code == 404
+
+    def job_state():
+        job = api.portal.call(lambda: server.db.archive_jobs.find_one({"event_id": event['id']}))
+        return job and job['state']
+
+    deadline = time.monotonic() + 5
+    while job_state() != "done" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job_state() == "done"
+
+    def count(collection):
+        return api.portal.call(lambda: server.db[collection].count_documents({"event_id": event['id']}))
+
+    assert [count(c) for c in archive.DEPENDENT_COLLECTIONS + archive.DERIVED_COLLECTIONS] == [0, 0, 0, 0, 0]
+    assert (count('archived_registrations'), count('archived_feedbacks')) == (3, 1)
+    assert count('archived_notifications') == 6  # registration and check-in notices
+    for student in students:
+        titles = [n['title'] for n in api.get('/api/notifications', headers=student).json()]
+        assert titles == ["Event Cancelled"]
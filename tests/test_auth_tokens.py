@@ -0,0 +1,135 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from revocation import RevocationList
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def refresh(api, refresh_token):
+    return api.post('/api/auth/refresh', json={"refresh_token": refresh_token})
+
+
+def family_size(api, user_id):
+    import server
+
+    return api.portal.call(lambda: server.db.refresh_tokens.count_documents({"user_id": user_id}))
+
+
+def test_refresh_rotates_the_token(api, register_user):
+    user = register_user("student@example.com", role='student')
+    rotated = refresh(api, user['refresh_token'])
+    assert rotated.status_code == 200
+    tokens = rotated.json()
+    assert tokens['refresh_token'] != user['refresh_token'] and tokens['token'] != user['token']
+    assert api.get('/api/auth/me', headers=bearer(tokens['token'])).json()['email'] == "student@example.com"
+    assert refresh(api, tokens['refresh_token']).status_code == 200
+    assert refresh(api, "never-issued").status_code == 401
+
+
+def test_reuse_inside_the_grace_window_is_allowed(api, register_user):
+    # e.g. two browser tabs refreshing at once
+    user = register_user("student@example.com", role='student')
+    first = refresh(api, user['refresh_token'])
+    second = refresh(api, user['refresh_token'])
+    assert first.status_code == second.status_code == 200
+    assert refresh(api, second.json()['refresh_token']).status_code == 200
+
+
+def test_reuse_after_the_grace_window_ends_the_whole_family(api, register_user):
+    import server
+
+    user = register_user("student@example.com", role='student')
+    current = refresh(api, user['refresh_token']).json()
+    login = api.post('/api/auth/login', json={"email": "student@example.com", "password": "secret123"}).json()
+    old = server.hash_refresh_token(user['refresh_token'])
+    used_at = datetime.now(timezone.utc) - timedelta(seconds=server.REFRESH_TOKEN_REUSE_GRACE_SECONDS + 1)
+    api.portal.call(lambda: server.db.refresh_tokens.update_one({"_id": old}, {"$set": {"used_at": used_at}}))
+
+    reused = refresh(api, user['refresh_token'])
+    assert reused.status_code == 401 and reused.json()['detail'] == "Refresh token reused"
+    assert refresh(api, current['refresh_token']).status_code == 401
+    # A separate login is a separate family and survives
+    assert family_size(api, user['user']['id']) == 1
+    assert refresh(api, login['refresh_token']).status_code == 200
+
+
+def test_logout_revokes_the_access_token_and_refresh_family(api, register_user):
+    user = register_user("student@example.com", role='student')
+    rotated = refresh(api, user['refresh_token']).json()
+    headers = bearer(rotated['token'])
+
+    assert api.post('/api/auth/logout', json={"refresh_token": rotated['refresh_token']}, headers=headers).status_code == 200
+    me = api.get('/api/auth/me', headers=headers)
+    assert me.status_code == 401 and me.json()['detail'] == "Token revoked"
+    assert refresh(api, rotated['refresh_token']).status_code == 401
+    assert family_size(api, user['user']['id']) == 0
+    # The access token from before the rotation was not the one logged out
+    assert api.get('/api/auth/me', headers=bearer(user['token'])).status_code == 200
+
+
+def test_role_change_revokes_tokens_issued_before_it(api, register_user):
+    admin = register_user("admin@example.com", role='admin')
+    student = register_user("student@example.com", role='student')
+
+    changed = api.put(f"/api/users/{student['user']['id']}/role", json={"role": "organizer"}, headers=bearer(admin['token']))
+    assert changed.status_code == 200
+    assert api.get('/api/auth/me', headers=bearer(student['token'])).status_code == 401
+    # A refreshed token carries the new role and is issued after the cut-off
+    tokens = refresh(api, student['refresh_token']).json()
+    assert api.get('/api/events/organizer/my-events', headers=bearer(tokens['token'])).status_code == 200
+    assert api.get('/api/auth/me', headers=bearer(admin['token'])).status_code == 200
+
+
+def test_name_change_revokes_tokens_but_other_profile_edits_do_not(api, register_user):
+    user = register_user("student@example.com", role='student')
+    headers = bearer(user['token'])
+
+    assert api.put('/api/users/profile', json={"bio": "Hello"}, headers=headers).status_code == 200
+    assert api.get('/api/auth/me', headers=headers).status_code == 200
+    assert api.put('/api/users/profile', json={"name": "New Name"}, headers=headers).status_code == 200
+    assert api.get('/api/auth/me', headers=headers).status_code == 401
+    tokens = refresh(api, user['refresh_token']).json()
+    assert api.get('/api/auth/me', headers=bearer(tokens['token'])).json()['name'] == "New Name"
+
+
+def test_a_second_worker_picks_up_revocations_through_sync():
+    collection = AsyncMongoMockClient()['revocation_test'].revoked_tokens
+    worker_a, worker_b = RevocationList(lambda: collection), RevocationList(lambda: collection)
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        await worker_b.sync()
+        await worker_a.revoke_token("jti-1", now + timedelta(minutes=15))
+        before_sync = worker_b.is_revoked("jti-1", "u1", now.timestamp())
+        await worker_b.sync()
+        logged_out = worker_b.is_revoked("jti-1", "u1", now.timestamp())
+
+        await worker_a.revoke_user("u2", timedelta(minutes=15))
+        # Only entries newer than the last sync (less the clock overlap) are read again
+        await worker_b.sync()
+        return before_sync, logged_out
+
+    before_sync, logged_out = asyncio.run(scenario())
+    assert (before_sync, logged_out) == (False, True)
+    assert worker_b.is_revoked("other", "u2", now.timestamp() - 1)
+    assert not worker_b.is_revoked("other", "u2", datetime.now(timezone.utc).timestamp() + 1)
+    assert not worker_b.is_revoked("other", "u3", now.timestamp())
+
+
+def test_expired_entries_are_pruned():
+    collection = AsyncMongoMockClient()['revocation_test'].revoked_tokens
+    revocations = RevocationList(lambda: collection)
+
+    async def scenario():
+        await revocations.revoke_token("expired", datetime.now(timezone.utc) - timedelta(seconds=1))
+        await revocations.revoke_token("current", datetime.now(timezone.utc) + timedelta(minutes=15))
+        revocations._prune()
+
+    asyncio.run(scenario())
+    assert not revocations.is_revoked("expired", "u1", 0)
+    assert revocations.is_revoked("current", "u1", 0)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import OperationFailure
+
+from event_cache import EventOwnershipCache
+from event_projection import CHANGE_STREAMS_UNSUPPORTED, EventProjection
+
+FIELDS = ('id', 'title', 'category', 'status', 'start_date')
+
+
+def to_api(doc):
+    if 'start_date' not in doc:
+        raise ValueError("no start_date")
+    return {field: doc[field] for field in FIELDS}
+
+
+def event(event_id, start_date, category='technical', status='upcoming', **extra):
+    return {"_id": ObjectId(), "id": event_id, "title": event_id, "category": category, "status": status,
+            "start_date": start_date, **extra}
+
+
+def ids(events):
+    return [e['id'] for e in events]
+
+
+def test_change_events_update_the_projection():
+    projection = EventProjection(lambda: None, to_api)
+    talk, quiz, match = (event("talk", "2030-01-03"), event("quiz", "2030-01-01", category='cultural'),
+                         event("match", "2030-01-02", category='sports'))
+    projection.replace_all([talk, quiz])
+    projection._apply({"operationType": "insert", "fullDocument": match})
+    assert ids(projection.query()) == ["quiz", "match", "talk"]
+    assert ids(projection.query(category='sports')) == ["match"]
+
+    # A category and status change moves the event to its new buckets
+    moved = {**talk, "category": "sports", "status": "ongoing", "start_date": "2030-01-01T12"}
+    projection._apply({"operationType": "update", "fullDocument": moved})
+    assert ids(projection.query(category='technical')) == []
+    assert ids(projection.query(category='sports')) == ["talk", "match"]
+    assert ids(projection.query(status='upcoming')) == ["quiz", "match"]
+    assert ids(projection.query(category='sports', status='ongoing')) == ["talk"]
+    assert ids(projection.query()) == ["quiz", "talk", "match"]
+
+    projection._apply({"operationType": "replace", "fullDocument": {**quiz, "title": "Quiz night"}})
+    assert projection.query(category='cultural')[0]['title'] == "Quiz night"
+    # Updated and then deleted before the lookup: the delete event follows
+    projection._apply({"operationType": "update", "documentKey": {"_id": quiz['_id']}, "fullDocument": None})
+    assert ids(projection.query(category='cultural')) == ["quiz"]
+
+    # Delete events carry only the Mongo _id
+    projection._apply({"operationType": "delete", "documentKey": {"_id": quiz['_id']}})
+    projection._apply({"operationType": "delete", "documentKey": {"_id": match['_id']}})
+    projection._apply({"operationType": "delete", "documentKey": {"_id": ObjectId()}})
+    assert ids(projection.query()) == ["talk"]
+    assert ids(projection.query(category='cultural')) == []
+    assert json.loads(projection.query_json()) == projection.query()
+
+
+def test_query_json_cache_follows_changes():
+    projection = EventProjection(lambda: None, to_api)
+    first = event("a", "2030-01-01")
+    projection.replace_all([first, {"_id": ObjectId(), "id": "broken"}])
+    assert json.loads(projection.query_json(category='technical')) == [to_api(first)]
+    projection.upsert(event("b", "2030-01-02"))
+    assert ids(json.loads(projection.query_json(category='technical'))) == ["a", "b"]
+
+
+def test_changes_from_mongodb_invalidate_the_ownership_cache():
+    cache = EventOwnershipCache()
+    projection = EventProjection(lambda: None, to_api, on_change=cache.invalidate)
+    talk, quiz, stale = event("talk", "2030-01-01"), event("quiz", "2030-01-02"), event("stale", "2030-01-03")
+    projection.replace_all([talk, quiz, stale])
+    for doc in (talk, quiz, stale):
+        cache.put({**doc, "organizer_id": "o1"})
+
+    # Another worker renames the talk and deletes the quiz
+    projection._apply({"operationType": "update", "fullDocument": {**talk, "title": "Keynote"}})
+    projection._apply({"operationType": "delete", "documentKey": {"_id": quiz['_id']}})
+    assert (cache.get("talk"), cache.get("quiz")) == (None, None)
+    assert cache.get("stale")['title'] == "stale"
+
+    # Polling reloads drop the entries of events that changed since the last load
+    cache.put({**talk, "title": "Keynote", "organizer_id": "o1"})
+    projection.replace_all([{**talk, "title": "Keynote"}, {**stale, "title": "Renamed"}])
+    assert cache.get("talk")['title'] == "Keynote"
+    assert cache.get("stale") is None
+
+def test_listing_from_the_projection_matches_mongodb(api, auth_headers):
+    headers = auth_headers("organizer@example.com")
+    for i, (category, status) in enumerate([
+        ("technical", None), ("cultural", None), ("technical", "ongoing"), ("sports", "completed"), ("technical", None),
+    ]):
+        created = api.post('/api/events', json={
+            "title": f"Event {i}", "description": "desc", "category": category, "capacity": 10,
+            "venue": f"Hall {i}", "start_date": f"2030-11-0{5 - i}T10:00:00Z", "end_date": f"2030-11-0{5 - i}T12:00:00Z",
+        }, headers=headers).json()
+        if status:
+            api.put(f"/api/events/{created['id']}", json={"status": status}, headers=headers)
+
+    filters = [{}, {"category": "technical"}, {"status": "upcoming"}, {"category": "technical", "status": "ongoing"},
+               {"category": "nope"}]
+    from_mongo = [api.get('/api/events', params=f).json() for f in filters]
+    api.portal.call(api.app.state.event_projection.load)
+    assert api.app.state.event_projection.ready
+    from_projection = [api.get('/api/events', params=f).json() for f in filters]
+    assert from_projection == from_mongo
+    assert [len(r) for r in from_projection] == [5, 3, 3, 1, 0]
+
+
+class NoChangeStreams:
+    """A standalone mongod: reads work, watch() fails like it does without a replica set."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.watched = 0
+
+    def watch(self, **kwargs):
+        self.watched += 1
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", CHANGE_STREAMS_UNSUPPORTED)
+
+    def find(self, *args, **kwargs):
+        return self.collection.find(*args, **kwargs)
+
+
+def test_falls_back_to_polling_without_change_streams():
+    events = AsyncMongoMockClient()['projection_test'].events
+    standalone = NoChangeStreams(events)
+    projection = EventProjection(lambda: standalone, to_api, mode='auto', poll_seconds=0.01)
+
+    async def scenario():
+        await events.insert_one(event("a", "2030-01-01"))
+        projection.start()
+        try:
+            while not projection.ready:
+                await asyncio.sleep(0.01)
+            await events.insert_one(event("b", "2030-01-02"))
+            while len(projection.query()) < 2:
+                await asyncio.sleep(0.01)
+        finally:
+            await projection.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert projection.source == 'poll'
+    assert standalone.watched == 1
+    assert not projection.ready
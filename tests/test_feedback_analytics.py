@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from feedback_analytics import FeedbackAggregator
+
+ORGANIZERS = {"e1": "o1", "e2": "o1", "e3": "o2"}
+
+
+def frame(*rows):
+    return pd.DataFrame.from_records(
+        [dict(zip(('event_id', 'rating', 'comment', 'created_at'), row)) for row in rows],
+        columns=['event_id', 'rating', 'comment', 'created_at'],
+    )
+
+
+def summaries_by_event(aggregator):
+    summaries, _ = aggregator.results()
+    return {s['event_id']: s for s in summaries}
+
+
+def test_negation_flips_the_next_word_only():
+    aggregator = FeedbackAggregator({})
+    aggregator.add(frame(
+        ("good", 5, "Good talk", "2030-01-01"),
+        ("not_good", 2, "Not good at all", "2030-01-01"),
+        ("not_bad", 4, "not bad, really great", "2030-01-01"),
+        ("far", 3, "Never on time but good", "2030-01-01"),
+        # A negation ending one comment does not carry over into the next
+        ("split", 3, "I did not", "2030-01-01"),
+        ("split", 3, "bad", "2030-01-01"),
+    ))
+    summaries = summaries_by_event(aggregator)
+    sentiment = {event_id: s['sentiment'] for event_id, s in summaries.items()}
+    assert sentiment['good'] == {"positive": 1, "neutral": 0, "negative": 0, "average_score": 1.0}
+    assert sentiment['not_good'] == {"positive": 0, "neutral": 0, "negative": 1, "average_score": -1.0}
+    assert sentiment['not_bad']['average_score'] == 2.0 and sentiment['not_bad']['positive'] == 1
+    assert sentiment['far']['positive'] == 1
+    assert sentiment['split'] == {"positive": 0, "neutral": 1, "negative": 1, "average_score": -0.5}
+
+
+def test_null_and_empty_comments_count_as_neutral():
+    aggregator = FeedbackAggregator(ORGANIZERS)
+    aggregator.add(frame(
+        ("e1", 4, None, "2030-01-01"),
+        ("e1", 5, "", "2030-01-01"),
+        ("e1", 3, np.nan, None),
+        ("e1", None, "great", "2030-01-01"),  # no rating: dropped
+        (None, 5, "great", "2030-01-01"),     # no event: dropped
+    ))
+    summary = summaries_by_event(aggregator)['e1']
+    assert aggregator.rows == 3
+    assert summary['feedback_count'] == 3 and summary['average_rating'] == 4.0
+    assert summary['rating_histogram'] == {"1": 0, "2": 0, "3": 1, "4": 1, "5": 1}
+    assert summary['sentiment'] == {"positive": 0, "neutral": 3, "negative": 0, "average_score": 0.0}
+    assert summary['top_keywords'] == []
+
+    empty = FeedbackAggregator(ORGANIZERS)
+    empty.add(frame((None, None, None, None)))
+    assert empty.results() == ([], [])
+
+
+def test_batches_merged_by_compact_match_a_single_batch():
+    rows = [
+        ("e1", 5, "Great speakers, great food", "2030-01-05"),
+        ("e1", 2, "Too crowded and loud", "2030-01-20"),
+        ("e2", 4, "Helpful workshop", "2030-02-01"),
+        ("e1", 4, "Great venue", "2030-02-03"),
+        ("e3", 1, "Boring and late", "2030-02-10"),
+        ("e2", 5, "Loved the workshop", "2030-03-01"),
+        ("e3", 3, "", "2030-03-02"),
+    ]
+    whole = FeedbackAggregator(ORGANIZERS)
+    whole.add(frame(*rows))
+
+    batched = FeedbackAggregator(ORGANIZERS, compact_every=2)
+    for start in range(0, len(rows), 2):
+        batched.add(frame(*rows[start:start + 2]))
+        # Every second batch is folded into the running totals
+        assert [len(parts) for parts in batched._parts.values()] == [1, 1, 1, 1]
+    assert batched.results() == whole.results()
+
+    summary = summaries_by_event(batched)['e1']
+    assert summary['feedback_count'] == 3
+    assert summary['top_keywords'][0] == {"word": "great", "count": 3}
+
+
+def test_monthly_trends_per_organizer():
+    aggregator = FeedbackAggregator(ORGANIZERS)
+    aggregator.add(frame(
+        ("e1", 5, "great", "2030-01-05T10:00:00+00:00"),
+        ("e2", 3, "boring", "2030-01-28T10:00:00+00:00"),
+        ("e1", 4, "useful", "2030-02-01T10:00:00+00:00"),
+        ("e3", 2, "late", "2030-02-14T10:00:00+00:00"),
+        ("unknown", 5, "great", "2030-02-14T10:00:00+00:00"),  # event no longer exists
+    ))
+    _, trends = aggregator.results()
+    assert trends == [
+        {"organizer_id": "o1", "trend": [
+            {"period": "2030-01", "feedback_count": 2, "average_rating": 4.0, "positive_share": 0.5},
+            {"period": "2030-02", "feedback_count": 1, "average_rating": 4.0, "positive_share": 1.0},
+        ]},
+        {"organizer_id": "o2", "trend": [
+            {"period": "2030-02", "feedback_count": 1, "average_rating": 2.0, "positive_share": 0.0},
+        ]},
+    ]
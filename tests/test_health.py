@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+
+def test_liveness(api):
+    response = api.get('/api/health/live')
+    assert response.status_code == 200 and response.json()['status'] == "alive"
+
+
+def test_readiness_before_start_up(server_app):
+    # Without the context manager the lifespan hook never runs
+    response = TestClient(server_app).get('/api/health/ready')
+    assert response.status_code == 503 and response.json() == {"status": "starting"}
+
+
+def test_readiness_reports_the_connection(api, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server.client, 'nodes', frozenset({("db1", 27017), ("db2", 27017)}), raising=False)
+    monkeypatch.setattr(server.client, 'primary', ("db1", 27017), raising=False)
+    monkeypatch.setattr(server.client, 'options', SimpleNamespace(
+        pool_options=SimpleNamespace(max_pool_size=50, min_pool_size=5)
+    ), raising=False)
+    response = api.get('/api/health/ready')
+    assert response.status_code == 200
+    body = response.json()
+    assert (body['status'], body['nodes'], body['primary']) == ("ready", ["db1:27017", "db2:27017"], "db1:27017")
+    assert body['pool']['max_size'] == 50 and body['event_projection'] is None
+    assert body['startup_ms'] is not None
+
+
+def test_readiness_hides_driver_errors(api, monkeypatch):
+    import server
+
+    async def ping(command):
+        raise ServerSelectionTimeoutError("db1.internal:27017: timed out, Topology Description: <...>")
+
+    monkeypatch.setattr(server.client, 'admin', SimpleNamespace(command=ping), raising=False)
+    response = api.get('/api/health/ready')
+    assert response.status_code == 503
+    assert response.json() == {"status": "unavailable"}
@@ -0,0 +1,143 @@
+import asyncio
+
+import httpx
+import jwt
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from mongomock_motor import AsyncMongoMockClient
+
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+
+SECRET = 'test-secret'
+
+
+def bearer(user_id):
+    return {"Authorization": f"Bearer {jwt.encode({'user_id': user_id}, SECRET, algorithm='HS256')}"}
+
+
+class Handler:
+    """Counts how often the wrapped route really runs; a `gate` holds it open until set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = None
+
+    async def endpoint(self, request: Request):
+        self.calls += 1
+        body = await request.json()
+        if self.gate is not None:
+            await self.gate.wait()
+        return JSONResponse({"call": self.calls, **body}, status_code=body.get('status', 201))
+
+
+@pytest.fixture
+def handler():
+    return Handler()
+
+
+@pytest.fixture
+def call(handler):
+    """Runs a coroutine taking an httpx client bound to the middleware-wrapped app."""
+    app = FastAPI()
+    app.add_api_route('/api/registrations/{event_id}', handler.endpoint, methods=['POST'])
+    collection = AsyncMongoMockClient()['idempotency_test'].idempotency_keys
+    app.add_middleware(IdempotencyMiddleware, routes=[('POST', '/api/registrations/{event_id}')],
+                       store=IdempotencyStore(lambda: collection), jwt_secret=SECRET)
+
+    def run(scenario):
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+                return await scenario(client)
+        return asyncio.run(main())
+    return run
+
+
+def post(client, key, user='u1', body=None, path='/api/registrations/e1'):
+    return client.post(path, json=body or {}, headers={**bearer(user), 'Idempotency-Key': key})
+
+
+def test_retry_replays_the_stored_response(call, handler):
+    async def scenario(client):
+        return await post(client, 'k1', body={"seat": 4}), await post(client, 'k1', body={"seat": 4})
+
+    first, retry = call(scenario)
+    assert handler.calls == 1
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json() == {"call": 1, "seat": 4}
+    assert retry.headers['idempotent-replayed'] == 'true'
+    assert 'idempotent-replayed' not in first.headers
+
+
+def test_reused_key_with_a_different_request_is_rejected(call, handler):
+    async def scenario(client):
+        await post(client, 'k1', body={"seat": 4})
+        return (
+            await post(client, 'k1', body={"seat": 5}),
+            await post(client, 'k1', body={"seat": 4}, path='/api/registrations/e2'),
+        )
+
+    for response in call(scenario):
+        assert response.status_code == 422
+    assert handler.calls == 1
+
+
+def test_retry_while_the_first_request_runs_gets_409(call, handler):
+    async def scenario(client):
+        handler.gate = asyncio.Event()
+        first = asyncio.create_task(post(client, 'k1'))
+        while not handler.calls:
+            await asyncio.sleep(0)
+        busy = await post(client, 'k1')
+        handler.gate.set()
+        return await first, busy
+
+    first, busy = call(scenario)
+    assert first.status_code == 201
+    assert busy.status_code == 409
+    assert busy.headers['retry-after'] == '1'
+    assert handler.calls == 1
+
+
+@pytest.mark.parametrize('status', [500, 503, 401, 403, 429])
+def test_errors_and_credential_dependent_responses_are_not_stored(call, handler, status):
+    async def scenario(client):
+        return await post(client, 'k1', body={"status": status}), await post(client, 'k1', body={"status": status})
+
+    first, retry = call(scenario)
+    assert first.status_code == retry.status_code == status
+    assert 'idempotent-replayed' not in retry.headers
+    assert handler.calls == 2
+
+
+def test_client_errors_are_replayed(call, handler):
+    async def scenario(client):
+        return await post(client, 'k1', body={"status": 400}), await post(client, 'k1', body={"status": 400})
+
+    _, retry = call(scenario)
+    assert retry.status_code == 400
+    assert retry.headers['idempotent-replayed'] == 'true'
+    assert handler.calls == 1
+
+
+def test_keys_are_scoped_to_the_user(call, handler):
+    async def scenario(client):
+        return await post(client, 'k1', user='alice'), await post(client, 'k1', user='bob')
+
+    alice, bob = call(scenario)
+    assert handler.calls == 2
+    assert (alice.json()['call'], bob.json()['call']) == (1, 2)
+    assert 'idempotent-replayed' not in bob.headers
+
+
+def test_requests_without_a_key_or_token_pass_through(call, handler):
+    async def scenario(client):
+        await client.post('/api/registrations/e1', json={}, headers=bearer('u1'))
+        await client.post('/api/registrations/e1', json={}, headers=bearer('u1'))
+        await client.post('/api/registrations/e1', json={}, headers={'Idempotency-Key': 'k1'})
+        await client.post('/api/registrations/e1', json={}, headers={'Idempotency-Key': 'k1'})
+        return await post(client, '')
+
+    empty_key = call(scenario)
+    assert handler.calls == 4
+    assert empty_key.status_code == 400
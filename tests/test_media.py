@@ -0,0 +1,80 @@
+import asyncio
+import base64
+import hashlib
+import io
+
+from mongomock_motor import AsyncMongoMockClient
+from PIL import Image
+
+import media
+
+
+def png_bytes(color='red'):
+    buffered = io.BytesIO()
+    Image.new('RGB', (400, 300), color).save(buffered, 'PNG')
+    return buffered.getvalue()
+
+
+def test_concurrent_saves_of_the_same_image_share_one_id(tmp_path):
+    pipeline = media.ImagePipeline(media.LocalImageStore(tmp_path), workers=1)
+    data = png_bytes()
+
+    async def save_four():
+        return await asyncio.gather(*[pipeline.save(data) for _ in range(4)])
+
+    try:
+        ids = asyncio.run(save_four())
+    finally:
+        pipeline.shutdown()
+    assert len(set(ids)) == 1
+    assert not list(tmp_path.rglob('*.tmp'))
+
+
+def test_concurrent_puts_of_the_same_key(tmp_path):
+    store = media.LocalImageStore(tmp_path)
+
+    async def put_eight():
+        await asyncio.gather(*[store.put('ab/key', b'x' * 100_000, 'image/png') for _ in range(8)])
+        return await store.get('ab/key')
+
+    assert asyncio.run(put_eight()) == (b'x' * 100_000, 'image/png')
+    assert not list(tmp_path.rglob('*.tmp'))
+
+
+def test_backfill_moves_data_urls_into_the_store(tmp_path):
+    db = AsyncMongoMockClient()['media_test']
+    pipeline = media.ImagePipeline(media.LocalImageStore(tmp_path), workers=1)
+    poster = 'data:image/png;base64,' + base64.b64encode(png_bytes('blue')).decode()
+    avatar = 'data:image/png;base64,' + base64.b64encode(png_bytes('green')).decode()
+
+    async def scenario():
+        await db.events.insert_many([
+            {"id": "e1", "image_url": poster},
+            {"id": "e2", "image_url": poster},
+            {"id": "e3", "image_url": "https://cdn.example/poster.jpg"},
+            {"id": "e4", "image_url": "data:image/png;base64,bm90IGFuIGltYWdl"},
+            {"id": "e5"},
+        ])
+        await db.users.insert_one({"id": "u1", "avatar": avatar})
+        counts = await media.backfill(db, pipeline, batch_size=2)
+        again = await media.backfill(db, pipeline)
+        events = {e['id']: e.get('image_url') async for e in db.events.find()}
+        user = await db.users.find_one({"id": "u1"})
+        thumb = await pipeline.load(user['avatar'].split('/')[-2], 'thumb.webp')
+        return counts, again, events, user['avatar'], thumb
+
+    try:
+        counts, again, events, avatar_url, thumb = asyncio.run(scenario())
+    finally:
+        pipeline.shutdown()
+    assert counts == {"events": 2, "users": 1, "skipped": 1}
+    assert again == {"events": 0, "users": 0, "skipped": 1}
+    poster_id = hashlib.sha256(png_bytes('blue')).hexdigest()
+    assert events == {
+        "e1": f"/api/media/{poster_id}/medium.webp",
+        "e2": f"/api/media/{poster_id}/medium.webp",
+        "e3": "https://cdn.example/poster.jpg",
+        "e4": "data:image/png;base64,bm90IGFuIGltYWdl",
+        "e5": None,
+    }
+    assert avatar_url.endswith('/thumb.webp') and thumb[1] == 'image/webp'
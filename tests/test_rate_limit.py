@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from rate_limit import InMemoryRateLimitBackend, RateLimitMiddleware, RateLimitRule, compile_path, parse_rate
+
+
+def scope(*forwarded_for, client='10.0.0.1'):
+    return {'headers': [(b'x-forwarded-for', value) for value in forwarded_for], 'client': (client, 5000)}
+
+
+@pytest.mark.parametrize('trusted_proxies, headers, expected', [
+    (0, [b'1.2.3.4'], 'ip:10.0.0.1'),
+    (1, [b'1.2.3.4'], 'ip:1.2.3.4'),
+    # Client-supplied entries left of the proxy's own are ignored
+    (1, [b'spoofed, 1.2.3.4'], 'ip:1.2.3.4'),
+    (1, [b'spoofed', b'1.2.3.4'], 'ip:1.2.3.4'),
+    (2, [b'spoofed, 1.2.3.4, 10.0.0.2'], 'ip:1.2.3.4'),
+    # Fewer hops than trusted proxies: the request did not come through them
+    (2, [b'1.2.3.4'], 'ip:10.0.0.1'),
+])
+def test_identify_uses_the_address_appended_by_the_trusted_proxy(trusted_proxies, headers, expected):
+    middleware = RateLimitMiddleware(None, [], None, 'secret', trusted_proxies=trusted_proxies)
+    assert middleware._identify(scope(*headers)) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('10/minute', (10, 60)),
+    ('5/minutes', (5, 60)),
+    (' 100 / day ', (100, 86400)),
+    ('3/hour', (3, 3600)),
+    ('20/90', (20, 90)),
+    ('7', (7, 1)),
+])
+def test_parse_rate(value, expected):
+    assert parse_rate(value) == expected
+
+
+def test_parse_rate_rejects_unknown_periods():
+    with pytest.raises(ValueError):
+        parse_rate('10/fortnight')
+
+
+@pytest.mark.parametrize('path, matched, unmatched', [
+    ('/api/auth/login', ['/api/auth/login'], ['/api/auth/login/', '/api/auth/logins']),
+    ('/api/registrations/{event_id}', ['/api/registrations/e1'], ['/api/registrations/', '/api/registrations/e1/x']),
+    ('/api/{path:path}', ['/api/events', '/api/events/e1/analytics'], ['/health', '/apix']),
+])
+def test_compile_path(path, matched, unmatched):
+    pattern = compile_path(path)
+    assert all(pattern.match(p) for p in matched)
+    assert not any(pattern.match(p) for p in unmatched)
+
+
+def test_exhausted_budget_gets_429_with_retry_after():
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+    rules = [RateLimitRule.from_string('login', 'POST', '/api/auth/login', '2/minute')]
+    middleware = RateLimitMiddleware(app, rules, InMemoryRateLimitBackend(), 'secret')
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url='http://test') as client:
+            logins = [await client.post('/api/auth/login') for _ in range(3)]
+            other = await client.post('/api/auth/register')
+            return logins, other
+
+    logins, other = asyncio.run(scenario())
+    assert [r.status_code for r in logins] == [200, 200, 429]
+    assert logins[2].json() == {"detail": "Too many requests"}
+    # One token refills every 30 seconds
+    assert 1 <= int(logins[2].headers['retry-after']) <= 30
+    assert other.status_code == 200
@@ -0,0 +1,136 @@
+import asyncio
+import uuid
+
+from bson import Binary, ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+import registrations
+
+
+def legacy(event_id, user_id, checked_in=False):
+    doc = {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "event_id": event_id,
+        "user_id": user_id,
+        "user_name": "Student",
+        "user_email": "student@example.com",
+        "qr_code": "data:image/png;base64," + "A" * 2000,
+        "registered_at": "2030-01-01T05:30:00+00:00",
+        "checked_in": checked_in,
+    }
+    if checked_in:
+        doc["checked_in_at"] = "2030-01-02T09:00:00+00:00"
+    return doc
+
+
+def test_compact_and_api_shape():
+    doc = legacy("e1", "u1", checked_in=True)
+    new = registrations.compact(doc)
+    assert new == {
+        "_id": Binary.from_uuid(uuid.UUID(doc['id'])),
+        "event_id": "e1",
+        "user_id": "u1",
+        "registered_at": doc['registered_at'],
+        "checked_in": True,
+        "checked_in_at": doc['checked_in_at'],
+    }
+    assert registrations.to_api(new) == {
+        "id": doc['id'], "event_id": "e1", "user_id": "u1", "registered_at": doc['registered_at'],
+        "checked_in": True, "checked_in_at": doc['checked_in_at'],
+    }
+    assert registrations.to_api(doc)['id'] == doc['id'] and '_id' not in registrations.to_api(doc)
+
+
+def test_id_query_matches_both_versions():
+    value = str(uuid.uuid4())
+    assert registrations.id_query(value) == {"$or": [{"_id": Binary.from_uuid(uuid.UUID(value))}, {"id": value}]}
+    assert registrations.id_query("not-a-uuid") is None
+
+
+def test_migrate_rewrites_version_1_documents():
+    db = AsyncMongoMockClient()['registrations_test']
+    docs = [legacy("e1", f"u{i}", checked_in=i % 2 == 0) for i in range(5)]
+
+    async def scenario():
+        await registrations.ensure_indexes(db)
+        await db.registrations.insert_many(docs)
+        await db.registrations.insert_one(registrations.new_document("e1", "u9"))
+        migrated = await registrations.migrate(db, batch_size=2)
+        again = await registrations.migrate(db, batch_size=2)
+        stored = await db.registrations.find().to_list(None)
+        return migrated, again, stored
+
+    migrated, again, stored = asyncio.run(scenario())
+    assert (migrated, again) == (5, 0)
+    assert len(stored) == 6
+    assert all(isinstance(doc['_id'], Binary) and 'id' not in doc and 'qr_code' not in doc for doc in stored)
+    by_id = {registrations.registration_id(doc): doc for doc in stored}
+    for doc in docs:
+        assert by_id[doc['id']] == registrations.compact(doc)
+
+
+def test_migrate_keeps_an_original_checked_in_during_its_batch(monkeypatch):
+    db = AsyncMongoMockClient()['registrations_test']
+    docs = [legacy("e1", f"u{i}") for i in range(3)]
+    collection_class = type(db.registrations)
+    bulk_write = collection_class.bulk_write
+    checked_in_meanwhile = [docs[1]['_id']]
+
+    async def bulk_write_then_check_in(self, *args, **kwargs):
+        result = await bulk_write(self, *args, **kwargs)
+        # Check-in lands on the original after its copy was written, before the original is deleted
+        if checked_in_meanwhile:
+            await self.update_one(
+                {"_id": checked_in_meanwhile.pop()},
+                {"$set": {"checked_in": True, "checked_in_at": "2030-01-02T09:00:00+00:00"}},
+            )
+        return result
+
+    async def scenario():
+        await db.registrations.insert_many(docs)
+        monkeypatch.setattr(collection_class, 'bulk_write', bulk_write_then_check_in)
+        migrated = await registrations.migrate(db, batch_size=10)
+        return migrated, await db.registrations.find().to_list(None)
+
+    migrated, stored = asyncio.run(scenario())
+    assert migrated == 3
+    assert len(stored) == 3 and not any('id' in doc for doc in stored)
+    copy = next(doc for doc in stored if registrations.registration_id(doc) == docs[1]['id'])
+    assert copy['checked_in'] is True and copy['checked_in_at'] == "2030-01-02T09:00:00+00:00"
+
+
+def test_checkin_qr_and_listing_work_for_both_versions(api, auth_headers):
+    import server
+
+    organizer = auth_headers("organizer@example.com")
+    event = api.post('/api/events', json={
+        "title": "Hackathon", "description": "desc", "category": "technical", "capacity": 50,
+        "venue": "Main Hall", "start_date": "2030-11-04T10:00:00Z", "end_date": "2030-11-04T12:00:00Z",
+    }, headers=organizer).json()
+    student = auth_headers("student@example.com", role='student')
+    student_id = api.get('/api/auth/me', headers=student).json()['id']
+    current = api.post(f"/api/registrations/{event['id']}", headers=student).json()
+
+    old_student = auth_headers("old@example.com", role='student')
+    old = legacy(event['id'], api.get('/api/auth/me', headers=old_student).json()['id'])
+    api.portal.call(lambda: server.db.registrations.insert_one(dict(old)))
+    stored = api.portal.call(lambda: server.db.registrations.find_one({"user_id": student_id}))
+    assert isinstance(stored['_id'], Binary) and 'id' not in stored
+
+    for registration_id, headers in ((current['id'], student), (old['id'], old_student)):
+        qr = api.get(f"/api/registrations/{registration_id}/qr", headers=headers)
+        assert qr.status_code == 200 and qr.headers['content-type'] == 'image/png'
+        assert api.post(f"/api/registrations/checkin/{registration_id}", headers=organizer).status_code == 200
+        assert api.post(f"/api/registrations/checkin/{registration_id}", headers=organizer).status_code == 400
+    assert api.post(f"/api/registrations/checkin/{uuid.uuid4()}", headers=organizer).status_code == 404
+    assert api.get("/api/registrations/not-a-uuid/qr", headers=student).status_code == 404
+
+    listing = api.get(f"/api/registrations/event/{event['id']}", headers=organizer).json()
+    assert sorted((r['id'], r['user_email'], r['checked_in']) for r in listing) == sorted([
+        (current['id'], "student@example.com", True),
+        (old['id'], "old@example.com", True),
+    ])
+    # The listing joins users on `id`, indexed at start-up
+    indexes = api.portal.call(lambda: server.db.users.index_information())
+    assert any(index['key'] == [("id", 1)] and index.get('unique') for index in indexes.values())
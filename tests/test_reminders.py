@@ -0,0 +1,144 @@
+import asyncio
+import email
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import reminders
+import venues
+
+
+@pytest.fixture
+def campus_timezone(monkeypatch):
+    monkeypatch.setenv('EVENT_TIMEZONE', 'Asia/Kolkata')
+    venues.event_timezone.cache_clear()
+    yield
+    venues.event_timezone.cache_clear()
+
+
+def render(start_ts, name='Zoë', title='Hack $night <b>'):
+    event = {"id": "e1", "title": title, "venue": "Hall A", "start_ts": start_ts}
+    rendered = reminders.RenderedEvent(event, reminders.DEFAULT_TEMPLATES, "Campus Pulse <noreply@campus.test>", "http://app")
+    return email.message_from_bytes(rendered.message(name, "zoe@example.com"))
+
+
+def test_start_time_is_shown_in_the_event_timezone(campus_timezone):
+    # Stored naive in UTC, as MongoDB returns it
+    message = render(datetime(2026, 11, 3, 8, 30))
+    assert message['Subject'] == 'Reminder: Hack $night <b> starts Tue 03 Nov 2026, 14:00 IST'
+
+
+def test_message_fills_in_the_recipient_and_escapes_html():
+    message = render(datetime(2026, 11, 3, 14, 0))
+    assert message['Subject'].endswith('14:00 UTC')
+    text, html = [part.get_payload(decode=True).decode() for part in message.walk() if not part.is_multipart()]
+    assert text.startswith('Hi Zoë,') and 'Hack $night <b> starts' in text
+    assert 'Hack $night &lt;b&gt;' in html and 'http://app/event/e1' in html
+
+
+
+# Far enough ahead that the TTL on reminder_deliveries keeps the records
+NOW = datetime(2030, 3, 1, 9, 0, tzinfo=timezone.utc)
+SENDER = "Campus Pulse <noreply@campus.test>"
+
+
+async def seed(db):
+    await reminders.ensure_indexes(db)
+    await db.events.insert_many([
+        {"id": "talk", "title": "Talk", "venue": "Hall A", "status": "upcoming", "start_ts": NOW + timedelta(hours=2)},
+        {"id": "hackathon", "title": "Hackathon", "venue": "Lab 1", "status": "upcoming", "start_ts": NOW + timedelta(hours=20)},
+        {"id": "cancelled", "title": "Cancelled", "venue": "Hall A", "status": "cancelled", "start_ts": NOW + timedelta(hours=3)},
+        {"id": "next-week", "title": "Next week", "venue": "Hall A", "status": "upcoming", "start_ts": NOW + timedelta(days=7)},
+    ])
+    await db.users.insert_many([{"id": f"u{i}", "name": f"Student {i}", "email": f"s{i}@example.com"} for i in range(4)])
+    await db.registrations.insert_many([
+        {"event_id": event_id, "user_id": user_id}
+        for event_id, user_id in [("talk", "u0"), ("talk", "u1"), ("hackathon", "u1"), ("hackathon", "u2"),
+                                  ("cancelled", "u3"), ("next-week", "u3")]
+    ])
+
+
+def test_dispatcher_reminds_each_registrant_once():
+    async def scenario():
+        db = AsyncMongoMockClient()['reminders_test']
+        await seed(db)
+        server = reminders.DebugSmtpServer(port=0)
+        await server.start()
+        transport = reminders.SmtpTransport('127.0.0.1', server.port)
+        dispatcher = reminders.ReminderDispatcher(db, transport, SENDER, "http://app", batch_size=1, concurrency=2)
+        try:
+            first = await dispatcher.run(hours=24, now=NOW)
+            second = await dispatcher.run(hours=24, now=NOW)
+        finally:
+            await transport.close()
+            await server.stop()
+        return first, second, server.messages
+
+    first, second, messages = asyncio.run(scenario())
+    assert (first['events'], first['recipients'], first['sent'], first['failed']) == (2, 4, 4, 0)
+    assert (second['recipients'], second['skipped'], second['sent']) == (4, 4, 0)
+    delivered = sorted(
+        (recipients[0], email.message_from_bytes(message)['Subject'].split(' starts')[0])
+        for _, recipients, message in messages
+    )
+    assert delivered == [
+        ("<s0@example.com>", "Reminder: Talk"),
+        ("<s1@example.com>", "Reminder: Hackathon"),
+        ("<s1@example.com>", "Reminder: Talk"),
+        ("<s2@example.com>", "Reminder: Hackathon"),
+    ]
+
+
+def test_failed_deliveries_are_retried_up_to_max_attempts():
+    async def scenario():
+        db = AsyncMongoMockClient()['reminders_test']
+        await seed(db)
+        server = reminders.DebugSmtpServer(port=0)
+        await server.start()
+        port = server.port
+        await server.stop()
+        # Nothing listens on the port until the server is restarted
+        transport = reminders.SmtpTransport('127.0.0.1', port, timeout=5)
+        dispatcher = reminders.ReminderDispatcher(db, transport, SENDER, "http://app", max_attempts=2)
+        failing = [await dispatcher.run(hours=24, now=NOW) for _ in range(2)]
+        attempts = {d['_id']: d['attempts'] async for d in db.reminder_deliveries.find()}
+        server = reminders.DebugSmtpServer(port=port)
+        await server.start()
+        try:
+            exhausted = await dispatcher.run(hours=24, now=NOW)
+        finally:
+            await transport.close()
+            await server.stop()
+        return failing, attempts, exhausted, server.received
+
+    failing, attempts, exhausted, received = asyncio.run(scenario())
+    assert [(s['sent'], s['failed']) for s in failing] == [(0, 4), (0, 4)]
+    assert attempts == {f"reminder:{e}:{u}": 2 for e, u in [("talk", "u0"), ("talk", "u1"), ("hackathon", "u1"), ("hackathon", "u2")]}
+    assert (exhausted['skipped'], exhausted['sent'], exhausted['failed'], received) == (4, 0, 0, 0)
+
+
+def test_failed_deliveries_are_sent_by_the_next_run():
+    async def scenario():
+        db = AsyncMongoMockClient()['reminders_test']
+        await seed(db)
+        server = reminders.DebugSmtpServer(port=0)
+        await server.start()
+        port = server.port
+        await server.stop()
+        transport = reminders.SmtpTransport('127.0.0.1', port, timeout=5)
+        dispatcher = reminders.ReminderDispatcher(db, transport, SENDER, "http://app", max_attempts=3)
+        failed = await dispatcher.run(hours=24, now=NOW)
+        server = reminders.DebugSmtpServer(port=port)
+        await server.start()
+        try:
+            retried = await dispatcher.run(hours=24, now=NOW)
+        finally:
+            await transport.close()
+            await server.stop()
+        states = {d['_id']: (d['state'], d['attempts']) async for d in db.reminder_deliveries.find()}
+        return failed, retried, states, server.received
+
+    failed, retried, states, received = asyncio.run(scenario())
+    assert (failed['failed'], retried['sent'], retried['failed'], received) == (4, 4, 0, 4)
+    assert set(states.values()) == {("sent", 2)}
@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import mongomock.aggregate
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import timeseries
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+
+def utc(hour, minute=0):
+    return datetime(2030, 1, 1, hour, minute, tzinfo=timezone.utc)
+
+
+async def record(collection, event_id, metric, *times):
+    for at in times:
+        selector, update = timeseries.bucket_update(event_id, metric, at)
+        await collection.update_one(selector, update, upsert=True)
+
+
+def test_bucket_update_uses_the_utc_hour_and_minute():
+    assert timeseries.bucket_update("e1", "registrations", datetime(2030, 1, 1, 11, 0, tzinfo=IST)) == (
+        {"event_id": "e1", "metric": "registrations", "hour": "2030-01-01T05"},
+        {"$inc": {"count": 1, "minutes.30": 1}},
+    )
+
+
+def test_downsample_by_minute_and_hour():
+    docs = [
+        {"hour": "2030-01-01T05", "count": 3, "minutes": {"29": 1, "30": 2}},
+        {"hour": "2030-01-01T07", "count": 4, "minutes": {"00": 4}},
+    ]
+    minutes = timeseries.downsample(docs, utc(5, 28), utc(5, 32), 'minute')
+    assert [(p['t'], p['count'], p['cumulative']) for p in minutes] == [
+        (utc(5, 28).isoformat(), 0, 0),
+        (utc(5, 29).isoformat(), 1, 1),
+        (utc(5, 30).isoformat(), 2, 3),
+        (utc(5, 31).isoformat(), 0, 3),
+    ]
+    fifteen = timeseries.downsample(docs, utc(5), utc(6), '15min')
+    assert [p['count'] for p in fifteen] == [0, 1, 2, 0]
+    hours = timeseries.downsample(docs, utc(4), utc(8), 'hour')
+    assert [(p['t'], p['count'], p['cumulative']) for p in hours] == [
+        (utc(4).isoformat(), 0, 0),
+        (utc(5).isoformat(), 3, 3),
+        (utc(6).isoformat(), 0, 3),
+        (utc(7).isoformat(), 4, 7),
+    ]
+    # Buckets are aligned to the interval, not to `start`
+    assert [p['t'] for p in timeseries.downsample(docs, utc(5, 20), utc(6), '15min')][0] == utc(5, 15).isoformat()
+
+
+def test_query_series_with_offset_timestamps():
+    collection = AsyncMongoMockClient()['timeseries_test'].event_timeseries
+
+    async def scenario():
+        await record(collection, "e1", "registrations", utc(5, 30), utc(9, 0))
+        in_ist = await timeseries.query_series(
+            collection, "e1", "registrations",
+            datetime(2030, 1, 1, 10, 0, tzinfo=IST), datetime(2030, 1, 1, 12, 0, tzinfo=IST), 'minute',
+        )
+        in_utc = await timeseries.query_series(collection, "e1", "registrations", utc(4, 30), utc(6, 30), 'minute')
+        everything = await timeseries.query_series(collection, "e1", "registrations", None, None)
+        return in_ist, in_utc, everything
+
+    in_ist, in_utc, everything = asyncio.run(scenario())
+    assert in_ist['total'] == in_utc['total'] == 1
+    assert in_ist['points'] == in_utc['points']
+    assert (everything['interval'], everything['total'], everything['start']) == ('minute', 2, utc(5).isoformat())
+
+
+@pytest.mark.parametrize('end', [utc(5), utc(4)])
+def test_query_series_rejects_an_empty_range(end):
+    collection = AsyncMongoMockClient()['timeseries_test'].event_timeseries
+    with pytest.raises(ValueError):
+        asyncio.run(timeseries.query_series(collection, "e1", "registrations", utc(5), end))
+
+
+@pytest.fixture
+def mongomock_rebuild_stages(monkeypatch):
+    """mongomock lacks $substrCP (the same as $substr on ASCII timestamps) and $merge."""
+    handle = mongomock.aggregate._Parser._handle_string_operator
+
+    def handle_string_operator(self, operator, values):
+        return handle(self, '$substr' if operator == '$substrCP' else operator, values)
+
+    def merge(collection, database, options):
+        assert options['whenMatched'] == 'replace'
+        for doc in collection:
+            database[options['into']].replace_one({key: doc[key] for key in options['on']}, doc, upsert=True)
+        return []
+
+    monkeypatch.setattr(mongomock.aggregate._Parser, '_handle_string_operator', handle_string_operator)
+    monkeypatch.setitem(mongomock.aggregate._PIPELINE_HANDLERS, '$merge', merge)
+
+
+def test_rebuild_matches_the_incremental_counters(mongomock_rebuild_stages):
+    db = AsyncMongoMockClient()['timeseries_test']
+    registered = [utc(5, 30), utc(5, 30), utc(5, 59), utc(7, 1)]
+    checked_in = [utc(9, 15)]
+
+    async def scenario():
+        await timeseries.ensure_indexes(db.event_timeseries)
+        await db.registrations.insert_many([
+            {"event_id": "e1", "user_id": f"u{i}", "registered_at": at.isoformat(),
+             "checked_in": i == 0, **({"checked_in_at": checked_in[0].isoformat()} if i == 0 else {})}
+            for i, at in enumerate(registered)
+        ] + [{"event_id": "e2", "user_id": "u9", "registered_at": utc(6).isoformat(), "checked_in": False}])
+        await record(db.live_timeseries, "e1", "registrations", *registered)
+        await record(db.live_timeseries, "e1", "checkins", *checked_in)
+        # A stale counter from before the rebuild is replaced
+        await record(db.event_timeseries, "e1", "registrations", utc(3))
+
+        await timeseries.rebuild(db, "e1")
+        rebuilt = await db.event_timeseries.find({}, {"_id": 0}).sort([("metric", 1), ("hour", 1)]).to_list(None)
+        live = await db.live_timeseries.find({}, {"_id": 0}).sort([("metric", 1), ("hour", 1)]).to_list(None)
+        return rebuilt, live
+
+    rebuilt, live = asyncio.run(scenario())
+    assert rebuilt == live
+    assert [(d['metric'], d['hour'], d['count']) for d in rebuilt] == [
+        ("checkins", "2030-01-01T09", 1),
+        ("registrations", "2030-01-01T05", 3),
+        ("registrations", "2030-01-01T07", 1),
+    ]
+
+
+def test_timeseries_endpoint_rejects_end_before_start(api, auth_headers):
+    headers = auth_headers("organizer@example.com")
+    event = api.post('/api/events', json={
+        "title": "Hackathon", "description": "desc", "category": "technical", "capacity": 50,
+        "venue": "Main Hall", "start_date": "2030-11-04T10:00:00Z", "end_date": "2030-11-04T12:00:00Z",
+    }, headers=headers).json()
+    response = api.get(
+        f"/api/analytics/event/{event['id']}/timeseries",
+        params={"start": "2030-01-01T12:00:00+05:30", "end": "2030-01-01T06:30:00Z"},
+        headers=headers,
+    )
+    assert response.status_code == 400
@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import registrations
+import timetable
+import venues
+
+
+def at(hour, minute=0):
+    return datetime(2030, 11, 4, hour, minute, tzinfo=timezone.utc)
+
+
+def event(event_id, start, end, status='upcoming'):
+    return {
+        "id": event_id, "title": event_id.title(), "category": "technical", "venue": "Main Hall", "status": status,
+        "start_date": start.isoformat(), "end_date": end.isoformat(),
+        **venues.schedule_fields("Main Hall", start.isoformat(), end.isoformat()),
+    }
+
+
+@pytest.fixture
+def calendar(mongomock_lookup_let):
+    """Runs a coroutine against a database where student s1 is registered for a morning of events."""
+    db = AsyncMongoMockClient()['timetable_test']
+    events = [
+        event("keynote", at(10), at(12)),
+        event("panel", at(11), at(13)),
+        event("lunch", at(13), at(14)),  # starts as the panel ends
+        event("cancelled", at(10, 30), at(11), status='cancelled'),
+        event("demo", at(11, 30), at(11, 45)),
+    ]
+    legacy = {"id": "legacy", "title": "Legacy", "start_date": "soon", "end_date": "later", "status": "upcoming"}
+
+    def run(scenario):
+        async def main():
+            await db.events.insert_many(events + [legacy])
+            await db.registrations.insert_many(
+                [registrations.new_document(e['id'], "s1") for e in events + [legacy]]
+                + [registrations.new_document("keynote", "s2")]
+            )
+            return await scenario(db)
+        return asyncio.run(main())
+    return run
+
+
+def test_my_schedule_marks_overlapping_events(calendar):
+    schedule = calendar(lambda db: timetable.my_schedule(db, "s1"))
+    assert [(e['event']['id'], e['clashes_with']) for e in schedule['events']] == [
+        ("keynote", ["panel", "demo"]),
+        ("panel", ["keynote", "demo"]),
+        ("demo", ["keynote", "panel"]),
+        ("lunch", []),
+    ]
+    assert schedule['clash_count'] == 3
+    first = schedule['events'][0]
+    assert set(first) == {"registration_id", "checked_in", "event", "clashes_with"}
+    assert 'start_ts' not in first['event'] and first['event']['venue'] == "Main Hall"
+
+
+def test_my_schedule_since_drops_finished_events(calendar):
+    schedule = calendar(lambda db: timetable.my_schedule(db, "s1", since=at(12, 30)))
+    assert [e['event']['id'] for e in schedule['events']] == ["panel", "lunch"]
+    assert schedule['clash_count'] == 0
+
+
+def test_find_clashes_ignores_touching_and_cancelled_events(calendar):
+    async def scenario(db):
+        return (
+            await timetable.find_clashes(db, "s1", at(12), at(13)),
+            await timetable.find_clashes(db, "s1", at(12), at(13), exclude_event_id="panel"),
+            await timetable.find_clashes(db, "s1", at(10, 30), at(10, 45)),
+            await timetable.find_clashes(db, "s2", at(11), at(12)),
+        )
+
+    touching, excluded, morning, other_student = calendar(scenario)
+    assert touching == [{
+        "id": "panel", "title": "Panel", "venue": "Main Hall",
+        "start_date": at(11).isoformat(), "end_date": at(13).isoformat(),
+    }]
+    assert excluded == []
+    assert [c['id'] for c in morning] == ["keynote"]
+    assert [c['id'] for c in other_student] == ["keynote"]
+
+
+@pytest.fixture
+def overlapping_events(api, auth_headers):
+    organizer = auth_headers("organizer@example.com")
+    created = [
+        api.post('/api/events', json={
+            "title": title, "description": "desc", "category": "technical", "capacity": 10, "venue": venue,
+            "start_date": start, "end_date": end,
+        }, headers=organizer).json()
+        for title, venue, start, end in [
+            ("Keynote", "Main Hall", "2030-11-04T10:00:00Z", "2030-11-04T12:00:00Z"),
+            ("Workshop", "Lab 1", "2030-11-04T11:00:00Z", "2030-11-04T13:00:00Z"),
+        ]
+    ]
+    student = auth_headers("student@example.com", role='student')
+    assert api.post(f"/api/registrations/{created[0]['id']}", headers=student).json()['clashes'] == []
+    return created, student
+
+
+def test_clash_policy_warn_registers_and_reports(api, overlapping_events, monkeypatch):
+    import server
+
+    (keynote, workshop), student = overlapping_events
+    monkeypatch.setattr(server, 'REGISTRATION_CLASH_POLICY', 'warn')
+    response = api.post(f"/api/registrations/{workshop['id']}", headers=student)
+    assert response.status_code == 200
+    assert [c['id'] for c in response.json()['clashes']] == [keynote['id']]
+
+    schedule = api.get('/api/registrations/my-schedule', headers=student).json()
+    assert schedule['clash_count'] == 1
+    assert [e['clashes_with'] for e in schedule['events']] == [[workshop['id']], [keynote['id']]]
+
+
+def test_clash_policy_block_rejects_the_registration(api, overlapping_events, monkeypatch):
+    import server
+
+    (keynote, workshop), student = overlapping_events
+    monkeypatch.setattr(server, 'REGISTRATION_CLASH_POLICY', 'block')
+    response = api.post(f"/api/registrations/{workshop['id']}", headers=student)
+    assert response.status_code == 409 and "Keynote" in response.json()['detail']
+    assert len(api.get('/api/registrations/my-registrations', headers=student).json()) == 1
+    assert api.get(f"/api/events/{workshop['id']}").json()['registered_count'] == 0
@@ -0,0 +1,208 @@
+import asyncio
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import venues
+
+DAY = datetime(2030, 11, 4, tzinfo=timezone.utc)
+
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+def slots(*pairs):
+    return [{"start": at(*s).isoformat(), "end": at(*e).isoformat()} for s, e in pairs]
+
+
+def event_body(title, start, end, venue="Main Hall"):
+    return {
+        "title": title, "description": "desc", "category": "technical", "capacity": 50,
+        "venue": venue, "start_date": start, "end_date": end,
+    }
+
+
+@pytest.mark.parametrize("booked, expected", [
+    ([], [((8,), (18,))]),
+    # Edge-touching bookings leave no gap between them
+    ([(at(9), at(10)), (at(10), at(12))], [((8,), (9,)), ((12,), (18,))]),
+    # Bookings clipped to the range ends
+    ([(at(8), at(10)), (at(16), at(18))], [((10,), (16,))]),
+    ([(at(8), at(18))], []),
+    # Overlapping and unsorted bookings
+    ([(at(13), at(15)), (at(11), at(14))], [((8,), (11,)), ((15,), (18,))]),
+])
+def test_free_slots(booked, expected):
+    assert venues.free_slots(booked, at(8), at(18), timedelta(minutes=30)) == slots(*expected)
+
+
+def test_free_slots_drops_gaps_shorter_than_min_duration():
+    booked = [(at(9), at(10)), (at(10, 20), at(17, 30))]
+    assert venues.free_slots(booked, at(8), at(18), timedelta(minutes=30)) == slots(((8,), (9,)), ((17, 30), (18,)))
+    assert venues.free_slots(booked, at(8), at(18), timedelta(minutes=20)) == slots(
+        ((8,), (9,)), ((10,), (10, 20)), ((17, 30), (18,))
+    )
+    assert venues.free_slots(booked, at(8), at(18), timedelta(hours=2)) == []
+
+
+@pytest.mark.parametrize("conflicts, lost", [
+    ([], False),
+    ([{"booked_at": "2030-01-01T10:00:00.000002+00:00"}], False),
+    ([{"booked_at": "2030-01-01T10:00:00.000001+00:00"}], True),
+    ([{"booked_at": "2030-01-01T09:59:59+00:00"}], True),
+    # Events booked before booked_at existed always keep their slot
+    ([{}], True),
+])
+def test_lost_race(conflicts, lost):
+    assert venues.lost_race(conflicts, "2030-01-01T10:00:00.000001+00:00") is lost
+
+
+def test_find_conflicts_and_availability():
+    db = AsyncMongoMockClient()['venues_test']
+
+    async def book(event_id, start, end, status="upcoming", venue="Main Hall"):
+        event = {"id": event_id, "title": event_id, "status": status, "start_date": start, "end_date": end}
+        event.update(venues.schedule_fields(venue, start, end))
+        await venues.record_booking(db, venue, event['start_ts'], event['end_ts'])
+        await db.events.insert_one(event)
+
+    async def scenario():
+        # A long booking starting well before the queried range must still be found
+        await book("conference", "2030-11-03T09:00:00Z", "2030-11-04T11:00:00Z")
+        await book("talk", "2030-11-04T14:00:00Z", "2030-11-04T15:00:00Z")
+        await book("cancelled", "2030-11-04T12:00:00Z", "2030-11-04T13:00:00Z", status="cancelled")
+        await book("elsewhere", "2030-11-04T12:00:00Z", "2030-11-04T13:00:00Z", venue="Lab 2")
+        await book("evening", "2030-11-04T17:00:00Z", "2030-11-04T20:00:00Z")
+
+        found = await venues.find_conflicts(db, "main hall", at(10), at(14, 30))
+        assert [e['id'] for e in found] == ["conference", "talk"]
+        assert await venues.find_conflicts(db, "main hall", at(11), at(14)) == []
+        assert await venues.find_conflicts(db, "main hall", at(11), at(17), exclude_id="talk") == []
+
+        result = await venues.availability(db, "Main  HALL", at(8), at(18), timedelta(minutes=30))
+        assert [(b['event_id'], b['start'], b['end']) for b in result['booked']] == [
+            ("conference", at(8).isoformat(), at(11).isoformat()),
+            ("talk", at(14).isoformat(), at(15).isoformat()),
+            ("evening", at(17).isoformat(), at(18).isoformat()),
+        ]
+        assert result['free'] == slots(((11,), (14,)), ((15,), (17,)))
+
+    asyncio.run(scenario())
+
+
+
+@pytest.fixture
+def campus_timezone(monkeypatch):
+    monkeypatch.setenv('EVENT_TIMEZONE', 'Asia/Kolkata')
+    venues.event_timezone.cache_clear()
+    yield
+    venues.event_timezone.cache_clear()
+
+
+def test_naive_times_are_read_in_the_event_timezone(campus_timezone):
+    assert venues.parse_event_time('2030-11-04T14:00') == at(8, 30)
+    assert venues.parse_event_time('2030-11-04T14:00:00Z') == at(14)
+    assert venues.parse_event_time('2030-11-04T14:00:00+01:00') == at(13)
+
+
+def test_backfill_all_recomputes_after_a_zone_change(monkeypatch):
+    db = AsyncMongoMockClient()['venues_test']
+    old = {"id": "old", "venue": "Main Hall", "start_date": "2030-11-04T14:00", "end_date": "2030-11-04T16:00"}
+    new = {"id": "new", "venue": "Lab 2", "start_date": "2030-11-04T10:00", "end_date": "2030-11-04T11:00"}
+
+    async def scenario():
+        await db.events.insert_one({**old, **venues.schedule_fields(old['venue'], old['start_date'], old['end_date'])})
+        await db.events.insert_one(new)
+        added = await venues.backfill(db)
+        monkeypatch.setenv('EVENT_TIMEZONE', 'Asia/Kolkata')
+        venues.event_timezone.cache_clear()
+        try:
+            recomputed = await venues.backfill(db, recompute=True)
+        finally:
+            venues.event_timezone.cache_clear()
+        stored = await db.events.find({}, {"_id": 0, "id": 1, "start_ts": 1}).sort("id", 1).to_list(None)
+        return added, recomputed, stored
+
+    added, recomputed, stored = asyncio.run(scenario())
+    assert (added, recomputed) == (1, 2)
+    assert [(e['id'], e['start_ts'].replace(tzinfo=timezone.utc)) for e in stored] == [
+        ("new", at(4, 30)), ("old", at(8, 30)),
+    ]
+
+def test_overlapping_booking_is_rejected(api, auth_headers):
+    headers = auth_headers("organizer@example.com")
+    first = api.post('/api/events', json=event_body("Hackathon", "2030-11-04T10:00:00Z", "2030-11-04T12:00:00Z"), headers=headers)
+    assert first.status_code == 200, first.text
+
+    clash = api.post('/api/events', json=event_body("Quiz", "2030-11-04T11:00:00Z", "2030-11-04T13:00:00Z", venue="main hall"), headers=headers)
+    assert clash.status_code == 409
+    assert "Hackathon" in clash.json()['detail']
+
+    after = api.post('/api/events', json=event_body("Quiz", "2030-11-04T12:00:00Z", "2030-11-04T13:00:00Z"), headers=headers)
+    assert after.status_code == 200
+    online = api.post('/api/events', json=event_body("Webinar", "2030-11-04T10:00:00Z", "2030-11-04T12:00:00Z", venue="Online"), headers=headers)
+    assert online.status_code == 200
+    online = api.post('/api/events', json=event_body("Webinar 2", "2030-11-04T10:00:00Z", "2030-11-04T12:00:00Z", venue="Online"), headers=headers)
+    assert online.status_code == 200
+
+    moved = api.put(f"/api/events/{after.json()['id']}", json={"start_date": "2030-11-04T09:00:00Z"}, headers=headers)
+    assert moved.status_code == 409
+
+
+@pytest.fixture
+def rival_booking(monkeypatch):
+    """Writes a competing event, booked earlier, after the request's own conflict check has passed."""
+    import server
+
+    record_booking = venues.record_booking
+    rivals = []
+
+    async def record_booking_racing(db, venue, start, end):
+        await record_booking(db, venue, start, end)
+        if rivals:
+            await db.events.insert_one(rivals.pop())
+
+    def arm(title, start_date, end_date):
+        rival = {"id": title, "title": title, "status": "upcoming", "start_date": start_date, "end_date": end_date,
+                 "booked_at": datetime.now(timezone.utc).isoformat()}
+        rival.update(server.event_schedule("Main Hall", start_date, end_date))
+        rivals.append(rival)
+
+    monkeypatch.setattr(venues, 'record_booking', record_booking_racing)
+    return arm
+
+
+def test_create_rolls_back_when_an_earlier_booking_wins(api, auth_headers, rival_booking):
+    import server
+
+    headers = auth_headers("organizer@example.com")
+    rival_booking("Rival", "2030-11-04T10:00:00Z", "2030-11-04T11:00:00Z")
+
+    response = api.post('/api/events', json=event_body("Hackathon", "2030-11-04T10:30:00Z", "2030-11-04T12:00:00Z"), headers=headers)
+    assert response.status_code == 409
+    assert "Rival" in response.json()['detail']
+    titles = api.portal.call(lambda: server.db.events.distinct("title"))
+    assert titles == ["Rival"]
+
+
+def test_update_rolls_back_when_an_earlier_booking_wins(api, auth_headers, rival_booking):
+    import server
+
+    headers = auth_headers("organizer@example.com")
+    created = api.post('/api/events', json=event_body("Hackathon", "2030-11-04T14:00:00Z", "2030-11-04T15:00:00Z"), headers=headers)
+    event_id = created.json()['id']
+    before = api.portal.call(lambda: server.db.events.find_one({"id": event_id}, {"_id": 0}))
+    rival_booking("Rival", "2030-11-04T10:00:00Z", "2030-11-04T11:00:00Z")
+
+    response = api.put(
+        f"/api/events/{event_id}",
+        json={"start_date": "2030-11-04T10:30:00Z", "end_date": "2030-11-04T11:30:00Z", "title": "Hackathon (moved)"},
+        headers=headers,
+    )
+    assert response.status_code == 409
+    after = api.portal.call(lambda: server.db.events.find_one({"id": event_id}, {"_id": 0}))
+    for field in server.SCHEDULE_FIELDS:
+        assert after.get(field) == before.get(field), field
+    assert api.get(f"/api/events/{event_id}").json()['start_date'] == "2030-11-04T14:00:00Z"